@@ -4,81 +4,461 @@ PokeGen Web Application
 Web UI for creating custom Pokémon mods for PokeWilds
 """
 
-from flask import Flask, render_template, request, jsonify, send_from_directory
+from flask import Flask, Response, render_template, request, jsonify, send_file, send_from_directory
+from werkzeug.wsgi import ClosingIterator
+from contextlib import ExitStack
 from pathlib import Path
+from dataclasses import asdict
+from PIL import Image
 import secrets
 import json
+import argparse
+import atexit
 import base64
 import io
+import logging
+import os
 import sys
-import traceback
+import threading
+import time
 from pokemon_mod_generator import PokemonModGenerator, PokemonStats
+from batch_import import iter_json_array, iter_ndjson, spool_validated, run_bounded
+from job_queue import SpriteJobQueue, QueueFull, DONE, FAILED, CANCELLED
+from sprite_store import SpriteStore
+from species_index import SpeciesIndex, perceptual_hash
+from mod_registry import DexCollision
+from species_table import SpeciesData
+from sprite_backends import missing_modules
+from retention import RetentionManager, MB, DAY
+from metrics import REGISTRY, CACHE_REQUESTS, configure_logging, log_event, resident_memory_bytes
+from profiling import add_profile_argument, profiled, profile_thread
 
 app = Flask(__name__)
 app.config['MAX_CONTENT_LENGTH'] = 16 * 1024 * 1024  # 16MB max file size
 
+# Sprite backend: 'diffusers' (default) or 'stub' (offline, for tests and load tests)
+app.config['SPRITE_BACKEND'] = os.environ.get('POKEGEN_SPRITE_BACKEND', 'diffusers')
+app.config['STUB_LATENCY'] = float(os.environ.get('POKEGEN_STUB_LATENCY', '0'))
+
+# Sprite jobs allowed to wait for the model before submits get 429
+app.config['JOB_QUEUE_SIZE'] = int(os.environ.get('POKEGEN_QUEUE_SIZE', '16'))
+# Longest /api/generate-sprite will block waiting for its job (seconds)
+app.config['SYNC_GENERATE_TIMEOUT'] = float(os.environ.get('POKEGEN_SYNC_TIMEOUT', '600'))
+
+# Mods /api/create-batch writes at the same time
+app.config['BATCH_PARALLELISM'] = int(os.environ.get('POKEGEN_BATCH_PARALLELISM', '8'))
+
+# Mods directory (default: ../mods next to PokeGen)
+app.config['MODS_DIR'] = Path(os.environ.get('POKEGEN_MODS_DIR', Path(__file__).parent.parent / "mods"))
+
+# Generated sprite retention: total size budget and age limit for unused sprites.
+# Both default to 0 (off): retention deletes files from generated_sprites/
+app.config['SPRITE_BUDGET_MB'] = float(os.environ.get('POKEGEN_SPRITE_BUDGET_MB', '0'))
+app.config['SPRITE_MAX_AGE_DAYS'] = float(os.environ.get('POKEGEN_SPRITE_MAX_AGE_DAYS', '0'))
+
+# Game data (moves.asm, base_stats/) that balance reports compare new Pokémon with
+app.config['GAME_DATA_DIR'] = Path(os.environ.get('POKEGEN_GAME_DATA_DIR', Path(__file__).parent.parent / "pokemon"))
+
+# Shipped species sprites that template suggestions are matched against
+app.config['SPECIES_DIR'] = Path(os.environ.get('POKEGEN_SPECIES_DIR', Path(__file__).parent.parent / "pokemon" / "pokemon"))
+
 # Global generator instance
 generator = None
 sprite_gen = None
+job_queue = None
+metrics_hub = None  # registry in the model process that serve.py workers report to
+damage_engine = None
+# Separate locks so a slow sprite model import never blocks mod creation
+_generator_lock = threading.Lock()
+_sprite_gen_lock = threading.Lock()
+_job_queue_lock = threading.Lock()
+_damage_engine_lock = threading.Lock()
+
+# Generated sprites are written behind the response by the store's writer thread
+sprite_store = SpriteStore(Path(__file__).parent / "generated_sprites")
+atexit.register(sprite_store.close)
+
+# Started by whichever process owns sprite writes (main() or serve.py's model process)
+retention = RetentionManager(
+    sprite_store,
+    app.config['MODS_DIR'],
+    budget_bytes=int(app.config['SPRITE_BUDGET_MB'] * MB),
+    max_age=app.config['SPRITE_MAX_AGE_DAYS'] * DAY
+)
+
+# Perceptual hashes of the shipped species, loaded on the first suggestion
+species_index = SpeciesIndex(app.config['SPECIES_DIR'], Path(__file__).parent / "species_hashes.json")
+
+# Flat species data files compiled into one memory-mapped table, rebuilt when they change
+species_data = SpeciesData(app.config['GAME_DATA_DIR'], Path(__file__).parent / "species_table.bin")
 
 
 def get_generator():
     """Get or create mod generator"""
     global generator
     if generator is None:
-        # Find mods directory relative to app.py location
-        app_dir = Path(__file__).parent
-        mods_dir = app_dir.parent / "mods"
-        mods_dir.mkdir(parents=True, exist_ok=True)
-        generator = PokemonModGenerator(mods_dir)
+        with _generator_lock:
+            if generator is None:
+                mods_dir = Path(app.config['MODS_DIR'])
+                mods_dir.mkdir(parents=True, exist_ok=True)
+                generator = PokemonModGenerator(mods_dir, species_data=species_data)
     return generator
 
 
+def get_damage_engine():
+    """Shipped moves and base stats as arrays, parsed on the first balance report"""
+    global damage_engine
+    if damage_engine is None:
+        with _damage_engine_lock:
+            if damage_engine is None:
+                from damage_engine import DamageEngine  # numpy: only needed for balance reports
+                damage_engine = DamageEngine(app.config['GAME_DATA_DIR'], species_data=species_data)
+    return damage_engine
+
+
 def get_sprite_generator():
     """Lazy-load sprite generator (optional)"""
     global sprite_gen
     
-    if sprite_gen is False:  # Already tried and failed
-        return None
-    
     if sprite_gen is None:
-        try:
-            from sprite_generator import SpriteGenerator
-            sprite_gen = SpriteGenerator(device="cpu", low_memory=True)
-            print("✓ Sprite generator loaded")
-        except ImportError as e:
-            print(f"✗ Sprite generator not available: {e}")
-            sprite_gen = False  # Mark as unavailable
-            return None
+        with _sprite_gen_lock:
+            if sprite_gen is None:
+                try:
+                    from sprite_generator import SpriteGenerator
+                    backend = app.config['SPRITE_BACKEND']
+                    options = {'latency': app.config['STUB_LATENCY']} if backend == 'stub' else {}
+                    sprite_gen = SpriteGenerator(device="cpu", low_memory=True, backend=backend, **options)
+                    log_event('sprite_generator.ready', backend=backend)
+                except ImportError as e:
+                    log_event('sprite_generator.unavailable', level=logging.WARNING, error=e)
+                    sprite_gen = False  # Mark as unavailable
     
     return sprite_gen if sprite_gen is not False else None
 
 
+def use_job_queue(queue):
+    """Serve sprite jobs from another queue, e.g. a proxy to the model process (see serve.py)"""
+    global job_queue
+    with _job_queue_lock:
+        job_queue = queue
+
+
+def use_metrics_hub(hub):
+    """Report metrics to another process's registry (see serve.py)"""
+    global metrics_hub
+    metrics_hub = hub
+
+
+def get_job_queue():
+    """Get or create the sprite job queue (its worker owns the sprite model)"""
+    global job_queue
+    if job_queue is None:
+        with _job_queue_lock:
+            if job_queue is None:
+                job_queue = SpriteJobQueue(
+                    get_sprite_generator,
+                    run_sprite_job,
+                    max_queued=app.config['JOB_QUEUE_SIZE']
+                )
+    return job_queue
+
+
+def parse_sprite_params(data):
+    """
+    Validate a sprite generation request body
+
+    Returns:
+        dict with prompt, steps and seed
+
+    Raises:
+        ValueError, TypeError: With a message suitable for a 400 response
+    """
+    if not data or 'prompt' not in data:
+        raise ValueError('Missing prompt')
+
+    prompt = str(data['prompt']).strip()
+    if not prompt:
+        raise ValueError('Prompt cannot be empty')
+
+    steps = int(data.get('steps', 20))
+    steps = min(50, max(10, steps))  # Clamp to 10-50
+
+    seed = data.get('seed')
+    seed = int(seed) if seed else None
+
+    # Attach a low-res preview to every Nth progress event (0 = none)
+    preview_every = max(0, int(data.get('preview_every', 0)))
+
+    return {'prompt': prompt, 'steps': steps, 'seed': seed, 'preview_every': preview_every}
+
+
+def sprite_job_key(params):
+    """
+    Coalescing key for a sprite request
+
+    Only seeded requests are deterministic, so only they can share a job.
+    Previews are excluded: joiners get whatever the running job reports.
+    """
+    if params['seed'] is None:
+        return None
+    return (params['prompt'], params['steps'], params['seed'])
+
+
+def png_data_uri(image):
+    """Encode a PIL image as a base64 PNG data URI"""
+    buffer = io.BytesIO()
+    image.save(buffer, format='PNG')
+    return 'data:image/png;base64,' + base64.b64encode(buffer.getvalue()).decode('utf-8')
+
+
+def run_sprite_job(gen, params, progress):
+    """Generate one sprite in memory and queue it for saving; runs on the job queue worker"""
+    log_event('sprite_job.start', prompt=params['prompt'], steps=params['steps'], seed=params['seed'])
+
+    def on_step(event):
+        if 'preview' in event:
+            event['preview'] = png_data_uri(event['preview'])
+        progress(event)
+
+    # Generate both high-res and downscaled images as encoded PNGs
+    with profile_thread():
+        pngs = gen.generate_pngs(
+            prompt=params['prompt'],
+            num_inference_steps=params['steps'],
+            seed=params['seed'],
+            progress=on_step,
+            preview_every=params['preview_every']
+        )
+
+    phash = perceptual_hash(Image.open(io.BytesIO(pngs[min(pngs)])))
+
+    name = secrets.token_hex(3)  # 6-hex characters
+    while sprite_store.exists(name):
+        name = secrets.token_hex(3)
+    paths = sprite_store.save(name, pngs, metadata={
+        'prompt': params['prompt'],
+        'seed': params['seed'],
+        'steps': params['steps'],
+        'phash': f"{phash:032x}",
+    })
+
+    return {
+        'name': name,
+        'saved_paths': {
+            'high': str(paths[max(paths)]),
+            'low': str(paths[min(paths)])
+        },
+        'pngs': pngs,
+        'suggestions': species_index.nearest(phash),
+        'message': f'Generated and saved sprite: {name}'
+    }
+
+
+def sprite_response(result, **extra):
+    """
+    Response for a finished sprite
+
+    JSON with the low-res sprite as a base64 data URI by default. With
+    format=png (query string or JSON body) the PNG itself is returned as
+    image/png, which is a third smaller; size=512 selects the high-res image.
+    """
+    options = {**(request.get_json(silent=True) or {}), **request.args}
+    pngs = result['pngs']
+    # The model worker returns before the files are written; only hand out the
+    # name once this process (maybe a serve.py worker) can look it up
+    if not sprite_store.wait_saved(result['name']):
+        log_event('sprite.not_indexed', level=logging.WARNING, name=result['name'])
+
+    if options.get('format') == 'png':
+        try:
+            size = int(options.get('size', min(pngs)))
+        except (TypeError, ValueError):
+            size = None
+        if size not in pngs:
+            return jsonify({'success': False, 'error': f"Size must be one of {sorted(pngs)}"}), 400
+        return Response(pngs[size], mimetype='image/png', headers={
+            'X-Sprite-Name': result['name'],
+            'Content-Disposition': f"inline; filename={result['name']}_{size}.png",
+        })
+
+    body = {key: value for key, value in result.items() if key != 'pngs'}
+    body['image'] = 'data:image/png;base64,' + base64.b64encode(pngs[min(pngs)]).decode('utf-8')
+    return jsonify({'success': True, **extra, **body})
+
+
+def sprite_unavailable_response():
+    """503 response used when the optional sprite dependencies are missing"""
+    return jsonify({
+        'success': False,
+        'error': 'Sprite generator not available. Install dependencies: pip install -r requirements.txt'
+    }), 503
+
+
+def queue_full_response(error):
+    """429 response used when the sprite queue is at capacity"""
+    response = jsonify({'success': False, 'error': str(error)})
+    response.headers['Retry-After'] = '5'
+    return response, 429
+
+
 @app.route('/')
 def index():
     """Main page"""
     return render_template('index.html')
 
 
+def parse_create_request(data):
+    """
+    Validate and normalize one /api/create body
+    
+    Returns:
+        JSON-serializable dict of mod fields
+    
+    Raises:
+        ValueError: With a message suitable for a 400 response
+    """
+    if not isinstance(data, dict):
+        raise ValueError('Expected a JSON object')
+    
+    # Validate required fields
+    required = ['name', 'dex', 'type1']
+    for field in required:
+        if field not in data:
+            raise ValueError(f'Missing field: {field}')
+    
+    name = str(data['name']).strip()
+    if not PokemonModGenerator.is_valid_name(name):
+        raise ValueError(f'Invalid name: {name!r}')
+    
+    return {
+        'name': name,
+        'dex': int(data['dex']),
+        'type1': str(data['type1']).upper(),
+        'type2': (data.get('type2') or '').upper() or None,
+        
+        # Stats
+        'hp': int(data.get('hp', 45)),
+        'attack': int(data.get('attack', 49)),
+        'defense': int(data.get('defense', 49)),
+        'sp_atk': int(data.get('sp_atk', 65)),
+        'sp_def': int(data.get('sp_def', 65)),
+        'speed': int(data.get('speed', 45)),
+        
+        # Abilities and other stats
+        'ability1': (data.get('ability1') or 'STATIC').upper(),
+        'ability2': (data.get('ability2') or '').upper() or None,
+        'gender': int(data.get('gender', 50)),
+        'template': (data.get('template') or '').lower() or None,
+        'sprite': parse_sprite_reference(data.get('sprite')),
+    }
+
+
+def parse_sprite_reference(sprite):
+    """Validate the optional name of a generated sprite to use as a mod's front sprite"""
+    sprite = str(sprite or '').strip()
+    if not sprite:
+        return None
+    if not sprite_store.exists(sprite):
+        raise ValueError(f'Unknown generated sprite: {sprite!r}')
+    return sprite
+
+
+def create_from_request(spec, verbose=True):
+    """Create the mod described by a parse_create_request() dict; returns success"""
+    stats = PokemonStats(
+        hp=spec['hp'],
+        attack=spec['attack'],
+        defense=spec['defense'],
+        sp_atk=spec['sp_atk'],
+        sp_def=spec['sp_def'],
+        speed=spec['speed']
+    )
+    front_sprite = None
+    if spec.get('sprite'):
+        entry = sprite_store.get(spec['sprite'])
+        if entry is None:
+            log_event('mod.sprite_missing', level=logging.ERROR, name=spec['name'], sprite=spec['sprite'])
+            return False
+        # Pin before copying so retention cannot evict the sprite in between
+        sprite_store.pin(spec['sprite'], spec['name'])
+        front_sprite = sprite_store.path(spec['sprite'], min(int(size) for size in entry['bytes']))
+    
+    created = get_generator().create_pokemon(
+        name=spec['name'],
+        dex_number=spec['dex'],
+        type1=spec['type1'],
+        type2=spec['type2'],
+        stats=stats,
+        ability1=spec['ability1'],
+        ability2=spec['ability2'],
+        gender_ratio=spec['gender'],
+        template_pokemon=spec['template'],
+        front_sprite=front_sprite,
+        verbose=verbose
+    )
+    if not created and front_sprite:
+        sprite_store.unpin(spec['sprite'], spec['name'])
+    return created
+
+
+def pokemon_summary(spec):
+    """Public description of a created mod"""
+    type1, type2 = spec['type1'], spec['type2']
+    return {
+        'name': spec['name'],
+        'dex': spec['dex'],
+        'type1': type1,
+        'type2': type2,
+        'types': f"{type1}" + (f"/{type2}" if type2 else "")
+    }
+
+
+def dex_collision_response(error):
+    """409 for a dex number that is already taken, with the next free one"""
+    return jsonify({'success': False, 'error': str(error), 'holder': error.holder,
+                    'next_free_dex': error.next_free}), 409
+
+
 @app.route('/api/create', methods=['POST'])
 def create_pokemon():
     """Create a new Pokémon mod"""
     try:
-        data = request.json
-        
-        # Validate required fields
-        required = ['name', 'dex', 'type1']
-        for field in required:
-            if field not in data:
-                return jsonify({'success': False, 'error': f'Missing field: {field}'}), 400
+        try:
+            spec = parse_create_request(request.json)
+        except ValueError as e:
+            return jsonify({'success': False, 'error': str(e)}), 400
         
-        # Get parameters
-        name = data['name'].strip()
-        dex = int(data['dex'])
-        type1 = data['type1'].upper()
-        type2 = data.get('type2', '').upper() or None
+        try:
+            get_generator().registry.check_dex(spec['dex'], spec['name'])
+        except DexCollision as e:
+            return dex_collision_response(e)
         
-        # Stats
+        if create_from_request(spec):
+            return jsonify({
+                'success': True,
+                'message': f"Created Pokémon: {spec['name']} (#{spec['dex']})",
+                'pokemon': pokemon_summary(spec)
+            })
+        else:
+            return jsonify({'success': False, 'error': 'Failed to create Pokémon'}), 500
+    
+    except Exception as e:
+        log_event('api.create_failed', level=logging.ERROR, exc_info=True, error=e)
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+
+@app.route('/api/balance', methods=['POST'])
+def balance_report():
+    """
+    Compare a planned Pokémon with every shipped species
+
+    Takes the same body as /api/create (name and dex are not needed), plus an
+    optional list of damaging moves.
+    """
+    data = request.get_json(silent=True)
+    if not isinstance(data, dict) or 'type1' not in data:
+        return jsonify({'success': False, 'error': 'Missing field: type1'}), 400
+    try:
         stats = PokemonStats(
             hp=int(data.get('hp', 45)),
             attack=int(data.get('attack', 49)),
@@ -87,131 +467,469 @@ def create_pokemon():
             sp_def=int(data.get('sp_def', 65)),
             speed=int(data.get('speed', 45))
         )
-        
-        # Abilities and other stats
-        ability1 = data.get('ability1', 'STATIC').upper()
-        ability2 = data.get('ability2', '').upper() or None
-        gender = int(data.get('gender', 50))
-        template = data.get('template', '').lower() or None
-        
-        # Generate
-        gen = get_generator()
-        success = gen.create_pokemon(
-            name=name,
-            dex_number=dex,
-            type1=type1,
-            type2=type2,
-            stats=stats,
-            ability1=ability1,
-            ability2=ability2,
-            gender_ratio=gender,
-            template_pokemon=template
-        )
-        
-        if success:
-            return jsonify({
-                'success': True,
-                'message': f'Created Pokémon: {name} (#{dex})',
-                'pokemon': {
-                    'name': name,
-                    'dex': dex,
-                    'type1': type1,
-                    'type2': type2,
-                    'types': f"{type1}" + (f"/{type2}" if type2 else "")
-                }
-            })
-        else:
-            return jsonify({'success': False, 'error': 'Failed to create Pokémon'}), 500
+        moves = data.get('moves') or None
+        if moves is not None and not isinstance(moves, list):
+            raise ValueError('moves must be a list of move names')
+        report = get_damage_engine().balance_report(stats, str(data['type1']), data.get('type2') or None,
+                                                    [str(move) for move in moves] if moves else None)
+    except (TypeError, ValueError) as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
+    return jsonify({'success': True, 'report': report})
+
+
+@app.route('/api/species', methods=['GET'])
+def species_summary():
+    """Counts and source-file problems of the compiled species table"""
+    table = species_data.table()
+    problems = table.problems()
+    kinds = {}
+    for problem in problems:
+        kinds[problem['kind']] = kinds.get(problem['kind'], 0) + 1
+    return jsonify({'success': True, 'counts': table.report['counts'], 'problem_kinds': kinds,
+                    'problems': problems})
+
+
+@app.route('/api/species/<key>', methods=['GET'])
+def species_lookup(key):
+    """One species by dex number or name"""
+    table = species_data.table()
+    record = table.by_dex(int(key)) if key.isdigit() else table.by_name(key)
+    if record is None:
+        return jsonify({'error': 'Not found'}), 404
+    return jsonify({'success': True, 'species': asdict(record)})
+
+
+def mod_item(entry):
+    """Public view of a mod registry entry"""
+    return {
+        'name': entry.name,
+        'dex': entry.dex,
+        'type1': entry.type1,
+        'type2': entry.type2,
+        'types': entry.type1 + (f"/{entry.type2}" if entry.type2 else ""),
+        'content_hash': entry.content_hash,
+        'updated': entry.updated,
+    }
+
+
+@app.route('/api/mods', methods=['GET'])
+def list_mods():
+    """Created mods by dex number, filtered by name/dex (q) and type, from the registry index"""
+    try:
+        limit = min(500, max(1, int(request.args.get('limit', 100))))
+        offset = max(0, int(request.args.get('offset', 0)))
+    except ValueError:
+        return jsonify({'success': False, 'error': 'limit and offset must be integers'}), 400
     
-    except Exception as e:
-        print(f"Error: {e}")
-        traceback.print_exc()
-        return jsonify({'success': False, 'error': str(e)}), 500
+    entries, total = get_generator().registry.search(request.args.get('q', ''), request.args.get('type'),
+                                                     limit=limit, offset=offset)
+    return jsonify({'success': True, 'items': [mod_item(entry) for entry in entries], 'total': total})
+
+
+@app.route('/api/mods/next-dex', methods=['GET'])
+def next_free_dex():
+    """Lowest dex number not used by a shipped species or a mod"""
+    return jsonify({'success': True, 'dex': get_generator().registry.next_free_dex()})
+
+
+@app.route('/api/mods/check-dex/<int:dex>', methods=['GET'])
+def check_dex(dex):
+    """Whether a dex number is free (ignoring the mod named by ?name=, when re-creating it)"""
+    registry = get_generator().registry
+    holder = registry.holder(dex, request.args.get('name') or None)
+    return jsonify({'success': True, 'dex': dex, 'free': holder is None, 'holder': holder,
+                    'next_free_dex': registry.next_free_dex()})
+
+
+@app.route('/api/mods/<name>', methods=['GET'])
+def mod_lookup(name):
+    """One created mod by name"""
+    entry = get_generator().registry.get(name)
+    if entry is None:
+        return jsonify({'error': 'Not found'}), 404
+    return jsonify({'success': True, 'mod': mod_item(entry)})
+
+
+@app.route('/api/create-batch', methods=['POST'])
+def create_batch():
+    """
+    Create many Pokémon mods from one upload
+    
+    Accepts a JSON array (application/json), NDJSON (application/x-ndjson) or
+    an uploaded .ndjson/.json file in the 'file' form field. Every entry is
+    validated before anything is written; the response then streams one
+    NDJSON line per mod as it finishes, followed by a summary line.
+    """
+    upload = request.files.get('file')
+    if upload is not None:
+        stream = upload.stream
+        ndjson = not upload.filename.lower().endswith('.json')
+    else:
+        stream = request.stream
+        ndjson = request.mimetype in ('application/x-ndjson', 'application/jsonl')
+    
+    seen = set()
+    dex_owners = {}
+    registry = get_generator().registry
+    
+    def validate(item):
+        spec = parse_create_request(item)
+        key = spec['name'].lower()
+        if key in seen:
+            raise ValueError(f"Duplicate name in batch: {spec['name']}")
+        seen.add(key)
+        if dex_owners.setdefault(spec['dex'], spec['name']) != spec['name']:
+            raise ValueError(f"Duplicate dex in batch: #{spec['dex']} ({dex_owners[spec['dex']]}, {spec['name']})")
+        registry.check_dex(spec['dex'], spec['name'])
+        return spec
+    
+    try:
+        items = iter_ndjson(stream) if ndjson else iter_json_array(stream)
+        spool, count, errors = spool_validated(items, validate)
+    except ValueError as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
+    
+    if errors:
+        spool.close()
+        return jsonify({'success': False, 'count': count, 'errors': errors,
+                        'error': f'{len(errors)} invalid entries; nothing was created'}), 400
+    
+    def create(spec):
+        try:
+            if create_from_request(spec, verbose=False):
+                return {'success': True, 'pokemon': pokemon_summary(spec)}
+            return {'success': False, 'name': spec['name'], 'error': 'Failed to create Pokémon'}
+        except Exception as e:
+            return {'success': False, 'name': spec['name'], 'error': str(e)}
+    
+    def stream_results():
+        created = failed = 0
+        try:
+            specs = (json.loads(line) for line in spool)
+            for result in run_bounded(specs, create, app.config['BATCH_PARALLELISM']):
+                if result['success']:
+                    created += 1
+                else:
+                    failed += 1
+                yield json.dumps(result) + '\n'
+        finally:
+            spool.close()
+        yield json.dumps({'done': True, 'count': count, 'created': created, 'failed': failed}) + '\n'
+    
+    log_event('batch.start', count=count)
+    return Response(stream_results(), mimetype='application/x-ndjson')
 
 
 @app.route('/api/generate-sprite', methods=['POST'])
 def generate_sprite():
-    """Generate a Pokémon sprite from text description"""
+    """Generate a Pokémon sprite from text description (waits for the job)"""
     try:
-        data = request.json
-        
-        if 'prompt' not in data:
-            return jsonify({'success': False, 'error': 'Missing prompt'}), 400
+        try:
+            params = parse_sprite_params(request.json)
+        except (TypeError, ValueError) as e:
+            return jsonify({'success': False, 'error': str(e)}), 400
         
-        prompt = data['prompt'].strip()
-        if not prompt:
-            return jsonify({'success': False, 'error': 'Prompt cannot be empty'}), 400
+        queue = get_job_queue()
+        if not queue.available():
+            return sprite_unavailable_response()
         
-        # Get generator
-        gen = get_sprite_generator()
-        if gen is None:
-            return jsonify({
-                'success': False,
-                'error': 'Sprite generator not available. Install dependencies: pip install -r requirements.txt'
-            }), 503
-        
-        # Generate parameters
-        steps = int(data.get('steps', 20))
-        steps = min(50, max(10, steps))  # Clamp to 10-50
+        try:
+            job = queue.submit(params, key=sprite_job_key(params))
+        except QueueFull as e:
+            return queue_full_response(e)
         
-        seed = data.get('seed')
-        if seed:
-            seed = int(seed)
+        ticket = job['ticket']
+        job = queue.wait(job['id'], timeout=app.config['SYNC_GENERATE_TIMEOUT'], include_result=True)
+        if job['status'] != DONE:
+            if job['status'] not in (FAILED, CANCELLED):
+                queue.cancel(job['id'], ticket)
+            return jsonify({'success': False, 'error': job['error'] or f"Sprite job {job['status']}"}), 500
         
-        print(f"Generating sprite from prompt: {prompt}")
-
-        # Prepare save directory and random name
-        app_dir = Path(__file__).parent
-        save_dir = app_dir / "generated_sprites"
-        save_dir.mkdir(parents=True, exist_ok=True)
-
-        name = secrets.token_hex(3)  # 6-hex characters
-        output_path = save_dir / f"{name}.png"
-
-        # Generate and save both high-res and downscaled images
-        success = gen.generate_and_save(
-            prompt=prompt,
-            output_path=output_path,
-            num_inference_steps=steps,
-            seed=seed
-        )
+        return sprite_response(job['result'])
+    
+    except Exception as e:
+        log_event('api.generate_sprite_failed', level=logging.ERROR, exc_info=True, error=e)
+        return jsonify({'success': False, 'error': str(e)}), 500
 
-        if not success:
-            return jsonify({'success': False, 'error': 'Failed to generate and save sprite'}), 500
 
-        high_path = save_dir / f"{name}_512.png"
-        low_path = save_dir / f"{name}_96.png"
+@app.route('/api/jobs', methods=['POST'])
+def submit_sprite_job():
+    """Queue a sprite generation job and return immediately"""
+    try:
+        params = parse_sprite_params(request.json)
+    except (TypeError, ValueError) as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
+    
+    if not get_job_queue().available():
+        return sprite_unavailable_response()
+    
+    try:
+        job = get_job_queue().submit(params, key=sprite_job_key(params))
+    except QueueFull as e:
+        return queue_full_response(e)
+    
+    return jsonify({'success': True, 'job': job}), 202
 
-        # Read low-res image for immediate preview (base64)
-        try:
-            with low_path.open('rb') as f:
-                data = f.read()
-            image_base64 = base64.b64encode(data).decode('utf-8')
-        except Exception:
-            image_base64 = None
-
-        return jsonify({
-            'success': True,
-            'name': name,
-            'saved_paths': {
-                'high': str(high_path),
-                'low': str(low_path)
-            },
-            'image': f'data:image/png;base64,{image_base64}' if image_base64 else None,
-            'message': f'Generated and saved sprite: {name}'
-        })
+
+@app.route('/api/jobs/<job_id>', methods=['GET'])
+def sprite_job_status(job_id):
+    """Poll a sprite job"""
+    job = get_job_queue().status(job_id)
+    if job is None:
+        return jsonify({'success': False, 'error': 'Unknown job'}), 404
+    return jsonify({'success': True, 'job': job})
+
+
+@app.route('/api/jobs/<job_id>', methods=['DELETE'])
+def cancel_sprite_job(job_id):
+    """Cancel a queued or running sprite job (?ticket= from the submit response)"""
+    queue = get_job_queue()
+    job = queue.status(job_id)
+    if job is None:
+        return jsonify({'success': False, 'error': 'Unknown job'}), 404
+    if job['status'] in (DONE, FAILED, CANCELLED):
+        return jsonify({'success': False, 'error': 'Job already finished'}), 409
+    if not queue.cancel(job_id, request.args.get('ticket') or None):
+        return jsonify({'success': False, 'error': 'Job is shared: cancel it with your own unused ticket'}), 403
+    return jsonify({'success': True, 'job': queue.status(job_id)})
+
+
+@app.route('/api/jobs/<job_id>/events', methods=['GET'])
+def sprite_job_events(job_id):
+    """Stream a sprite job's progress as server-sent events"""
+    queue = get_job_queue()
+    if queue.status(job_id) is None:
+        return jsonify({'success': False, 'error': 'Unknown job'}), 404
     
-    except Exception as e:
-        print(f"Error generating sprite: {e}")
-        traceback.print_exc()
-        return jsonify({'success': False, 'error': str(e)}), 500
+    # Resume after the last event a reconnecting EventSource saw (from the start if it is unreadable)
+    try:
+        since = max(0, int(request.headers.get('Last-Event-ID') or request.args.get('since', 0)))
+    except ValueError:
+        since = 0
+    
+    def stream():
+        seen = since
+        yield f"event: status\ndata: {json.dumps(queue.status(job_id))}\n\n"
+        while True:
+            update = queue.events(job_id, since=seen, timeout=15)
+            if update is None:
+                return
+            for event in update['events']:
+                seen += 1
+                yield f"id: {seen}\nevent: progress\ndata: {json.dumps(event)}\n\n"
+            job = update['job']
+            if job['status'] in (DONE, FAILED, CANCELLED):
+                yield f"event: {job['status']}\ndata: {json.dumps(job)}\n\n"
+                return
+            if not update['events']:
+                yield f"event: status\ndata: {json.dumps(job)}\n\n"
+    
+    return Response(stream(), mimetype='text/event-stream', headers={
+        'Cache-Control': 'no-cache',
+        'X-Accel-Buffering': 'no',
+    })
+
+
+@app.route('/api/jobs/<job_id>/result', methods=['GET'])
+def sprite_job_result(job_id):
+    """Fetch the result of a finished sprite job"""
+    queue = get_job_queue()
+    job = queue.status(job_id)
+    if job is None:
+        return jsonify({'success': False, 'error': 'Unknown job'}), 404
+    if job['status'] in (FAILED, CANCELLED):
+        return jsonify({'success': False, 'job': job, 'error': job['error'] or f"Job {job['status']}"}), 409
+    if job['status'] != DONE:
+        return jsonify({'success': False, 'job': job, 'error': 'Job not finished'}), 202
+    return sprite_response(queue.result(job_id), job=job)
+
+
+@app.route('/api/jobs', methods=['GET'])
+def sprite_job_stats():
+    """Sprite queue depth and counters"""
+    return jsonify(get_job_queue().stats())
+
+
+def gallery_item(entry):
+    """Public view of a sprite index entry"""
+    name = entry['name']
+    return {
+        'name': name,
+        'prompt': entry.get('prompt'),
+        'seed': entry.get('seed'),
+        'steps': entry.get('steps'),
+        'created': entry.get('created'),
+        'thumb_url': f'/api/gallery/{name}/thumb',
+        'image_urls': {size: f'/api/gallery/{name}/image?size={size}' for size in entry['bytes']},
+    }
+
+
+def immutable_png(path, etag):
+    """PNG response for content that never changes under its URL"""
+    if not path.is_file():
+        return jsonify({'error': 'Not found'}), 404
+    response = send_file(path, mimetype='image/png', etag=False, conditional=False)
+    response.set_etag(etag)
+    response.cache_control.no_cache = None
+    response.cache_control.public = True
+    response.cache_control.max_age = 365 * 24 * 3600
+    response.cache_control.immutable = True
+    return response.make_conditional(request)
+
+
+@app.route('/api/gallery', methods=['GET'])
+def sprite_gallery():
+    """Newest-first page of generated sprites"""
+    try:
+        limit = min(200, max(1, int(request.args.get('limit', 50))))
+        cursor = request.args.get('cursor')
+        cursor = int(cursor) if cursor else None
+    except ValueError:
+        return jsonify({'success': False, 'error': 'limit and cursor must be integers'}), 400
+    
+    entries, next_cursor = sprite_store.page(limit=limit, cursor=cursor)
+    return jsonify({
+        'success': True,
+        'items': [gallery_item(entry) for entry in entries],
+        'next_cursor': next_cursor
+    })
+
+
+@app.route('/api/gallery/retention', methods=['GET'])
+def sprite_retention():
+    """Disk use of generated sprites and what retention has reclaimed"""
+    try:
+        report = json.loads(retention.report_path.read_text())
+    except (OSError, ValueError):
+        report = {}
+    return jsonify({
+        'success': True,
+        'total_bytes': sprite_store.total_bytes(),
+        'budget_bytes': retention.budget_bytes,
+        'max_age': retention.max_age,
+        'retention': report
+    })
+
+
+@app.route('/api/gallery/<name>/thumb', methods=['GET'])
+def sprite_thumbnail(name):
+    """Pre-rendered thumbnail of a generated sprite"""
+    entry = sprite_store.get(name)
+    if entry is None:
+        return jsonify({'error': 'Not found'}), 404
+    return immutable_png(sprite_store.thumb_path(name), entry['thumb_etag'])
+
+
+@app.route('/api/gallery/<name>/image', methods=['GET'])
+def sprite_image(name):
+    """One size of a generated sprite"""
+    entry = sprite_store.get(name)
+    size = request.args.get('size', '96')
+    if entry is None or size not in entry['bytes']:
+        return jsonify({'error': 'Not found'}), 404
+    sprite_store.touch(name)
+    return immutable_png(sprite_store.path(name, int(size)), f"{name}-{size}")
+
+
+@app.route('/api/gallery/<name>/similar', methods=['GET'])
+def similar_species(name):
+    """Shipped species that look most like a generated sprite (template suggestions)"""
+    entry = sprite_store.get(name)
+    if entry is None:
+        return jsonify({'error': 'Not found'}), 404
+    try:
+        k = min(20, max(1, int(request.args.get('k', 3))))
+    except ValueError:
+        return jsonify({'success': False, 'error': 'k must be an integer'}), 400
+
+    if 'phash' in entry:
+        phash = int(entry['phash'], 16)
+    else:
+        # Sprites saved before hashes were indexed
+        path = sprite_store.path(name, min(int(size) for size in entry['bytes']))
+        try:
+            with Image.open(path) as image:
+                phash = perceptual_hash(image)
+        except OSError:
+            return jsonify({'error': 'Not found'}), 404
+    return jsonify({'success': True, 'name': name, 'suggestions': species_index.nearest(phash, k)})
 
 
 @app.route('/api/sprite-available', methods=['GET'])
 def sprite_available():
-    """Check if sprite generator is available"""
-    gen = get_sprite_generator()
-    return jsonify({'available': gen is not None})
+    """Check if sprite generator is available (its modules are probed, not imported)"""
+    return jsonify({'available': get_job_queue().available()})
+
+
+HTTP_REQUEST_SECONDS = REGISTRY.histogram(
+    'pokegen_http_request_seconds', 'HTTP request latency by route', ('method', 'route', 'status'))
+QUEUE_JOBS = REGISTRY.gauge('pokegen_queue_jobs', 'Sprite jobs waiting or running', ('state',))
+QUEUE_CAPACITY = REGISTRY.gauge('pokegen_queue_capacity', 'Sprite jobs allowed to wait')
+JOBS_TOTAL = REGISTRY.counter('pokegen_sprite_jobs_total', 'Sprite job submissions by outcome', ('outcome',))
+MODEL_MEMORY = REGISTRY.gauge('pokegen_model_memory_bytes', 'Bytes held by loaded sprite model weights')
+PROCESS_MEMORY = REGISTRY.gauge('pokegen_process_resident_bytes', 'Resident memory of the process serving metrics')
+SPRITE_STORE_BYTES = REGISTRY.gauge('pokegen_sprite_store_bytes', 'Disk used by generated sprites')
+
+# Routes whose ETag revalidations count as cache hits
+CONDITIONAL_ROUTES = {'sprite_thumbnail': 'gallery_thumbnails', 'sprite_image': 'gallery_images'}
+
+
+def collect_metrics():
+    """Fill in gauges that are read rather than tracked (runs on every render)"""
+    stats = get_job_queue().stats()
+    QUEUE_JOBS.set(stats['queued'], state='queued')
+    QUEUE_JOBS.set(stats['running'], state='running')
+    QUEUE_CAPACITY.set(stats['capacity'])
+    for outcome in ('submitted', 'coalesced', 'rejected', 'done', 'failed', 'cancelled'):
+        JOBS_TOTAL.set(stats[outcome], outcome=outcome)
+    # A coalesced submit reuses a job already in flight: a hit on the job cache
+    CACHE_REQUESTS.set(stats['coalesced'], cache='sprite_jobs', result='hit')
+    CACHE_REQUESTS.set(stats['submitted'], cache='sprite_jobs', result='miss')
+    
+    if sprite_gen:
+        memory = sprite_gen.memory_bytes()
+        if memory is not None:
+            MODEL_MEMORY.set(memory)
+    resident = resident_memory_bytes()
+    if resident is not None:
+        PROCESS_MEMORY.set(resident)
+    SPRITE_STORE_BYTES.set(sprite_store.total_bytes())
+
+
+REGISTRY.add_collector(collect_metrics)
+
+
+@app.before_request
+def start_timer():
+    request.environ['pokegen.started'] = time.perf_counter()
+
+
+@app.after_request
+def record_request(response):
+    """Time every request by route pattern (not raw path, to keep label counts bounded)"""
+    started = request.environ.get('pokegen.started')
+    if started is not None:
+        route = request.url_rule.rule if request.url_rule else 'unmatched'
+        elapsed = time.perf_counter() - started
+        HTTP_REQUEST_SECONDS.observe(elapsed, method=request.method, route=route, status=response.status_code)
+        if request.endpoint in CONDITIONAL_ROUTES and response.status_code in (200, 304):
+            CACHE_REQUESTS.inc(cache=CONDITIONAL_ROUTES[request.endpoint],
+                               result='hit' if response.status_code == 304 else 'miss')
+        log_event('http.request', level=logging.DEBUG, method=request.method, path=request.path,
+                  status=response.status_code, duration_ms=round(elapsed * 1000, 2))
+    return response
+
+
+@app.route('/metrics', methods=['GET'])
+def metrics():
+    """Prometheus metrics"""
+    if metrics_hub is not None:
+        # Ship this worker's latest numbers first so the scrape includes them
+        metrics_hub.merge(REGISTRY.take())
+        body = metrics_hub.render()
+    else:
+        body = REGISTRY.render()
+    return Response(body, mimetype='text/plain; version=0.0.4')
 
 
 @app.errorhandler(404)
@@ -226,8 +944,32 @@ def server_error(e):
     return jsonify({'error': str(e)}), 500
 
 
+def profiled_wsgi(wsgi_app):
+    """
+    Wrap a WSGI app so every request thread is included in an active --profile run
+
+    The thread stays profiled until the server closes the response, so
+    streamed bodies (server-sent events, batch NDJSON) are counted too.
+    """
+    def handle(environ, start_response):
+        stack = ExitStack()
+        stack.enter_context(profile_thread())
+        try:
+            response = wsgi_app(environ, start_response)
+        except BaseException:
+            stack.close()
+            raise
+        return ClosingIterator(response, stack.close)
+    return handle
+
+
 def main():
     """Run the web application"""
+    parser = argparse.ArgumentParser(description='PokeGen web application')
+    add_profile_argument(parser)
+    args = parser.parse_args()
+    
+    configure_logging()
     print("=" * 60)
     print("PokeGen - Pokémon Mod Creator for PokeWilds")
     print("=" * 60)
@@ -239,18 +981,31 @@ def main():
     print("=" * 60)
     print()
     
-    # Check for sprite generator
-    gen = get_sprite_generator()
-    if gen:
+    # Probe for the sprite backend without importing it; torch loads with the first sprite job
+    missing = missing_modules(app.config['SPRITE_BACKEND'])
+    if not missing:
         print("✓ Sprite generator available")
     else:
-        print("⚠ Sprite generator not available (optional)")
+        print(f"⚠ Sprite generator not available (optional; missing {', '.join(missing)})")
         print("  Install with: pip install diffusers transformers torch accelerate")
     
     print()
     
-    # Run app
-    app.run(debug=True, host='localhost', port=5000)
+    # The debug reloader serves from a child process, which a profile would miss
+    use_reloader = not args.profile
+    
+    # With the reloader, only the serving child process runs retention
+    if not use_reloader or os.environ.get('WERKZEUG_RUN_MAIN') == 'true':
+        retention.start()
+    
+    # Run app (a profile is written when the server stops, e.g. on Ctrl+C)
+    if args.profile:
+        app.wsgi_app = profiled_wsgi(app.wsgi_app)
+    with profiled(args.profile, 'app'):
+        try:
+            app.run(debug=True, host='localhost', port=5000, use_reloader=use_reloader)
+        except KeyboardInterrupt:
+            pass
 
 
 if __name__ == '__main__':
@@ -0,0 +1,228 @@
+#!/usr/bin/env python3
+"""
+Asset Manifest for PokeGen
+Hashes the game's asset tree into a manifest (reusing hashes of files whose
+size and mtime are unchanged) and diffs manifests to drive delta syncs
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional
+
+from metrics import configure_logging, log_event, phase
+from profiling import add_profile_argument, profiled
+
+
+VERSION = 1
+ALGORITHM = 'sha256'
+DEFAULT_ROOTS = ('attacks', 'pokemon', 'music', 'tiles', 'sounds', 'mods')
+GAME_DIR = Path(__file__).parent.parent
+CHUNK_SIZE = 1 << 20
+
+# Partial writes from our own tools, never deployed
+IGNORED_SUFFIXES = ('.part',)
+
+
+def file_digest(path: str) -> str:
+    """Hex digest of one file (hashlib releases the GIL, so threads hash in parallel)"""
+    digest = hashlib.new(ALGORITHM)
+    with open(path, 'rb') as f:
+        while chunk := f.read(CHUNK_SIZE):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def load_manifest(path: Path) -> Dict[str, Any]:
+    """
+    Read a manifest
+
+    Raises:
+        ValueError: If the file is not a manifest of this version and algorithm
+    """
+    manifest = json.loads(Path(path).read_text())
+    if manifest.get('version') != VERSION or manifest.get('algorithm') != ALGORITHM:
+        raise ValueError(f"{path} is not a version {VERSION} {ALGORITHM} manifest")
+    return manifest
+
+
+def save_manifest(manifest: Dict[str, Any], path: Path):
+    """Write a manifest atomically"""
+    path = Path(path)
+    partial = path.with_name(path.name + '.part')
+    partial.write_text(json.dumps(manifest, indent=0, sort_keys=True))
+    partial.replace(path)
+
+
+def build_manifest(
+    game_dir: Path = GAME_DIR,
+    roots: Iterable[str] = DEFAULT_ROOTS,
+    previous: Optional[Dict[str, Any]] = None,
+    workers: Optional[int] = None
+) -> Dict[str, Any]:
+    """
+    Hash every file under some directories of the game
+
+    Args:
+        game_dir: Paths in the manifest are relative to this directory
+        roots: Directories to include, relative to game_dir (missing ones are skipped)
+        previous: Earlier manifest of the same tree; files whose size and mtime
+                  match it keep their hash without being read
+        workers: Hashing threads (default: 4 per CPU, at most 32)
+
+    Returns:
+        Manifest: {'version', 'algorithm', 'roots', 'files': {path: [size, mtime_ns, digest]}}
+        plus a 'stats' entry (files, reused, hashed, bytes_hashed, duration_ms)
+        that is not saved
+    """
+    started = time.perf_counter()
+    game_dir = Path(game_dir)
+    roots = list(roots)
+    known = (previous or {}).get('files', {})
+    files: Dict[str, List[Any]] = {}
+    jobs = []  # relative paths to hash
+    with phase('asset_manifest_scan'):
+        for root in roots:
+            stack = [root]
+            while stack:
+                relative = stack.pop()
+                try:
+                    entries = os.scandir(game_dir / relative)
+                except FileNotFoundError:
+                    continue
+                with entries:
+                    for entry in entries:
+                        path = f"{relative}/{entry.name}"
+                        if entry.is_dir(follow_symlinks=False):
+                            stack.append(path)
+                        elif entry.is_file() and not entry.name.endswith(IGNORED_SUFFIXES):
+                            stat = entry.stat()
+                            record = known.get(path)
+                            if record and record[0] == stat.st_size and record[1] == stat.st_mtime_ns:
+                                files[path] = record
+                            else:
+                                files[path] = [stat.st_size, stat.st_mtime_ns, None]
+                                jobs.append(path)
+
+    if jobs:
+        workers = workers or min(32, 4 * (os.cpu_count() or 1))
+        with phase('asset_manifest_hash', files=len(jobs)), ThreadPoolExecutor(workers) as pool:
+            for path, digest in zip(jobs, pool.map(lambda path: file_digest(str(game_dir / path)), jobs)):
+                files[path][2] = digest
+
+    stats = {'files': len(files), 'reused': len(files) - len(jobs), 'hashed': len(jobs),
+             'bytes_hashed': sum(files[path][0] for path in jobs),
+             'duration_ms': round((time.perf_counter() - started) * 1000, 2)}
+    log_event('asset_manifest.built', **stats)
+    return {'version': VERSION, 'algorithm': ALGORITHM, 'roots': roots, 'files': files, 'stats': stats}
+
+
+def diff_manifests(old: Dict[str, Any], new: Dict[str, Any]) -> Dict[str, List[str]]:
+    """
+    Files that differ between two manifests
+
+    Returns:
+        {'added': in new only, 'removed': in old only, 'changed': different size or digest},
+        each a sorted list of relative paths
+    """
+    old_files, new_files = old['files'], new['files']
+    return {
+        'added': sorted(new_files.keys() - old_files.keys()),
+        'removed': sorted(old_files.keys() - new_files.keys()),
+        'changed': sorted(path for path in old_files.keys() & new_files.keys()
+                          if old_files[path][0] != new_files[path][0] or old_files[path][2] != new_files[path][2]),
+    }
+
+
+def _print_diff(diff: Dict[str, List[str]], output_format: str):
+    if output_format == 'json':
+        print(json.dumps(diff, indent=2))
+    elif output_format == 'copy':
+        # One path per line, relative to the game directory: rsync --files-from=- <game>/ <dest>/
+        for path in sorted(diff['added'] + diff['changed']):
+            print(path)
+    elif output_format == 'delete':
+        for path in diff['removed']:
+            print(path)
+    else:
+        for label, symbol in (('added', '+'), ('removed', '-'), ('changed', '~')):
+            for path in diff[label]:
+                print(f"{symbol} {path}")
+        print(f"{len(diff['added'])} added, {len(diff['removed'])} removed, {len(diff['changed'])} changed",
+              file=sys.stderr)
+
+
+def main():
+    """Command-line interface"""
+    parser = argparse.ArgumentParser(description='Build, verify and diff manifests of the game assets')
+    parser.add_argument('--game', type=Path, default=GAME_DIR, help='Game directory (default: the parent of PokeGen)')
+    parser.add_argument('--workers', type=int, help='Hashing threads (default: 4 per CPU, at most 32)')
+    add_profile_argument(parser)
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    build = commands.add_parser('build', help='Write a manifest of the local tree')
+    build.add_argument('-o', '--output', type=Path, default=Path(__file__).parent / "asset_manifest.json",
+                       help='Manifest file, also reused for unchanged files (default: asset_manifest.json)')
+    build.add_argument('--roots', nargs='+', default=list(DEFAULT_ROOTS),
+                       help=f"Directories to include (default: {' '.join(DEFAULT_ROOTS)})")
+    build.add_argument('--full', action='store_true', help='Rehash every file')
+
+    formats = ('text', 'json', 'copy', 'delete')
+    verify = commands.add_parser('verify', help='Compare the local tree with a manifest')
+    verify.add_argument('manifest', type=Path, help='Expected manifest (e.g. from the build machine)')
+    verify.add_argument('--cache', type=Path, default=Path(__file__).parent / "asset_manifest.local.json",
+                        help='Manifest of the local tree from the last verify (default: asset_manifest.local.json)')
+    verify.add_argument('--full', action='store_true', help='Rehash every local file')
+    verify.add_argument('--format', choices=formats, default='text',
+                        help='copy/delete print only the paths to copy or delete, one per line')
+
+    diff = commands.add_parser('diff', help='Compare two manifests')
+    diff.add_argument('old', type=Path)
+    diff.add_argument('new', type=Path)
+    diff.add_argument('--format', choices=formats, default='text',
+                      help='copy/delete print only the paths to copy or delete, one per line')
+
+    args = parser.parse_args()
+    configure_logging()
+
+    with profiled(args.profile, 'asset_manifest'):
+        try:
+            if args.command == 'build':
+                previous = None
+                if not args.full and args.output.exists():
+                    previous = load_manifest(args.output)
+                manifest = build_manifest(args.game, args.roots, previous, args.workers)
+                stats = manifest.pop('stats')
+                save_manifest(manifest, args.output)
+                print(f"✓ {stats['files']} files in {args.output}: {stats['hashed']} hashed "
+                      f"({stats['bytes_hashed'] / 1024 / 1024:.1f} MB), {stats['reused']} unchanged, "
+                      f"{stats['duration_ms'] / 1000:.1f} s")
+                return
+
+            if args.command == 'verify':
+                expected = load_manifest(args.manifest)
+                previous = None
+                if not args.full and args.cache.exists():
+                    previous = load_manifest(args.cache)
+                local = build_manifest(args.game, expected['roots'], previous, args.workers)
+                local.pop('stats')
+                save_manifest(local, args.cache)
+                # Changes needed to turn the local tree into the expected one
+                difference = diff_manifests(local, expected)
+            else:
+                difference = diff_manifests(load_manifest(args.old), load_manifest(args.new))
+        except (OSError, ValueError) as e:
+            print(f"✗ {e}", file=sys.stderr)
+            sys.exit(2)
+
+    _print_diff(difference, args.format)
+    sys.exit(1 if any(difference.values()) else 0)
+
+
+if __name__ == '__main__':
+    main()
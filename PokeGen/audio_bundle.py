@@ -0,0 +1,251 @@
+#!/usr/bin/env python3
+"""
+Audio Bundle for PokeGen
+Packs cries, sound effects and attack sounds into one aligned, memory-mapped
+file with a name/offset/length/duration index
+"""
+
+import argparse
+import mmap
+import os
+import struct
+import sys
+import time
+import zlib
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Dict, Iterable, Iterator, List, Optional
+
+from metrics import configure_logging, log_event, phase
+from ogg_pages import OggError, duration
+from profiling import add_profile_argument, profiled
+
+
+MAGIC = b'PGAB'
+VERSION = 1
+DEFAULT_ALIGN = 64
+
+# magic, version, entry count, alignment, names offset, data offset
+HEADER = struct.Struct('<4sIIIQQ')
+# name offset, name length, data offset, data length, duration (seconds; NaN if unknown)
+ENTRY = struct.Struct('<IHxxQQd')
+
+# Directories bundled by default, relative to the game directory, with the files they contribute
+DEFAULT_SOURCES = (
+    ("pokemon/cries", "*.ogg"),
+    ("sounds", "*.ogg"),
+    ("attacks", "*/sound.ogg"),
+)
+
+
+@dataclass(frozen=True)
+class BundleEntry:
+    """One file in a bundle"""
+    name: str  # path relative to the game directory, e.g. pokemon/cries/025.ogg
+    offset: int
+    length: int
+    duration: Optional[float]
+
+
+def default_files(game_dir: Path) -> List[Path]:
+    """Every cry, sound effect and attack sound under the game directory"""
+    files = []
+    for directory, pattern in DEFAULT_SOURCES:
+        files.extend(sorted((game_dir / directory).glob(pattern)))
+    return files
+
+
+def build_bundle(game_dir: Path, output: Path, files: Optional[Iterable[Path]] = None,
+                 align: int = DEFAULT_ALIGN) -> Dict[str, int]:
+    """
+    Write a bundle (replaced atomically)
+
+    Args:
+        game_dir: Names in the index are paths relative to this directory
+        output: Bundle file
+        files: Files to pack (default: default_files(game_dir))
+        align: Every file's data starts at a multiple of this many bytes
+
+    Returns:
+        Counts: files, bytes of audio, bytes of the bundle
+    """
+    game_dir = Path(game_dir)
+    files = list(default_files(game_dir) if files is None else files)
+    with phase('audio_bundle_build', files=len(files)):
+        names = bytearray()
+        entries = []
+        for path in files:
+            name = path.relative_to(game_dir).as_posix().encode()
+            try:
+                seconds = duration(path)
+            except OggError:
+                seconds = float('nan')
+            entries.append([len(names), len(name), 0, path.stat().st_size, seconds, path])
+            names += name
+
+        names_offset = HEADER.size + ENTRY.size * len(entries)
+        data_offset = _aligned(names_offset + len(names), align)
+        position = data_offset
+        for entry in entries:
+            entry[2] = position
+            position = _aligned(position + entry[3], align)
+
+        output = Path(output)
+        output.parent.mkdir(parents=True, exist_ok=True)
+        partial = output.with_name(f"{output.name}.{os.getpid()}.part")
+        with partial.open('wb') as out:
+            out.write(HEADER.pack(MAGIC, VERSION, len(entries), align, names_offset, data_offset))
+            for entry in entries:
+                out.write(ENTRY.pack(*entry[:5]))
+            out.write(names)
+            for name_offset, name_length, offset, length, _, path in entries:
+                out.write(b'\0' * (offset - out.tell()))
+                data = path.read_bytes()
+                if len(data) != length:
+                    raise OSError(f"{path} changed while bundling")
+                out.write(data)
+            out.truncate(position)
+        partial.replace(output)
+
+    counts = {'files': len(entries), 'audio_bytes': sum(entry[3] for entry in entries), 'bundle_bytes': position}
+    log_event('audio_bundle.built', path=output, **counts)
+    return counts
+
+
+def _aligned(position: int, align: int) -> int:
+    return -(-position // align) * align
+
+
+class AudioBundle:
+    """
+    Read-only, memory-mapped bundle
+
+    Opening reads only the index; get() returns a memoryview straight into
+    the mapping, so no audio bytes are copied until the caller reads them.
+    Release every view before close().
+    """
+
+    def __init__(self, path: Path):
+        """
+        Open a bundle
+
+        Raises:
+            ValueError: If the file is not a bundle of this version
+        """
+        self.path = Path(path)
+        with self.path.open('rb') as f:
+            self._map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        self._view = memoryview(self._map)
+        magic, version, count, self.align, names_offset, _ = HEADER.unpack_from(self._map)
+        if magic != MAGIC or version != VERSION:
+            self.close()
+            raise ValueError(f"{self.path} is not a version {VERSION} audio bundle")
+
+        self._entries: Dict[str, BundleEntry] = {}
+        for name_offset, name_length, offset, length, seconds in ENTRY.iter_unpack(
+                self._map[HEADER.size:HEADER.size + ENTRY.size * count]):
+            start = names_offset + name_offset
+            name = self._map[start:start + name_length].decode()
+            self._entries[name] = BundleEntry(name, offset, length, None if seconds != seconds else seconds)
+
+    def __enter__(self) -> 'AudioBundle':
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def __contains__(self, name: str) -> bool:
+        return name in self._entries
+
+    def __iter__(self) -> Iterator[BundleEntry]:
+        return iter(self._entries.values())
+
+    def entry(self, name: str) -> BundleEntry:
+        """Index entry for a file (e.g. 'pokemon/cries/025.ogg'); raises KeyError"""
+        return self._entries[name]
+
+    def get(self, name: str) -> memoryview:
+        """Bytes of one file as a zero-copy view; raises KeyError"""
+        entry = self._entries[name]
+        return self._view[entry.offset:entry.offset + entry.length]
+
+    def close(self):
+        """Unmap the bundle"""
+        self._view.release()
+        self._map.close()
+
+
+def benchmark(bundle_path: Path, game_dir: Path, names: List[str], rounds: int = 5) -> Dict[str, float]:
+    """
+    Time reading every named file: separate open/read calls versus one bundle
+
+    Both sides checksum every byte so the work is the same; each is the best
+    of `rounds` runs, including opening the bundle.
+    """
+    def separate_files():
+        total = 0
+        for name in names:
+            with open(game_dir / name, 'rb') as f:
+                total = zlib.crc32(f.read(), total)
+        return total
+
+    def one_bundle():
+        total = 0
+        with AudioBundle(bundle_path) as bundle:
+            for name in names:
+                view = bundle.get(name)
+                total = zlib.crc32(view, total)
+                view.release()
+        return total
+
+    results = {}
+    for label, run in (('files', separate_files), ('bundle', one_bundle)):
+        best = float('inf')
+        for _ in range(rounds):
+            started = time.perf_counter()
+            checksum = run()
+            best = min(best, time.perf_counter() - started)
+        results[label] = best
+        results[f"{label}_checksum"] = checksum
+    return results
+
+
+def main():
+    """Command-line interface"""
+    parser = argparse.ArgumentParser(description='Pack cries and sound effects into one memory-mapped bundle')
+    parser.add_argument('--game', type=Path, default=Path(__file__).parent.parent,
+                        help='Game directory (default: the parent of PokeGen)')
+    parser.add_argument('--output', type=Path, default=Path(__file__).parent / "audio.bundle",
+                        help='Bundle file (default: audio.bundle)')
+    parser.add_argument('--align', type=int, default=DEFAULT_ALIGN,
+                        help=f'Byte alignment of each file (default: {DEFAULT_ALIGN})')
+    parser.add_argument('--benchmark', action='store_true',
+                        help='Compare loading every cry from the bundle with opening each file')
+    add_profile_argument(parser)
+
+    args = parser.parse_args()
+    configure_logging()
+
+    with profiled(args.profile, 'audio_bundle'):
+        counts = build_bundle(args.game, args.output, align=args.align)
+        print(f"✓ Bundled {counts['files']} files ({counts['audio_bytes'] / 1024 / 1024:.1f} MB) into "
+              f"{args.output} ({counts['bundle_bytes'] / 1024 / 1024:.1f} MB)")
+
+        if args.benchmark:
+            with AudioBundle(args.output) as bundle:
+                cries = [entry.name for entry in bundle if entry.name.startswith('pokemon/cries/')]
+            results = benchmark(args.output, args.game, cries)
+            if results['files_checksum'] != results['bundle_checksum']:
+                print("✗ Bundle contents differ from the files", file=sys.stderr)
+                sys.exit(1)
+            print(f"Loading {len(cries)} cries (best of 5):")
+            print(f"  separate files: {results['files'] * 1000:7.2f} ms ({len(cries)} opens)")
+            print(f"  one bundle:     {results['bundle'] * 1000:7.2f} ms (1 open, 1 mmap)")
+            print(f"  {results['files'] / results['bundle']:.1f}x faster")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,153 @@
+#!/usr/bin/env python3
+"""
+Batch Import for PokeGen
+Streaming readers and a bounded-parallel runner for bulk mod creation
+"""
+
+import codecs
+import json
+import tempfile
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from typing import Any, BinaryIO, Callable, Dict, Iterator, List, Tuple
+
+
+CHUNK_SIZE = 64 * 1024
+
+
+def iter_ndjson(stream: BinaryIO) -> Iterator[Any]:
+    """Yield one decoded value per non-blank line of a binary stream"""
+    for number, line in enumerate(stream, start=1):
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            yield json.loads(line)
+        except ValueError as e:
+            raise ValueError(f"Line {number}: invalid JSON ({e})")
+
+
+def iter_json_array(stream: BinaryIO) -> Iterator[Any]:
+    """Yield the elements of a top-level JSON array without loading the whole document"""
+    text = codecs.getincrementaldecoder('utf-8')()
+    decoder = json.JSONDecoder()
+    buffer = ''
+    pos = 0
+    eof = False
+
+    def fill():
+        nonlocal buffer, pos, eof
+        chunk = stream.read(CHUNK_SIZE)
+        eof = not chunk
+        buffer = buffer[pos:] + text.decode(chunk, final=eof)
+        pos = 0
+
+    def next_char():
+        nonlocal pos
+        while True:
+            while pos < len(buffer) and buffer[pos].isspace():
+                pos += 1
+            if pos < len(buffer):
+                return buffer[pos]
+            if eof:
+                return ''
+            fill()
+
+    def end_of_array():
+        nonlocal pos
+        pos += 1
+        if next_char():
+            raise ValueError('Unexpected data after the JSON array')
+
+    if next_char() != '[':
+        raise ValueError('Expected a JSON array')
+    pos += 1
+    if next_char() == ']':
+        end_of_array()
+        return
+
+    while True:
+        next_char()
+        # Only trust a decoded value once more input follows it, so a value
+        # split across chunks is never returned half-read
+        while True:
+            try:
+                item, end = decoder.raw_decode(buffer, pos)
+                if end < len(buffer) or eof:
+                    break
+            except ValueError:
+                if eof:
+                    raise ValueError('Invalid JSON array')
+            fill()
+        pos = end
+        yield item
+
+        separator = next_char()
+        if separator == ']':
+            end_of_array()
+            return
+        if separator != ',':
+            raise ValueError('Invalid JSON array')
+        pos += 1
+
+
+def spool_validated(
+    items: Iterator[Any],
+    validate: Callable[[Any], Dict[str, Any]],
+    max_errors: int = 100
+) -> Tuple[Any, int, List[Dict[str, Any]]]:
+    """
+    Validate every item and spool the normalized results to a temporary file
+
+    Args:
+        items: Raw batch entries
+        validate: Returns the normalized entry or raises ValueError
+        max_errors: Stop collecting error details after this many
+
+    Returns:
+        (spool file positioned at the start, entry count, errors); the caller
+        closes the spool
+    """
+    spool = tempfile.TemporaryFile(mode='w+', encoding='utf-8')
+    count = 0
+    errors = []
+    for index, item in enumerate(items):
+        count += 1
+        try:
+            spool.write(json.dumps(validate(item)) + '\n')
+        except (ValueError, TypeError, KeyError, AttributeError) as e:
+            if len(errors) < max_errors:
+                errors.append({'index': index, 'error': str(e)})
+            else:
+                errors[-1] = {'index': index, 'error': 'Too many errors; stopped listing them'}
+    spool.seek(0)
+    return spool, count, errors
+
+
+def run_bounded(
+    entries: Iterator[Dict[str, Any]],
+    work: Callable[[Dict[str, Any]], Dict[str, Any]],
+    parallelism: int = 8
+) -> Iterator[Dict[str, Any]]:
+    """
+    Run work(entry) on a thread pool with at most `parallelism` entries in flight
+
+    Yields:
+        Result dicts (with the entry index added) in completion order
+    """
+    with ThreadPoolExecutor(max_workers=parallelism) as pool:
+        in_flight: Dict[Future, int] = {}
+        for index, entry in enumerate(entries):
+            in_flight[pool.submit(work, entry)] = index
+            yield from _drain(in_flight, block=len(in_flight) >= parallelism)
+        while in_flight:
+            yield from _drain(in_flight, block=True)
+
+
+def _drain(in_flight: Dict[Future, int], block: bool) -> Iterator[Dict[str, Any]]:
+    """Yield finished results; when blocking, wait for at least one"""
+    if block:
+        finished, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+    else:
+        finished = [future for future in in_flight if future.done()]
+    for future in finished:
+        yield {'index': in_flight.pop(future), **future.result()}
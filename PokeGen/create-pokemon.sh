@@ -14,8 +14,8 @@ if [ $# -eq 0 ]; then
     echo "Usage: ./create-pokemon.sh <name> <dex> <type1> [options]"
     echo ""
     echo "Examples:"
-    echo "  ./create-pokemon.sh Flamewing 888 FIRE FLYING --hp 70 --att 100"
-    echo "  ./create-pokemon.sh Aquadrift 889 WATER FLYING --template pelipper"
+    echo "  ./create-pokemon.sh Flamewing 901 FIRE FLYING --hp 70 --att 100"
+    echo "  ./create-pokemon.sh Aquadrift 902 WATER FLYING --template pelipper"
     echo ""
     echo "Options:"
     echo "  --dex N              Pokédex number"
@@ -0,0 +1,178 @@
+#!/usr/bin/env python3
+"""
+Cry Lengths for PokeGen
+Regenerates the .length file next to every cry .ogg from Ogg page headers,
+in parallel, only for files that changed since the last run
+"""
+
+import argparse
+import json
+import logging
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from metrics import configure_logging, log_event, phase
+from ogg_pages import OggError, duration
+from profiling import add_profile_argument, profiled
+
+
+def length_text(seconds: float) -> str:
+    """.length file contents: the duration as Python prints it (e.g. 3.876997716894977)"""
+    return repr(seconds)
+
+
+def _stat_pair(ogg: os.stat_result, length: Path) -> Tuple[int, int, int, int]:
+    """(ogg size, ogg mtime, length size, length mtime); length fields are -1 when it is missing"""
+    try:
+        stat = length.stat()
+        return ogg.st_size, ogg.st_mtime_ns, stat.st_size, stat.st_mtime_ns
+    except FileNotFoundError:
+        return ogg.st_size, ogg.st_mtime_ns, -1, -1
+
+
+def _update(ogg: Path, length: Path, dry_run: bool) -> str:
+    """Write one .length file if its contents differ; returns 'written' or 'unchanged'"""
+    text = length_text(duration(ogg))
+    try:
+        if length.read_text().strip() == text:
+            return 'unchanged'
+    except FileNotFoundError:
+        pass
+    if not dry_run:
+        partial = length.with_name(length.name + '.part')
+        partial.write_text(text)
+        partial.replace(length)
+    return 'written'
+
+
+def index_lengths(
+    directories: Iterable[Path],
+    cache_path: Optional[Path] = None,
+    workers: Optional[int] = None,
+    dry_run: bool = False
+) -> Dict[str, Any]:
+    """
+    Bring every <name>.length in some directories up to date with <name>.ogg
+
+    A pair whose .ogg and .length sizes and mtimes match the cache from the
+    last run is skipped without opening either file. Everything else is read
+    (first and last Ogg page only) on a thread pool.
+
+    Args:
+        directories: Directories of .ogg files (e.g. pokemon/cries)
+        cache_path: JSON file remembering what was verified; None to check every file
+        workers: Threads reading files (default: 4 per CPU, at most 32)
+        dry_run: Report which files would change without writing
+
+    Returns:
+        Counts of files checked, skipped, written and failed, with names of failures
+    """
+    started = time.perf_counter()
+    cache: Dict[str, Dict[str, List[int]]] = {}
+    if cache_path is not None:
+        try:
+            cache = json.loads(Path(cache_path).read_text())
+        except (OSError, ValueError):
+            cache = {}
+
+    report: Dict[str, Any] = {'files': 0, 'skipped': 0, 'unchanged': 0, 'written': 0,
+                              'failed': [], 'orphaned': []}
+    jobs = []  # (directory key, name, ogg path, length path)
+    fresh: Dict[str, Dict[str, List[int]]] = {}
+    with phase('cry_lengths_scan'):
+        for directory in directories:
+            directory = Path(directory)
+            key = str(directory.resolve())
+            known = cache.get(key, {})
+            seen = fresh.setdefault(key, {})
+            lengths, oggs = set(), set()
+            with os.scandir(directory) as entries:
+                for entry in entries:
+                    if entry.name.endswith('.length'):
+                        lengths.add(entry.name[:-len('.length')])
+                    if not entry.name.endswith('.ogg') or not entry.is_file():
+                        continue
+                    name = entry.name[:-len('.ogg')]
+                    oggs.add(name)
+                    length = directory / f"{name}.length"
+                    stats = list(_stat_pair(entry.stat(), length))
+                    report['files'] += 1
+                    if known.get(name) == stats:
+                        seen[name] = stats
+                        report['skipped'] += 1
+                    else:
+                        jobs.append((key, name, Path(entry.path), length))
+            report['orphaned'] += [str(directory / f"{name}.length") for name in sorted(lengths - oggs)]
+
+    if jobs:
+        workers = workers or min(32, 4 * (os.cpu_count() or 1))
+        with phase('cry_lengths_read', files=len(jobs)), ThreadPoolExecutor(workers) as pool:
+            results = pool.map(lambda job: _try_update(job[2], job[3], dry_run), jobs)
+            for (key, name, ogg, length), outcome in zip(jobs, results):
+                if outcome in ('written', 'unchanged'):
+                    report[outcome] += 1
+                    if not dry_run:
+                        fresh[key][name] = list(_stat_pair(ogg.stat(), length))
+                else:
+                    report['failed'].append({'file': str(ogg), 'error': outcome})
+
+    if cache_path is not None and not dry_run and (jobs or fresh.keys() - cache.keys()):
+        cache.update(fresh)
+        partial = Path(cache_path).with_suffix('.part')
+        try:
+            partial.write_text(json.dumps(cache))
+            partial.replace(cache_path)
+        except OSError as e:
+            log_event('cry_lengths.cache_failed', level=logging.WARNING, error=e)
+
+    report['checked'] = len(jobs)
+    report['duration_ms'] = round((time.perf_counter() - started) * 1000, 2)
+    log_event('cry_lengths.indexed', files=report['files'], checked=len(jobs), written=report['written'],
+              failed=len(report['failed']), duration_ms=report['duration_ms'])
+    return report
+
+
+def _try_update(ogg: Path, length: Path, dry_run: bool) -> str:
+    try:
+        return _update(ogg, length, dry_run)
+    except (OSError, OggError) as e:
+        return str(e)
+
+
+def main():
+    """Command-line interface"""
+    parser = argparse.ArgumentParser(description='Regenerate .length files for Ogg cries and sounds')
+    parser.add_argument('directories', nargs='*', type=Path,
+                        default=[Path(__file__).parent.parent / "pokemon" / "cries"],
+                        help='Directories of .ogg files (default: ../pokemon/cries)')
+    parser.add_argument('--cache', type=Path, default=Path(__file__).parent / "cry_lengths.json",
+                        help='Cache of verified files (default: cry_lengths.json)')
+    parser.add_argument('--full', action='store_true', help='Ignore the cache and check every file')
+    parser.add_argument('--workers', type=int, help='Reader threads (default: 4 per CPU, at most 32)')
+    parser.add_argument('--dry-run', action='store_true', help='Only report which .length files would change')
+    add_profile_argument(parser)
+
+    args = parser.parse_args()
+    configure_logging()
+
+    with profiled(args.profile, 'cry_lengths'):
+        report = index_lengths(args.directories, None if args.full else args.cache,
+                               workers=args.workers, dry_run=args.dry_run)
+
+    verb = "Would write" if args.dry_run else "Wrote"
+    print(f"{report['files']} files: {report['skipped']} unchanged since last run, "
+          f"{report['checked']} checked in {report['duration_ms']:.1f} ms")
+    print(f"  {verb} {report['written']} .length files; {report['unchanged']} already correct")
+    for orphan in report['orphaned']:
+        print(f"  ! {orphan} has no .ogg")
+    for failure in report['failed']:
+        print(f"  ✗ {failure['file']}: {failure['error']}")
+    sys.exit(1 if report['failed'] else 0)
+
+
+if __name__ == '__main__':
+    main()
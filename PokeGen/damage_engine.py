@@ -0,0 +1,510 @@
+#!/usr/bin/env python3
+"""
+Damage Engine for PokeGen
+Vectorized type matchups and damage ranges over the shipped move and base stat
+data, for checking a new Pokémon's balance against every shipped species
+"""
+
+import argparse
+import json
+import re
+import threading
+import time
+from dataclasses import asdict
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from metrics import configure_logging, log_event, phase
+from pokemon_mod_generator import PokemonModGenerator, PokemonStats
+from profiling import add_profile_argument, profiled
+from species_table import SpeciesData
+
+
+DEFAULT_LEVEL = 50
+DV = 15  # Crystal determinant values; stat experience is left at zero
+RANDOM_MIN = 217 / 255  # Gen 2 damage rolls run from 217/255 to 255/255
+STAB = 1.5
+
+STAT_NAMES = ('hp', 'attack', 'defense', 'sp_atk', 'sp_def', 'speed')
+HP, ATTACK, DEFENSE, SP_ATK, SP_DEF, SPEED = range(6)
+ASM_STAT_ORDER = (HP, ATTACK, DEFENSE, SPEED, SP_ATK, SP_DEF)  # column order in base_stats/*.asm
+
+STATUS, PHYSICAL, SPECIAL = 0, 1, 2
+CATEGORIES = {'STATUS': STATUS, 'PHYSICAL': PHYSICAL, 'SPECIAL': SPECIAL}
+
+# Hits per use (fewest, most) for multi-hit move effects
+MULTI_HIT = {
+    'EFFECT_MULTI_HIT': (2, 5),
+    'EFFECT_DOUBLE_HIT': (2, 2),
+    'EFFECT_POISON_MULTI_HIT': (2, 2),
+    'EFFECT_TRIPLE_KICK': (1, 3),
+}
+
+# Attacking type: (super effective against, not very effective against, no effect on)
+TYPE_CHART = {
+    'NORMAL': ((), ('ROCK', 'STEEL'), ('GHOST',)),
+    'FIGHTING': (('NORMAL', 'ROCK', 'STEEL', 'ICE', 'DARK'), ('FLYING', 'POISON', 'BUG', 'PSYCHIC', 'FAIRY'), ('GHOST',)),
+    'FLYING': (('FIGHTING', 'BUG', 'GRASS'), ('ROCK', 'STEEL', 'ELECTRIC'), ()),
+    'POISON': (('GRASS', 'FAIRY'), ('POISON', 'GROUND', 'ROCK', 'GHOST'), ('STEEL',)),
+    'GROUND': (('POISON', 'ROCK', 'STEEL', 'FIRE', 'ELECTRIC'), ('BUG', 'GRASS'), ('FLYING',)),
+    'ROCK': (('FLYING', 'BUG', 'FIRE', 'ICE'), ('FIGHTING', 'GROUND', 'STEEL'), ()),
+    'BUG': (('GRASS', 'PSYCHIC', 'DARK'), ('FIGHTING', 'FLYING', 'POISON', 'GHOST', 'STEEL', 'FIRE', 'FAIRY'), ()),
+    'GHOST': (('GHOST', 'PSYCHIC'), ('DARK',), ('NORMAL',)),
+    'STEEL': (('ROCK', 'ICE', 'FAIRY'), ('STEEL', 'FIRE', 'WATER', 'ELECTRIC'), ()),
+    'FIRE': (('BUG', 'STEEL', 'GRASS', 'ICE'), ('ROCK', 'FIRE', 'WATER', 'DRAGON'), ()),
+    'WATER': (('GROUND', 'ROCK', 'FIRE'), ('WATER', 'GRASS', 'DRAGON'), ()),
+    'GRASS': (('GROUND', 'ROCK', 'WATER'), ('FLYING', 'POISON', 'BUG', 'STEEL', 'FIRE', 'GRASS', 'DRAGON'), ()),
+    'ELECTRIC': (('FLYING', 'WATER'), ('GRASS', 'ELECTRIC', 'DRAGON'), ('GROUND',)),
+    'PSYCHIC': (('FIGHTING', 'POISON'), ('STEEL', 'PSYCHIC'), ('DARK',)),
+    'ICE': (('FLYING', 'GROUND', 'GRASS', 'DRAGON'), ('STEEL', 'FIRE', 'WATER', 'ICE'), ()),
+    'DRAGON': (('DRAGON',), ('STEEL',), ('FAIRY',)),
+    'DARK': (('GHOST', 'PSYCHIC'), ('FIGHTING', 'DARK', 'FAIRY'), ()),
+    'FAIRY': (('FIGHTING', 'DRAGON', 'DARK'), ('POISON', 'STEEL', 'FIRE'), ()),
+}
+
+# TYPE_MAP order first (the values generated mods store), then types it has no value for
+TYPES = (sorted(PokemonModGenerator.TYPE_MAP, key=PokemonModGenerator.TYPE_MAP.get)
+         + [t for t in TYPE_CHART if t not in PokemonModGenerator.TYPE_MAP])
+TYPE_INDEX = {t: i for i, t in enumerate(TYPES)}
+NO_TYPE = len(TYPES)  # row/column of ones for moves like CURSE whose type has no matchups
+
+STATS_LINE = re.compile(r'^\s*db\s+(\d+),\s*(\d+),\s*(\d+),\s*(\d+),\s*(\d+),\s*(\d+)\s*$', re.M)
+TYPES_LINE = re.compile(r'^\s*db\s+(\w+),\s*(\w+)\s*;\s*type', re.M)
+TMHM_LINE = re.compile(r'^\s*tmhm\s+(.+)$', re.M)
+LEARNSET_LABEL = re.compile(r'^(\w+)EvosAttacks:')
+LEARNSET_MOVE = re.compile(r'^\s*db\s+\d+,\s*([A-Z0-9_]+)\s*(?:;.*)?$')
+
+
+def effectiveness_table() -> np.ndarray:
+    """Damage multiplier by [attacking type, defending type]"""
+    table = np.ones((len(TYPES) + 1, len(TYPES) + 1), dtype=np.float32)
+    for attacking, (strong, weak, immune) in TYPE_CHART.items():
+        row = TYPE_INDEX[attacking]
+        for multiplier, defending in ((2, strong), (0.5, weak), (0, immune)):
+            for t in defending:
+                table[row, TYPE_INDEX[t]] = multiplier
+    return table
+
+
+def stats_at_level(base: np.ndarray, level: int) -> np.ndarray:
+    """
+    Crystal stat formula with maximum DVs and no stat experience
+
+    Args:
+        base: Base stats, last axis in STAT_NAMES order
+
+    Returns:
+        Actual stats at `level`, same shape
+    """
+    base = np.asarray(base, dtype=np.int32)
+    stats = (base + DV) * 2 * level // 100 + 5
+    stats[..., HP] += level + 5
+    return stats
+
+
+def _key(name: str) -> str:
+    """Species name as comparable across files (Nidoran_F, nidoran_f, MrMime, mrmime)"""
+    return re.sub(r'[^a-z0-9]', '', name.lower())
+
+
+def _type_index(name: str) -> int:
+    try:
+        return TYPE_INDEX[name.upper()]
+    except KeyError:
+        raise ValueError(f"Unknown type: {name!r}") from None
+
+
+class DamageEngine:
+    """
+    Shipped species and moves as NumPy arrays
+
+    pokemon/moves.asm, pokemon/base_stats/*.asm and pokemon/evos_attacks.asm
+    are parsed once, on first use; move categories come from the compiled
+    species table (spec_phys_lookup.txt). After that a
+    species-by-move damage table against any defender is a few broadcast array
+    operations, with no Python loop over species or moves.
+    """
+
+    def __init__(self, data_dir: Path, level: int = DEFAULT_LEVEL, species_data: Optional[SpeciesData] = None):
+        """
+        Initialize damage engine
+
+        Args:
+            data_dir: The game's pokemon/ directory
+            level: Level every matchup is computed at
+            species_data: Compiled species table (default: species_table.bin next to this file)
+        """
+        self.data_dir = Path(data_dir)
+        self.level = level
+        self.species_data = species_data or SpeciesData(self.data_dir, Path(__file__).parent / "species_table.bin")
+        self.effectiveness = effectiveness_table()
+        self._loaded = False
+        self._lock = threading.Lock()
+
+    def _ensure_loaded(self):
+        if not self._loaded:
+            with self._lock:
+                if not self._loaded:
+                    with phase('damage_engine_load'):
+                        self._load()
+                    self._loaded = True
+
+    def _load(self):
+        # Moves
+        table = self.species_data.table()
+        names, power, move_type, accuracy, category, fixed, hits = [], [], [], [], [], [], []
+        for line in (self.data_dir / "moves.asm").read_text().splitlines():
+            if not line.startswith('\tmove '):
+                continue
+            fields = [field.strip() for field in line[len('\tmove '):].split(',')]
+            name, effect, move_power, kind, move_accuracy = fields[0], fields[1], int(fields[2]), fields[3], int(fields[4])
+            names.append(name)
+            move_type.append(TYPE_INDEX.get(kind, NO_TYPE))
+            accuracy.append(move_accuracy)
+            hits.append(MULTI_HIT.get(effect, (1, 1)))
+            # Fixed damage: SONICBOOM/DRAGON_RAGE deal their power, SEISMIC_TOSS/NIGHT_SHADE the level
+            fixed.append(move_power if effect == 'EFFECT_STATIC_DAMAGE'
+                         else self.level if effect == 'EFFECT_LEVEL_DAMAGE' else 0)
+            # Power 1 marks damage the data can't predict (OHKO moves, RETURN, MAGNITUDE...)
+            power.append(move_power if move_power > 1 and not fixed[-1] else 0)
+            category.append(CATEGORIES[table.move_category(name) or 'STATUS'])
+
+        self.moves: List[str] = names
+        self.move_index = {name: i for i, name in enumerate(names)}
+        self.power = np.array(power, dtype=np.float32)
+        self.move_type = np.array(move_type, dtype=np.intp)
+        self.accuracy = np.array(accuracy, dtype=np.int16)
+        self.category = np.array(category, dtype=np.int8)
+        self.fixed = np.array(fixed, dtype=np.float32)
+        self.hits = np.array(hits, dtype=np.float32)  # [moves, (fewest, most)]
+        self.damaging = (self.category != STATUS) & ((self.power > 0) | (self.fixed > 0))
+
+        # Species
+        species, base, types, tmhm = [], [], [], []
+        for path in sorted((self.data_dir / "base_stats").glob('*.asm')):
+            text = path.read_text()
+            stats, typing = STATS_LINE.search(text), TYPES_LINE.search(text)
+            if stats is None or typing is None:
+                log_event('damage_engine.unparsed', file=path)
+                continue
+            row = [0] * 6
+            for column, stat in zip(ASM_STAT_ORDER, stats.groups()):
+                row[column] = int(stat)
+            species.append(path.stem)
+            base.append(row)
+            types.append([TYPE_INDEX.get(t, NO_TYPE) for t in typing.groups()])
+            learned = TMHM_LINE.search(text)
+            tmhm.append([m.strip() for m in learned.group(1).split(',')] if learned else [])
+
+        self.species: List[str] = species
+        self.species_index = {name: i for i, name in enumerate(species)}
+        self.base_stats = np.array(base, dtype=np.int32)
+        self.stats = stats_at_level(self.base_stats, self.level)
+        self.types = np.array(types, dtype=np.intp)
+
+        # Learnsets: level-up moves from evos_attacks.asm plus TM/HM moves
+        learnset = np.zeros((len(species), len(names)), dtype=bool)
+        by_key = {_key(name): i for i, name in enumerate(species)}
+        for row, moves in enumerate(tmhm):
+            learnset[row, [self.move_index[m] for m in moves if m in self.move_index]] = True
+        row = None
+        for line in (self.data_dir / "evos_attacks.asm").read_text().splitlines():
+            label = LEARNSET_LABEL.match(line)
+            if label:
+                row = by_key.get(_key(label.group(1)))
+                continue
+            move = LEARNSET_MOVE.match(line)
+            if row is not None and move and move.group(1) in self.move_index:
+                learnset[row, self.move_index[move.group(1)]] = True
+        self.learnset = learnset & self.damaging
+
+        log_event('damage_engine.loaded', species=len(species), moves=len(names))
+
+    def damage_ranges(
+        self,
+        attacker_stats: np.ndarray,
+        attacker_types: np.ndarray,
+        defender_stats: np.ndarray,
+        defender_types: np.ndarray,
+        moves: Optional[np.ndarray] = None
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Lowest and highest damage of each move, for every attacker/defender pair
+
+        Args:
+            attacker_stats: [attackers, 6] stats at the engine's level
+            attacker_types: [attackers, 2] type indexes
+            defender_stats: [defenders, 6]
+            defender_types: [defenders, 2]
+            moves: Move indexes, [moves] for all attackers or [attackers, moves]
+                for a list per attacker; defaults to every move
+
+        Returns:
+            (low, high), each [attackers, defenders, moves]; 0 for status moves
+        """
+        self._ensure_loaded()
+        if moves is None:
+            moves = np.arange(len(self.moves))
+        moves = np.broadcast_to(moves, (len(attacker_stats), np.shape(moves)[-1]))  # [A, M]
+        attacker_stats = attacker_stats.astype(np.float32)
+        defender_stats = defender_stats.astype(np.float32)
+        physical = self.category[moves] == PHYSICAL
+        move_type = self.move_type[moves]
+        fixed = self.fixed[moves][:, None, :]
+
+        attack = np.where(physical, attacker_stats[:, ATTACK, None], attacker_stats[:, SP_ATK, None])
+        defense = np.where(physical[:, None, :], defender_stats[None, :, DEFENSE, None],
+                           defender_stats[None, :, SP_DEF, None])
+        stab = np.where((move_type == attacker_types[:, :1]) | (move_type == attacker_types[:, 1:]),
+                        np.float32(STAB), np.float32(1))
+
+        # Second type only counts once when both slots hold the same type
+        first = self.effectiveness[move_type[:, None, :], defender_types[None, :, 0, None]]
+        second = self.effectiveness[move_type[:, None, :], defender_types[None, :, 1, None]]
+        effect = first * np.where((defender_types[:, 1] != defender_types[:, 0])[None, :, None], second, np.float32(1))
+
+        level_factor = np.float32(self.level * 2 // 5 + 2)
+        base = np.floor(np.floor(level_factor * (self.power[moves] * attack)[:, None, :] / defense) / 50) + 2
+        high = np.floor(np.floor(base * stab[:, None, :]) * effect)
+        high = np.where(fixed > 0, fixed * (effect > 0), high)
+        low = np.where(fixed > 0, high, np.floor(high * np.float32(RANDOM_MIN)))
+
+        damaging = self.damaging[moves][:, None, :]
+        low *= np.where(damaging, self.hits[moves, 0][:, None, :], 0)
+        high *= np.where(damaging, self.hits[moves, 1][:, None, :], 0)
+        return low, high
+
+    def damage_matrix(self, stats: PokemonStats, type1: str, type2: Optional[str] = None) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Damage every shipped species deals to a Pokémon with every move
+
+        Returns:
+            (low, high), each [species, moves]
+        """
+        self._ensure_loaded()
+        defender_stats, defender_types = self._combatant(stats, type1, type2)
+        low, high = self.damage_ranges(self.stats, self.types, defender_stats, defender_types)
+        return low[:, 0, :], high[:, 0, :]
+
+    def matchup_matrix(self, chunk: int = 64) -> np.ndarray:
+        """
+        Best damage each shipped species can deal to each other species
+
+        Only moves the attacker learns are tried: each species' learnset is
+        padded to a common width, so the table is species x species x the
+        longest learnset rather than every move in the game.
+
+        Returns:
+            [attackers, defenders] highest roll as a fraction of the defender's HP
+        """
+        self._ensure_loaded()
+        count = len(self.species)
+        width = max(1, int(self.learnset.sum(axis=1).max()))
+        padding = int(np.flatnonzero(~self.damaging)[0])  # any status move deals 0
+        learned = np.full((count, width), padding, dtype=np.intp)
+        for row in range(count):
+            indexes = np.flatnonzero(self.learnset[row])
+            learned[row, :len(indexes)] = indexes
+
+        best = np.empty((count, count), dtype=np.float32)
+        for start in range(0, count, chunk):
+            stop = min(start + chunk, count)
+            _, high = self.damage_ranges(self.stats[start:stop], self.types[start:stop],
+                                         self.stats, self.types, learned[start:stop])
+            best[start:stop] = high.max(axis=2) / self.stats[None, :, HP]
+        return best
+
+    def balance_report(
+        self,
+        stats: PokemonStats,
+        type1: str,
+        type2: Optional[str] = None,
+        moves: Optional[Sequence[str]] = None,
+        top: int = 10
+    ) -> Dict[str, Any]:
+        """
+        How a new Pokémon compares with every shipped species
+
+        Args:
+            stats: Base stats of the new Pokémon
+            type1: Primary type
+            type2: Secondary type (optional)
+            moves: Its damaging moves; defaults to every move of its own types
+            top: Longest list returned for each section
+
+        Returns:
+            Stat total rank, speed comparison, which species can OHKO it and
+            which species it can OHKO, as JSON-serializable data
+
+        Raises:
+            ValueError: For an unknown type or move
+        """
+        self._ensure_loaded()
+        started = time.perf_counter()
+        mod_stats, mod_types = self._combatant(stats, type1, type2)
+        if moves:
+            unknown = [m for m in moves if m.upper() not in self.move_index]
+            if unknown:
+                raise ValueError(f"Unknown move(s): {', '.join(unknown)}")
+            usable = np.zeros(len(self.moves), dtype=bool)
+            usable[[self.move_index[m.upper()] for m in moves]] = True
+            usable &= self.damaging
+        else:
+            usable = self.damaging & np.isin(self.move_type, mod_types[0])
+
+        # Stat totals
+        totals = self.base_stats.sum(axis=1)
+        total = sum(asdict(stats).values())
+        rank = int((totals > total).sum()) + 1
+
+        # Speed at level
+        speed = int(mod_stats[0, SPEED])
+        species = np.array(self.species)
+        outspeeds = species[self.stats[:, SPEED] < speed]
+        ties = species[self.stats[:, SPEED] == speed]
+
+        # Shipped species attacking the new Pokémon, with moves they learn
+        low, high = self.damage_ranges(self.stats, self.types, mod_stats, mod_types)
+        low = np.where(self.learnset, low[:, 0, :], 0)
+        high = np.where(self.learnset, high[:, 0, :], 0)
+        ohko_by = self._knockouts(low, high, np.full(len(species), mod_stats[0, HP]), top)
+
+        # The new Pokémon attacking shipped species
+        low, high = self.damage_ranges(mod_stats, mod_types, self.stats, self.types)
+        low = np.where(usable, low[0], 0)
+        high = np.where(usable, high[0], 0)
+        ohkos = self._knockouts(low, high, self.stats[:, HP], top)
+
+        defending = self.effectiveness[:len(TYPES), mod_types[0, 0]] * (
+            self.effectiveness[:len(TYPES), mod_types[0, 1]] if mod_types[0, 1] != mod_types[0, 0] else 1)
+
+        return {
+            'level': self.level,
+            'stats': {name: int(value) for name, value in zip(STAT_NAMES, mod_stats[0])},
+            'stat_total': total,
+            'stat_total_rank': rank,
+            'stat_total_percentile': round(100 * float((totals < total).mean()), 1),
+            'species': len(species),
+            'speed': {
+                'outspeeds': len(outspeeds),
+                'ties': ties.tolist(),
+                'outsped_by': int((self.stats[:, SPEED] > speed).sum()),
+                'fastest_outsped': outspeeds[np.argsort(-self.stats[self.stats[:, SPEED] < speed, SPEED])][:top].tolist(),
+            },
+            'weak_to': {t: float(m) for t, m in zip(TYPES, defending) if m > 1},
+            'resists': {t: float(m) for t, m in zip(TYPES, defending) if m < 1},
+            'ohko_by': ohko_by,
+            'ohkos': ohkos,
+            'duration_ms': round((time.perf_counter() - started) * 1000, 2),
+        }
+
+    def _knockouts(self, low: np.ndarray, high: np.ndarray, hp: np.ndarray, top: int) -> Dict[str, Any]:
+        """
+        Summarize [species, moves] damage against HP into guaranteed and possible one-hit KOs
+
+        Each species is reported with one move: the one with the highest low roll
+        when that KOs on any roll, else the one with the highest high roll. A
+        multi-hit move counts as one use, with its fewest hits on the low roll
+        and its most hits on the high roll.
+        """
+        rows = np.arange(len(hp))
+        guaranteed = low.max(axis=1) >= hp
+        best = np.where(guaranteed, low.argmax(axis=1), high.argmax(axis=1))
+        best_low, best_high = low[rows, best], high[rows, best]
+        possible = best_high >= hp
+        order = np.argsort(-best_high / hp)
+        return {
+            'guaranteed': int(guaranteed.sum()),
+            'possible': int(possible.sum()),
+            'top': [
+                {
+                    'species': self.species[i],
+                    'move': self.moves[best[i]],
+                    'min_percent': round(100 * float(best_low[i] / hp[i]), 1),
+                    'max_percent': round(100 * float(best_high[i] / hp[i]), 1),
+                    'hits': [int(n) for n in self.hits[best[i]]],
+                    'guaranteed': bool(guaranteed[i]),
+                }
+                for i in order[:top] if possible[i]
+            ],
+        }
+
+    def _combatant(self, stats: PokemonStats, type1: str, type2: Optional[str]) -> Tuple[np.ndarray, np.ndarray]:
+        """[1, 6] stats at level and [1, 2] types for one Pokémon"""
+        first = _type_index(type1)
+        second = _type_index(type2) if type2 else first
+        base = np.array([[getattr(stats, name) for name in STAT_NAMES]], dtype=np.int32)
+        return stats_at_level(base, self.level), np.array([[first, second]], dtype=np.intp)
+
+
+def main():
+    """Command-line interface"""
+    parser = argparse.ArgumentParser(description='Check a new Pokémon against every shipped species')
+    parser.add_argument('--type1', default='NORMAL', help='Primary type (FIRE, WATER, etc.)')
+    parser.add_argument('--type2', help='Secondary type (optional)')
+    parser.add_argument('--hp', type=int, default=45, help='HP stat (default: 45)')
+    parser.add_argument('--att', type=int, default=49, help='Attack stat (default: 49)')
+    parser.add_argument('--defense', type=int, default=49, help='Defense stat (default: 49)')
+    parser.add_argument('--spa', type=int, default=65, help='Sp. Atk stat (default: 65)')
+    parser.add_argument('--spd', type=int, default=65, help='Sp. Def stat (default: 65)')
+    parser.add_argument('--spe', type=int, default=45, help='Speed stat (default: 45)')
+    parser.add_argument('--moves', help='Comma-separated moves (default: every move of its types)')
+    parser.add_argument('--level', type=int, default=DEFAULT_LEVEL, help=f'Level (default: {DEFAULT_LEVEL})')
+    parser.add_argument('--data', type=Path, default=Path(__file__).parent.parent / "pokemon",
+                        help='Game data directory (default: ../pokemon)')
+    parser.add_argument('--json', action='store_true', help='Print the report as JSON')
+    parser.add_argument('--benchmark', action='store_true', help='Also time the full species x species matrix')
+    add_profile_argument(parser)
+
+    args = parser.parse_args()
+    configure_logging()
+
+    with profiled(args.profile, 'damage_engine'):
+        engine = DamageEngine(args.data, level=args.level)
+        stats = PokemonStats(hp=args.hp, attack=args.att, defense=args.defense,
+                             sp_atk=args.spa, sp_def=args.spd, speed=args.spe)
+        moves = [m.strip() for m in args.moves.split(',')] if args.moves else None
+        try:
+            report = engine.balance_report(stats, args.type1, args.type2, moves)
+        except ValueError as e:
+            parser.error(str(e))
+
+        if args.benchmark:
+            started = time.perf_counter()
+            matrix = engine.matchup_matrix()
+            elapsed = time.perf_counter() - started
+            report['benchmark'] = {'matrix': list(matrix.shape), 'moves': len(engine.moves),
+                                   'duration_ms': round(elapsed * 1000, 1)}
+
+    if args.json:
+        print(json.dumps(report, indent=2))
+        return
+
+    print(f"Level {report['level']} against {report['species']} shipped species")
+    print(f"  Stat total {report['stat_total']}: rank {report['stat_total_rank']} "
+          f"(higher than {report['stat_total_percentile']}%)")
+    speed = report['speed']
+    print(f"  Speed {report['stats']['speed']}: outspeeds {speed['outspeeds']}, "
+          f"ties {len(speed['ties'])}, outsped by {speed['outsped_by']}")
+    if speed['fastest_outsped']:
+        print(f"    fastest it outspeeds: {', '.join(speed['fastest_outsped'])}")
+    print(f"  Weak to: {', '.join(f'{t} x{m:g}' for t, m in report['weak_to'].items()) or 'nothing'}")
+    for key, title in (('ohko_by', "One-hit KO'd by"), ('ohkos', 'One-hit KOs')):
+        section = report[key]
+        print(f"  {title}: {section['guaranteed']} guaranteed, {section['possible']} possible")
+        for hit in section['top']:
+            mark = '!' if hit['guaranteed'] else ' '
+            fewest, most = hit['hits']
+            hits = f"  ({fewest}-{most} hits)" if most > 1 else ''
+            print(f"   {mark} {hit['species']:<12} {hit['move']:<14} {hit['min_percent']:>6.1f}% - {hit['max_percent']:.1f}%{hits}")
+    print(f"  Report took {report['duration_ms']:.1f} ms")
+    if 'benchmark' in report:
+        bench = report['benchmark']
+        print(f"  Full {bench['matrix'][0]}x{bench['matrix'][1]} matchup matrix over "
+              f"{bench['moves']} moves: {bench['duration_ms']:.1f} ms")
+
+
+if __name__ == '__main__':
+    main()
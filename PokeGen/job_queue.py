@@ -0,0 +1,412 @@
+#!/usr/bin/env python3
+"""
+Sprite Job Queue for PokeGen
+Bounded in-process queue with a single worker thread that owns the sprite model
+"""
+
+import logging
+import secrets
+import threading
+import time
+from collections import OrderedDict, deque
+from dataclasses import dataclass, field
+from multiprocessing.managers import BaseManager
+from typing import Any, Callable, Dict, Hashable, List, Optional, Set
+
+from metrics import PHASE_SECONDS, log_event
+
+
+QUEUED = 'queued'
+RUNNING = 'running'
+DONE = 'done'
+FAILED = 'failed'
+CANCELLED = 'cancelled'
+
+FINISHED_STATES = (DONE, FAILED, CANCELLED)
+
+# Methods reachable through a JobQueueClient proxy
+PROXY_METHODS = ('submit', 'status', 'result', 'wait', 'events', 'cancel', 'stats', 'available')
+METRICS_PROXY_METHODS = ('merge', 'render')
+
+
+class QueueFull(Exception):
+    """Raised when a job is submitted while the queue is at capacity"""
+
+
+class JobCancelled(Exception):
+    """Raised from a running job's progress hook once it has been cancelled"""
+
+
+@dataclass
+class SpriteJob:
+    """One sprite generation request and its outcome"""
+    id: str
+    params: Dict[str, Any]
+    status: str = QUEUED
+    created: float = field(default_factory=time.time)
+    started: Optional[float] = None
+    finished: Optional[float] = None
+    result: Optional[Dict[str, Any]] = None
+    error: Optional[str] = None
+    cancel_requested: bool = False
+    events: List[Dict[str, Any]] = field(default_factory=list)
+    key: Optional[Hashable] = None
+    tickets: Set[str] = field(default_factory=set)  # one per submit still interested in the job
+
+    def to_dict(self, position: Optional[int] = None) -> Dict[str, Any]:
+        """Public status view (without the result payload)"""
+        info = {
+            'id': self.id,
+            'status': self.status,
+            'created': self.created,
+            'started': self.started,
+            'finished': self.finished,
+            'error': self.error,
+        }
+        if self.events:
+            last = self.events[-1]
+            info['progress'] = {key: last[key] for key in ('step', 'total', 'eta') if key in last}
+        if len(self.tickets) > 1:
+            info['subscribers'] = len(self.tickets)
+        if position is not None:
+            info['position'] = position
+        return info
+
+
+class SpriteJobQueue:
+    """
+    Serve sprite generation jobs in submission order from one model instance
+
+    All public methods return plain dicts so the queue can also be used
+    through a multiprocessing proxy.
+    """
+
+    def __init__(
+        self,
+        load_generator: Callable[[], Any],
+        run_job: Callable[[Any, Dict[str, Any], Callable[[Dict[str, Any]], None]], Dict[str, Any]],
+        max_queued: int = 16,
+        keep_finished: int = 64
+    ):
+        """
+        Initialize job queue
+
+        Args:
+            load_generator: Returns the model-holding generator, or None if
+                generation is unavailable; must cache its result
+            run_job: run_job(generator, params, progress) -> result dict; runs on
+                the worker and may call progress(event_dict) as work advances
+            max_queued: Jobs allowed to wait; further submits raise QueueFull
+            keep_finished: Finished jobs kept for polling before being forgotten
+        """
+        self.load_generator = load_generator
+        self.run_job = run_job
+        self.max_queued = max_queued
+        self.keep_finished = keep_finished
+
+        self._jobs: 'OrderedDict[str, SpriteJob]' = OrderedDict()
+        self._pending: deque = deque()
+        self._inflight: Dict[Hashable, SpriteJob] = {}
+        self._cond = threading.Condition()
+        self._worker: Optional[threading.Thread] = None
+        self._stopping = False
+        self._counts = {'submitted': 0, 'coalesced': 0, 'rejected': 0, DONE: 0, FAILED: 0, CANCELLED: 0}
+
+    def available(self) -> bool:
+        """True if a generator can be loaded"""
+        return self.load_generator() is not None
+
+    def submit(self, params: Dict[str, Any], key: Optional[Hashable] = None) -> Dict[str, Any]:
+        """
+        Queue a generation job
+
+        Args:
+            params: Passed to run_job
+            key: Identity of the requested output. A submit whose key matches a
+                queued or running job attaches to that job instead of queueing
+                a new one. Leave None for requests that must always run.
+
+        Returns:
+            Status dict of the new (or joined) job; 'coalesced' is True when
+            the request was attached to a job already in flight, and 'ticket'
+            identifies this submit to cancel()
+
+        Raises:
+            QueueFull: The queue already holds max_queued waiting jobs
+        """
+        with self._cond:
+            if self._stopping:
+                raise RuntimeError("Job queue is shutting down")
+
+            ticket = secrets.token_hex(8)
+            joined = self._inflight.get(key) if key is not None else None
+            if joined is not None:
+                joined.tickets.add(ticket)
+                self._counts['coalesced'] += 1
+                return {**joined.to_dict(position=self._position(joined)), 'coalesced': True, 'ticket': ticket}
+
+            if len(self._pending) >= self.max_queued:
+                self._counts['rejected'] += 1
+                raise QueueFull(f"Sprite queue is full ({self.max_queued} jobs waiting)")
+
+            job = SpriteJob(id=secrets.token_hex(8), params=dict(params), key=key, tickets={ticket})
+            self._jobs[job.id] = job
+            self._pending.append(job)
+            if key is not None:
+                self._inflight[key] = job
+            self._counts['submitted'] += 1
+            self._ensure_worker()
+            self._cond.notify_all()
+            return {**job.to_dict(position=len(self._pending)), 'coalesced': False, 'ticket': ticket}
+
+    def status(self, job_id: str) -> Optional[Dict[str, Any]]:
+        """Status dict for a job, or None if unknown"""
+        with self._cond:
+            job = self._jobs.get(job_id)
+            if job is None:
+                return None
+            return job.to_dict(position=self._position(job))
+
+    def result(self, job_id: str) -> Optional[Dict[str, Any]]:
+        """Result dict of a finished job, or None if unknown or not done"""
+        with self._cond:
+            job = self._jobs.get(job_id)
+            if job is None or job.status != DONE:
+                return None
+            return job.result
+
+    def wait(self, job_id: str, timeout: Optional[float] = None,
+             include_result: bool = False) -> Optional[Dict[str, Any]]:
+        """
+        Block until a job finishes (or timeout) and return its status dict
+
+        Args:
+            include_result: Also return a done job's result under 'result'.
+                Finished jobs are pruned once keep_finished newer ones exist, so
+                a separate result() call after wait() can find the job gone.
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._cond:
+            job = self._jobs.get(job_id)
+            if job is None:
+                return None
+            while job.status not in FINISHED_STATES:
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    break
+                self._cond.wait(remaining)
+            info = job.to_dict(position=self._position(job))
+            if include_result and job.status == DONE:
+                info['result'] = job.result
+            return info
+
+    def events(self, job_id: str, since: int = 0, timeout: Optional[float] = None) -> Optional[Dict[str, Any]]:
+        """
+        Long-poll a job's progress events
+
+        Args:
+            job_id: Job to watch
+            since: Number of events the caller has already seen
+            timeout: Seconds to wait for something new
+
+        Returns:
+            dict with the job status and the events after `since`, or None if unknown
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._cond:
+            job = self._jobs.get(job_id)
+            if job is None:
+                return None
+            while len(job.events) <= since and job.status not in FINISHED_STATES:
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    break
+                self._cond.wait(remaining)
+            return {'job': job.to_dict(position=self._position(job)), 'events': job.events[since:]}
+
+    def cancel(self, job_id: str, ticket: Optional[str] = None) -> bool:
+        """
+        Cancel a job
+
+        Queued jobs are removed immediately. A running job is stopped at its
+        next progress event (or its result discarded if it reports none).
+        A coalesced job keeps running until every subscriber has cancelled
+        with its own ticket; each ticket counts once.
+
+        Args:
+            job_id: Job to cancel
+            ticket: The 'ticket' submit() returned; may be left out only
+                while the job has a single subscriber
+
+        Returns:
+            True if the job was cancelled or marked (or the ticket detached),
+            False if unknown, finished, or the ticket is missing or used up
+        """
+        with self._cond:
+            job = self._jobs.get(job_id)
+            if job is None or job.status in FINISHED_STATES:
+                return False
+            if ticket is None:
+                if len(job.tickets) > 1:
+                    return False
+                job.tickets.clear()
+            elif ticket in job.tickets:
+                job.tickets.discard(ticket)
+            else:
+                return False
+            if job.tickets:
+                return True  # other subscribers still want the result
+            if job.status == QUEUED:
+                self._pending.remove(job)
+                self._finish(job, CANCELLED)
+            else:
+                job.cancel_requested = True
+            return True
+
+    def stats(self) -> Dict[str, Any]:
+        """Queue depth and job counters"""
+        with self._cond:
+            running = sum(1 for job in self._jobs.values() if job.status == RUNNING)
+            return {
+                'queued': len(self._pending),
+                'running': running,
+                'capacity': self.max_queued,
+                **self._counts,
+            }
+
+    def shutdown(self, wait: bool = True, timeout: Optional[float] = None):
+        """Stop accepting jobs, cancel waiting ones and stop the worker"""
+        with self._cond:
+            self._stopping = True
+            while self._pending:
+                self._finish(self._pending.popleft(), CANCELLED)
+            self._cond.notify_all()
+            worker = self._worker
+        if wait and worker is not None:
+            worker.join(timeout)
+
+    def _ensure_worker(self):
+        if self._worker is None or not self._worker.is_alive():
+            self._worker = threading.Thread(target=self._work, name='sprite-worker', daemon=True)
+            self._worker.start()
+
+    def _position(self, job: SpriteJob) -> Optional[int]:
+        if job.status != QUEUED:
+            return None
+        return self._pending.index(job) + 1
+
+    def _finish(self, job: SpriteJob, status: str, result=None, error=None):
+        """Record a final state; caller holds the lock"""
+        job.status = status
+        job.result = result
+        job.error = error
+        job.finished = time.time()
+        if job.key is not None and self._inflight.get(job.key) is job:
+            del self._inflight[job.key]
+        self._counts[status] += 1
+        self._prune()
+        self._cond.notify_all()
+
+    def _progress(self, job: SpriteJob, event: Dict[str, Any]):
+        """Record a progress event from the worker; aborts cancelled jobs"""
+        with self._cond:
+            job.events.append(event)
+            self._cond.notify_all()
+            if job.cancel_requested:
+                raise JobCancelled(job.id)
+
+    def _prune(self):
+        finished = [job_id for job_id, job in self._jobs.items() if job.status in FINISHED_STATES]
+        for job_id in finished[:max(0, len(finished) - self.keep_finished)]:
+            del self._jobs[job_id]
+
+    def _work(self):
+        generator = None
+        while True:
+            with self._cond:
+                while not self._pending and not self._stopping:
+                    self._cond.wait()
+                if self._stopping:
+                    return
+                job = self._pending.popleft()
+                job.status = RUNNING
+                job.started = time.time()
+                PHASE_SECONDS.observe(job.started - job.created, phase='queue_wait')
+
+            try:
+                if generator is None:
+                    generator = self.load_generator()
+                    if generator is None:
+                        raise RuntimeError("Sprite generator not available")
+                result = self.run_job(generator, job.params, lambda event: self._progress(job, event))
+                error = None
+            except JobCancelled:
+                result, error = None, None
+            except Exception as e:
+                if not job.cancel_requested:
+                    log_event('sprite_job.failed', level=logging.ERROR, exc_info=True, job=job.id, error=e)
+                result, error = None, str(e)
+
+            with self._cond:
+                if job.cancel_requested:
+                    self._finish(job, CANCELLED)
+                elif error is not None:
+                    self._finish(job, FAILED, error=error)
+                else:
+                    self._finish(job, DONE, result=result)
+
+
+class _JobQueueServer(BaseManager):
+    """Manager that hosts a SpriteJobQueue"""
+
+
+class JobQueueClient(BaseManager):
+    """Manager that reaches a SpriteJobQueue hosted by another process"""
+
+
+JobQueueClient.register('jobs', exposed=PROXY_METHODS)
+JobQueueClient.register('metrics', exposed=METRICS_PROXY_METHODS)
+
+
+def serve_job_queue(queue: SpriteJobQueue, address, authkey: bytes, metrics=None):
+    """
+    Share a job queue over local IPC
+
+    Args:
+        queue: Queue to expose
+        address: Unix socket path (or (host, port)) to listen on
+        authkey: Shared secret clients must present
+        metrics: Optional metrics Registry that clients can merge into and render
+
+    Returns:
+        multiprocessing Server; call serve_forever() to handle clients
+    """
+    _JobQueueServer.register('jobs', callable=lambda: queue, exposed=PROXY_METHODS)
+    if metrics is not None:
+        _JobQueueServer.register('metrics', callable=lambda: metrics, exposed=METRICS_PROXY_METHODS)
+    return _JobQueueServer(address=address, authkey=authkey).get_server()
+
+
+def connect_job_queue(address, authkey: bytes):
+    """
+    Connect to a queue shared with serve_job_queue()
+
+    Returns:
+        Proxy with the SpriteJobQueue methods in PROXY_METHODS; safe to use
+        from several threads
+    """
+    manager = JobQueueClient(address=address, authkey=authkey)
+    manager.connect()
+    return manager.jobs()
+
+
+def connect_metrics(address, authkey: bytes):
+    """
+    Connect to the metrics registry shared with serve_job_queue(metrics=...)
+
+    Returns:
+        Proxy with merge(snapshot) and render()
+    """
+    manager = JobQueueClient(address=address, authkey=authkey)
+    manager.connect()
+    return manager.metrics()
@@ -0,0 +1,279 @@
+#!/usr/bin/env python3
+"""
+Metrics for PokeGen
+Prometheus-format counters, gauges and latency histograms, plus structured
+(logfmt) timing logs
+"""
+
+import logging
+import os
+import sys
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+
+# Seconds; wide enough for sub-millisecond file writes and multi-minute CPU diffusion
+DEFAULT_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600)
+
+log = logging.getLogger('pokegen')
+
+
+class Metric:
+    """One metric family: a value (or histogram) per label combination"""
+
+    def __init__(self, kind: str, name: str, help: str, labelnames: Tuple[str, ...] = (),
+                 buckets: Tuple[float, ...] = DEFAULT_BUCKETS):
+        self.kind = kind
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(buckets)
+        self.values: Dict[Tuple[str, ...], Any] = {}
+        self._lock = threading.Lock()
+
+    def _key(self, labels: Dict[str, Any]) -> Tuple[str, ...]:
+        return tuple(str(labels.get(name, '')) for name in self.labelnames)
+
+    def inc(self, amount: float = 1, **labels):
+        """Add to a counter (or gauge)"""
+        key = self._key(labels)
+        with self._lock:
+            self.values[key] = self.values.get(key, 0) + amount
+
+    def set(self, value: float, **labels):
+        """Set a gauge (or a counter read from an existing total)"""
+        with self._lock:
+            self.values[self._key(labels)] = value
+
+    def observe(self, value: float, **labels):
+        """Record one histogram observation"""
+        key = self._key(labels)
+        with self._lock:
+            counts = self.values.get(key)
+            if counts is None:
+                # One count per bucket (non-cumulative) plus +Inf, then sum
+                counts = self.values[key] = [0] * (len(self.buckets) + 1) + [0.0]
+            counts[bisect_left(self.buckets, value)] += 1
+            counts[-1] += value
+
+    @contextmanager
+    def time(self, **labels):
+        """Observe the wall-clock duration of a with-block"""
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started, **labels)
+
+    def snapshot(self) -> Dict[Tuple[str, ...], Any]:
+        """Copy of the recorded values"""
+        with self._lock:
+            return {key: list(value) if isinstance(value, list) else value for key, value in self.values.items()}
+
+    def take(self) -> Dict[Tuple[str, ...], Any]:
+        """Return and reset the recorded values (for shipping to another process)"""
+        with self._lock:
+            values, self.values = self.values, {}
+        return values
+
+    def merge(self, values: Dict[Tuple[str, ...], Any]):
+        """Add values taken from the same metric in another process"""
+        with self._lock:
+            for key, value in values.items():
+                if self.kind == 'gauge':
+                    self.values[key] = value
+                elif self.kind == 'counter':
+                    self.values[key] = self.values.get(key, 0) + value
+                else:
+                    counts = self.values.setdefault(key, [0] * (len(self.buckets) + 1) + [0.0])
+                    for i, count in enumerate(value):
+                        counts[i] += count
+
+    def render(self) -> List[str]:
+        """Prometheus text exposition lines"""
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+        with self._lock:
+            items = sorted(self.values.items())
+        for key, value in items:
+            labels = list(zip(self.labelnames, key))
+            if self.kind != 'histogram':
+                lines.append(f"{self.name}{_labels(labels)} {_number(value)}")
+                continue
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float('inf'),), value):
+                cumulative += count
+                le = '+Inf' if bound == float('inf') else _number(bound)
+                lines.append(f"{self.name}_bucket{_labels(labels + [('le', le)])} {cumulative}")
+            lines.append(f"{self.name}_sum{_labels(labels)} {_number(value[-1])}")
+            lines.append(f"{self.name}_count{_labels(labels)} {cumulative}")
+        return lines
+
+
+class Registry:
+    """
+    A set of metric families
+
+    Gauges that are cheaper to read than to keep current (queue depth, memory)
+    are filled in by collector callbacks when the registry is rendered.
+    """
+
+    def __init__(self):
+        self._metrics: Dict[str, Metric] = {}
+        self._collectors: List[Callable[[], None]] = []
+        self._lock = threading.Lock()
+
+    def _metric(self, kind: str, name: str, help: str, labelnames: Iterable[str] = (), **options) -> Metric:
+        with self._lock:
+            metric = self._metrics.get(name)
+            if metric is None:
+                metric = self._metrics[name] = Metric(kind, name, help, tuple(labelnames), **options)
+            return metric
+
+    def counter(self, name: str, help: str, labelnames: Iterable[str] = ()) -> Metric:
+        return self._metric('counter', name, help, labelnames)
+
+    def gauge(self, name: str, help: str, labelnames: Iterable[str] = ()) -> Metric:
+        return self._metric('gauge', name, help, labelnames)
+
+    def histogram(self, name: str, help: str, labelnames: Iterable[str] = (),
+                  buckets: Tuple[float, ...] = DEFAULT_BUCKETS) -> Metric:
+        return self._metric('histogram', name, help, labelnames, buckets=buckets)
+
+    def add_collector(self, collect: Callable[[], None]):
+        """Run collect() before every render (it should set gauges)"""
+        self._collectors.append(collect)
+
+    def take(self) -> Dict[str, Dict[str, Any]]:
+        """Return and reset counters and histograms, for merge() in another process"""
+        with self._lock:
+            metrics = [m for m in self._metrics.values() if m.kind != 'gauge']
+        snapshot = {}
+        for metric in metrics:
+            values = metric.take()
+            if values:
+                snapshot[metric.name] = {
+                    'kind': metric.kind, 'help': metric.help, 'labelnames': metric.labelnames,
+                    'buckets': metric.buckets, 'values': values,
+                }
+        return snapshot
+
+    def merge(self, snapshot: Dict[str, Dict[str, Any]]):
+        """Add a snapshot from take()"""
+        for name, data in snapshot.items():
+            options = {'buckets': data['buckets']} if data['kind'] == 'histogram' else {}
+            self._metric(data['kind'], name, data['help'], data['labelnames'], **options).merge(data['values'])
+
+    def render(self) -> str:
+        """Prometheus text exposition format"""
+        for collect in self._collectors:
+            try:
+                collect()
+            except Exception as e:
+                log_event('metrics.collector_failed', level=logging.WARNING, error=e)
+        with self._lock:
+            metrics = sorted(self._metrics.values(), key=lambda m: m.name)
+        return '\n'.join(line for metric in metrics for line in metric.render()) + '\n'
+
+
+def _labels(pairs: List[Tuple[str, str]]) -> str:
+    if not pairs:
+        return ''
+    escaped = (k + '="' + v.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') + '"'
+               for k, v in pairs)
+    return '{' + ','.join(escaped) + '}'
+
+
+def _number(value: float) -> str:
+    return repr(float(value)) if isinstance(value, float) and not value.is_integer() else str(int(value))
+
+
+# Process-wide registry and the metrics every module records into
+REGISTRY = Registry()
+
+PHASE_SECONDS = REGISTRY.histogram(
+    'pokegen_phase_seconds', 'Time spent in each pipeline phase', ('phase',))
+INFERENCE_STEP_SECONDS = REGISTRY.histogram(
+    'pokegen_inference_step_seconds', 'Time per diffusion inference step', ('backend',))
+MODS_CREATED = REGISTRY.counter(
+    'pokegen_mods_created_total', 'Mods written by create_pokemon', ('result',))
+CACHE_REQUESTS = REGISTRY.counter(
+    'pokegen_cache_requests_total', 'Cache lookups by cache and outcome', ('cache', 'result'))
+
+
+@contextmanager
+def phase(phase_name: str, **fields):
+    """
+    Time a pipeline phase into pokegen_phase_seconds and log it
+
+    Extra keyword arguments are added to the log line.
+    """
+    started = time.perf_counter()
+    error = None
+    try:
+        yield
+    except BaseException as e:
+        error = e
+        raise
+    finally:
+        elapsed = time.perf_counter() - started
+        PHASE_SECONDS.observe(elapsed, phase=phase_name)
+        if error is None:
+            log_event(phase_name, duration_ms=round(elapsed * 1000, 2), **fields)
+        else:
+            log_event(phase_name, level=logging.WARNING, duration_ms=round(elapsed * 1000, 2),
+                      error=f"{type(error).__name__}: {error}", **fields)
+
+
+def log_event(event: str, level: int = logging.INFO, exc_info: bool = False, **fields):
+    """Log one structured event (rendered as logfmt by LogfmtFormatter)"""
+    if log.isEnabledFor(level):
+        log.log(level, event, exc_info=exc_info, extra={'fields': fields})
+
+
+class LogfmtFormatter(logging.Formatter):
+    """ts=... level=... event=... key=value"""
+
+    def format(self, record: logging.LogRecord) -> str:
+        ts = time.strftime('%Y-%m-%dT%H:%M:%S', time.localtime(record.created)) + f".{int(record.msecs):03d}"
+        pairs = [('ts', ts), ('level', record.levelname.lower()), ('event', record.getMessage()),
+                 ('pid', os.getpid())]
+        pairs.extend(getattr(record, 'fields', {}).items())
+        line = ' '.join(f"{key}={_logfmt_value(value)}" for key, value in pairs)
+        if record.exc_info:
+            line += '\n' + self.formatException(record.exc_info)
+        return line
+
+
+def _logfmt_value(value: Any) -> str:
+    text = str(value)
+    if text and not any(c in text for c in ' ="\n'):
+        return text
+    return '"' + text.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') + '"'
+
+
+def configure_logging(level: Optional[str] = None):
+    """
+    Send pokegen logs to stderr as logfmt
+
+    Args:
+        level: Log level name; defaults to POKEGEN_LOG_LEVEL or INFO
+    """
+    if log.handlers:
+        return
+    handler = logging.StreamHandler(sys.stderr)
+    handler.setFormatter(LogfmtFormatter())
+    log.addHandler(handler)
+    log.setLevel((level or os.environ.get('POKEGEN_LOG_LEVEL', 'INFO')).upper())
+    log.propagate = False
+
+
+def resident_memory_bytes() -> Optional[int]:
+    """Current resident set size of this process, if the platform exposes it"""
+    try:
+        with open('/proc/self/statm') as statm:
+            return int(statm.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError, IndexError):
+        return None
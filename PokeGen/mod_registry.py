@@ -0,0 +1,578 @@
+#!/usr/bin/env python3
+"""
+Mod Registry for PokeGen
+Persistent index of the mods in mods/ (name, dex number, types, content hash)
+for dex collision checks, next-free-dex allocation and listing without a walk
+"""
+
+import argparse
+import configparser
+import hashlib
+import json
+import logging
+import os
+import re
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from dataclasses import asdict, dataclass
+from pathlib import Path
+from typing import Dict, List, Optional, Set, Tuple
+
+from metrics import configure_logging, log_event, phase
+from species_table import SpeciesData
+
+try:
+    import fcntl  # POSIX: also lock the registry against other processes (serve.py workers)
+except ImportError:
+    fcntl = None
+
+
+VERSION = 2
+REGISTRY_FILE = "registry.json"
+JOURNAL_FILE = "registry.journal"
+LOCK_FILE = "registry.lock"
+SOURCE_SPRITE = re.compile(r"^(?P<name>.+)_\d+\.png$")  # generated_sprites/<name>_<size>.png
+LEGACY_FILES = (".registry.json", ".registry.lock")  # kept inside mods/ by earlier versions
+COMPACT_AFTER = 1000  # journal lines before it is folded into the index (at least one per mod)
+
+
+class DexCollision(ValueError):
+    """A dex number is already used by a shipped species or another mod"""
+
+    def __init__(self, dex: int, holder: str, next_free: int):
+        super().__init__(f"Dex #{dex} is already used by {holder}; next free dex is #{next_free}")
+        self.dex = dex
+        self.holder = holder
+        self.next_free = next_free
+
+
+@dataclass(frozen=True)
+class ModEntry:
+    """One registered mod"""
+    name: str
+    dex: int
+    type1: str
+    type2: Optional[str]
+    content_hash: Optional[str]  # None while the mod is being written
+    updated: float
+    source_sprite: Optional[str] = None  # generated sprite its front sprite was copied from
+
+
+def state_dir(mods_dir: Path) -> Path:
+    """
+    Where PokeGen keeps its own files for a mods directory (staging, locks, registry)
+
+    A hidden sibling (mods/ -> .mods.pokegen/): outside mods/, which the game
+    scans, but on the same filesystem so staged mods can be renamed into place.
+    """
+    mods_dir = Path(mods_dir)
+    return mods_dir.parent / f".{mods_dir.name}.pokegen"
+
+
+def content_hash(mod_dir: Path) -> str:
+    """SHA-256 over every file in a mod (relative paths and contents, in sorted order)"""
+    digest = hashlib.sha256()
+    for path in sorted(p for p in Path(mod_dir).rglob('*') if p.is_file()):
+        digest.update(path.relative_to(mod_dir).as_posix().encode() + b'\0')
+        digest.update(path.read_bytes())
+    return digest.hexdigest()
+
+
+def read_mod_config(mod_dir: Path) -> Optional[Tuple[str, int, str, Optional[str], Optional[str]]]:
+    """
+    (name, dex, type1, type2, source_sprite) from a mod's pokemon.cfg, or None
+    if it has no usable one; source_sprite is the generated sprite's name
+    """
+    config = configparser.ConfigParser(interpolation=None)
+    try:
+        config.read_string(Path(mod_dir / "pokemon.cfg").read_text())
+        section = config['pokemon']
+        type2 = section.get('type2', 'NONE').upper()
+        source = SOURCE_SPRITE.match(config.get('graphics', 'source_sprite', fallback=''))
+        return (section.get('name', mod_dir.name), int(section['dex_number']),
+                section.get('type1', 'NORMAL').upper(), None if type2 == 'NONE' else type2,
+                source['name'] if source else None)
+    except (OSError, KeyError, ValueError, configparser.Error):
+        return None
+
+
+class ModRegistry:
+    """
+    Index of mods kept in the mods directory's state_dir()
+
+    The generator updates it whenever a mod is created, so lookups, collision
+    checks and listings read memory instead of the mods tree. Each change is
+    one line appended to registry.journal; once the journal is longer than
+    the index, it is folded into registry.json. Other processes' changes are
+    picked up by reading the new journal lines (at most once per
+    check_interval seconds). A missing index is rebuilt from the pokemon.cfg
+    of every mod once.
+    """
+
+    def __init__(self, mods_dir: Path, species_data: Optional[SpeciesData] = None, check_interval: float = 1.0):
+        """
+        Initialize the registry
+
+        Args:
+            mods_dir: The mods/ directory
+            species_data: Shipped species, whose dex numbers mods must not reuse
+            check_interval: Seconds between checks for updates by other processes
+        """
+        self.mods_dir = Path(mods_dir)
+        self.state_dir = state_dir(self.mods_dir)
+        self.path = self.state_dir / REGISTRY_FILE
+        self.journal_path = self.state_dir / JOURNAL_FILE
+        self.species_data = species_data
+        self.check_interval = check_interval
+        self._lock = threading.RLock()
+        self._file_locked = False
+        self._signature: Optional[Tuple[int, int, int]] = None  # of the loaded registry.json
+        self._journal_id: Optional[int] = None  # inode of the journal being read
+        self._journal_offset = 0
+        self._journal_lines = 0
+        self._checked = 0.0
+        self._entries: Dict[str, ModEntry] = {}  # by lowercase name
+        self._by_dex: Dict[int, Set[str]] = {}
+        self._sorted: Optional[List[ModEntry]] = None
+        self._references: Optional[Set[str]] = None
+        self._next_free: Optional[int] = None  # allocation cursor: no free number in [_dex_start, _next_free)
+        self._dex_start = 1
+
+    # Loading and saving
+
+    @staticmethod
+    def _stat(path: Path) -> Optional[Tuple[int, int, int]]:
+        try:
+            stat = path.stat()
+            return stat.st_ino, stat.st_size, stat.st_mtime_ns
+        except FileNotFoundError:
+            return None
+
+    def _fresh(self, force: bool = False):
+        """Catch up with changes made by other processes; caller holds self._lock"""
+        if not force and self._signature is not None and time.monotonic() - self._checked < self.check_interval:
+            return
+        self._checked = time.monotonic()
+        for _ in range(3):
+            signature = self._stat(self.path)
+            if signature is None:
+                with self._file_lock():
+                    if self._stat(self.path) is None:
+                        self._index(self._scan())
+                        self._compact()
+                        self._remove_legacy()
+                        return
+                signature = self._stat(self.path)
+            if signature != self._signature:
+                try:
+                    data = json.loads(self.path.read_text())
+                    if data.get('version') != VERSION:
+                        raise ValueError(f"unsupported registry version {data.get('version')}")
+                    self._index(ModEntry(**entry) for entry in data['mods'])
+                except (OSError, ValueError, TypeError, KeyError) as e:
+                    log_event('mod_registry.unreadable', level=logging.WARNING, path=self.path, error=e)
+                    with self._file_lock():
+                        self._index(self._scan())
+                        self._compact()
+                    return
+                self._signature = signature
+                self._journal_id, self._journal_offset, self._journal_lines = None, 0, 0
+            if self._replay():
+                return
+            self._signature = None  # compacted since registry.json was read: load the new one
+
+    def _replay(self) -> bool:
+        """
+        Apply journal lines appended since the last read; caller holds self._lock
+
+        Returns:
+            False if the journal was compacted away since registry.json was loaded
+        """
+        try:
+            journal = open(self.journal_path, 'rb')
+        except FileNotFoundError:
+            return self._journal_id is None
+        with journal:
+            inode = os.fstat(journal.fileno()).st_ino
+            if inode != self._journal_id:
+                if self._journal_id is not None:
+                    return False
+                self._journal_id, self._journal_offset, self._journal_lines = inode, 0, 0
+            journal.seek(self._journal_offset)
+            data = journal.read()
+        complete = data[:data.rfind(b'\n') + 1]  # a writer may be mid-line
+        lines = complete.splitlines()
+        for line in lines:
+            try:
+                change = json.loads(line)
+                if 'drop' in change:
+                    self._drop(change['drop'].lower())
+                else:
+                    self._put(ModEntry(**change['put']))
+            except (ValueError, TypeError, KeyError, AttributeError) as e:
+                log_event('mod_registry.bad_journal_line', level=logging.WARNING, path=self.journal_path, error=e)
+        if lines:
+            self._sorted = None
+            self._references = None
+        self._journal_offset += len(complete)
+        self._journal_lines += len(lines)
+        return True
+
+    def _index(self, entries):
+        self._entries = {entry.name.lower(): entry for entry in entries}
+        self._by_dex = {}
+        for key, entry in self._entries.items():
+            self._by_dex.setdefault(entry.dex, set()).add(key)
+        self._sorted = None
+        self._references = None
+        self._next_free = None
+
+    def _scan(self) -> List[ModEntry]:
+        """Every mod with a readable pokemon.cfg (the only time the mods tree is walked)"""
+        entries = []
+        with phase('mod_registry_scan'):
+            if self.mods_dir.is_dir():
+                for mod_dir in self.mods_dir.iterdir():
+                    if not mod_dir.is_dir() or mod_dir.name.startswith('.'):
+                        continue
+                    config = read_mod_config(mod_dir)
+                    if config is None:
+                        continue
+                    _, dex, type1, type2, source = config
+                    entries.append(ModEntry(mod_dir.name, dex, type1, type2, content_hash(mod_dir),
+                                            mod_dir.stat().st_mtime, source))
+        log_event('mod_registry.scanned', mods=len(entries))
+        return entries
+
+    def _compact(self):
+        """Write the whole index to registry.json and start an empty journal; caller holds both locks"""
+        self.state_dir.mkdir(parents=True, exist_ok=True)
+        partial = self.path.with_name(f"{REGISTRY_FILE}.{os.getpid()}.part")
+        mods = [asdict(entry) for entry in sorted(self._entries.values(), key=lambda e: e.name.lower())]
+        partial.write_text(json.dumps({'version': VERSION, 'mods': mods}, indent=1))
+        partial.replace(self.path)
+        self._signature = self._stat(self.path)
+        empty = self.journal_path.with_name(f"{JOURNAL_FILE}.{os.getpid()}.part")
+        empty.write_bytes(b'')
+        empty.replace(self.journal_path)
+        self._journal_id = self.journal_path.stat().st_ino
+        self._journal_offset = self._journal_lines = 0
+
+    def _append(self, change: Dict[str, object]):
+        """Add one change to the journal; caller holds both locks"""
+        line = (json.dumps(change) + '\n').encode()
+        self.state_dir.mkdir(parents=True, exist_ok=True)
+        fd = os.open(self.journal_path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+        try:
+            os.write(fd, line)
+            if self._journal_id is None:
+                self._journal_id = os.fstat(fd).st_ino
+        finally:
+            os.close(fd)
+        self._journal_offset += len(line)
+        self._journal_lines += 1
+
+    def _remove_legacy(self):
+        """Delete the index files earlier versions kept inside mods/"""
+        for name in LEGACY_FILES:
+            try:
+                (self.mods_dir / name).unlink()
+            except FileNotFoundError:
+                pass
+
+    @contextmanager
+    def _file_lock(self):
+        """Exclusive lock on the index across processes; re-entrant, caller holds self._lock"""
+        if fcntl is None or self._file_locked:
+            yield
+            return
+        self.state_dir.mkdir(parents=True, exist_ok=True)
+        with open(self.state_dir / LOCK_FILE, "a") as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            self._file_locked = True
+            try:
+                yield
+            finally:
+                self._file_locked = False
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    @contextmanager
+    def _update(self):
+        """
+        Catch up with the journal under both locks, so a change applies to the
+        newest index; a long journal is compacted once the change is applied
+        """
+        with self._lock, self._file_lock():
+            self._fresh(force=True)
+            yield
+            self._sorted = None
+            self._references = None
+            if self._journal_lines > max(COMPACT_AFTER, len(self._entries)):
+                self._compact()
+
+    def _log_put(self, entry: ModEntry):
+        """Journal and apply a new or changed entry; caller is in _update()"""
+        self._append({'put': asdict(entry)})
+        self._put(entry)
+
+    def _log_drop(self, key: str):
+        """Journal and apply removing an entry; caller is in _update()"""
+        self._append({'drop': key})
+        self._drop(key)
+
+    def _put(self, entry: ModEntry):
+        key = entry.name.lower()
+        old = self._entries.get(key)
+        if old is not None:
+            self._by_dex[old.dex].discard(key)
+            if not self._by_dex[old.dex]:
+                del self._by_dex[old.dex]
+                self._freed(old.dex)
+        self._entries[key] = entry
+        self._by_dex.setdefault(entry.dex, set()).add(key)
+
+    def _freed(self, dex: int):
+        """A dex number lost its last mod: move the allocation cursor back to it if it is lower"""
+        if self._next_free is not None and self._dex_start <= dex < self._next_free:
+            self._next_free = dex
+
+    def _drop(self, key: str):
+        old = self._entries.pop(key, None)
+        if old is not None:
+            self._by_dex[old.dex].discard(key)
+            if not self._by_dex[old.dex]:
+                del self._by_dex[old.dex]
+                self._freed(old.dex)
+
+    # Lookups
+
+    def _shipped(self, dex: int) -> Optional[str]:
+        """Name of the shipped species with this dex number, if any"""
+        if self.species_data is None:
+            return None
+        try:
+            record = self.species_data.table().by_dex(dex)
+        except (OSError, ValueError) as e:
+            log_event('mod_registry.species_unavailable', level=logging.WARNING, error=e)
+            return None
+        return record.name if record else None
+
+    def get(self, name: str) -> Optional[ModEntry]:
+        """A mod by name (any case), or None"""
+        with self._lock:
+            self._fresh()
+            return self._entries.get(name.lower())
+
+    def holder(self, dex: int, name: Optional[str] = None) -> Optional[str]:
+        """
+        What already uses a dex number, or None if it is free
+
+        Args:
+            dex: Dex number to check
+            name: Mod being (re)created; its own entry does not count
+        """
+        shipped = self._shipped(dex)
+        if shipped:
+            return f"shipped species {shipped}"
+        with self._lock:
+            self._fresh()
+            others = sorted(self._entries[key].name for key in self._by_dex.get(dex, ())
+                            if name is None or key != name.lower())
+        return f"mod {', '.join(others)}" if others else None
+
+    def check_dex(self, dex: int, name: Optional[str] = None):
+        """
+        Raises:
+            DexCollision: If a shipped species or another mod already uses dex
+        """
+        holder = self.holder(dex, name)
+        if holder:
+            raise DexCollision(dex, holder, self.next_free_dex())
+
+    def next_free_dex(self) -> int:
+        """Lowest dex number above every shipped species that no mod uses"""
+        with self._lock:
+            self._fresh()
+            if self._next_free is None:
+                start = 1
+                if self.species_data is not None:
+                    try:
+                        start = max(1, self.species_data.table().species_count)
+                    except (OSError, ValueError):
+                        pass
+                self._dex_start = self._next_free = start
+            # Taking a number moves the cursor forward past it; freeing one only moves it
+            # back to that number, so allocation is amortized O(1) however the index changes
+            while self._next_free in self._by_dex or self._shipped(self._next_free):
+                self._next_free += 1
+            return self._next_free
+
+    def collisions(self) -> Dict[int, List[str]]:
+        """Dex numbers used more than once, with the shipped species and mods using them"""
+        with self._lock:
+            self._fresh()
+            by_dex = {dex: sorted(self._entries[key].name for key in keys) for dex, keys in self._by_dex.items()}
+        result = {}
+        for dex, names in sorted(by_dex.items()):
+            shipped = self._shipped(dex)
+            holders = ([f"{shipped} (shipped)"] if shipped else []) + names
+            if len(holders) > 1:
+                result[dex] = holders
+        return result
+
+    def search(self, query: str = '', type_: Optional[str] = None,
+               limit: int = 50, offset: int = 0) -> Tuple[List[ModEntry], int]:
+        """
+        Mods ordered by dex number, then name
+
+        Args:
+            query: Case-insensitive substring of the name, or an exact dex number
+            type_: Only mods with this primary or secondary type
+            limit: Page size
+            offset: Entries to skip
+
+        Returns:
+            (page of entries, total number of matches)
+        """
+        with self._lock:
+            self._fresh()
+            if self._sorted is None:
+                self._sorted = sorted(self._entries.values(), key=lambda e: (e.dex, e.name.lower()))
+            entries = self._sorted
+        query = query.strip().lower()
+        type_ = type_.upper() if type_ else None
+        if query.isdigit():
+            matches = [e for e in entries if e.dex == int(query)]
+        else:
+            matches = [e for e in entries if query in e.name.lower()] if query else entries
+        if type_:
+            matches = [e for e in matches if type_ in (e.type1, e.type2)]
+        return matches[offset:offset + limit], len(matches)
+
+    def sprite_references(self) -> Set[str]:
+        """Names of the generated sprites that some mod's front sprite was copied from"""
+        with self._lock:
+            self._fresh()
+            if self._references is None:
+                self._references = {e.source_sprite for e in self._entries.values() if e.source_sprite}
+            return self._references
+
+    def __len__(self) -> int:
+        with self._lock:
+            self._fresh()
+            return len(self._entries)
+
+    # Updates
+
+    def claim(self, name: str, dex: int, type1: str, type2: Optional[str],
+              allow_collision: bool = False) -> Optional[ModEntry]:
+        """
+        Reserve a dex number for a mod about to be written
+
+        The check and the reservation happen under one lock, so two mods
+        created at once cannot both take the same number.
+
+        Returns:
+            The mod's previous entry, to pass to release() if writing fails
+
+        Raises:
+            DexCollision: If the number is taken and allow_collision is False
+        """
+        with self._update():
+            if not allow_collision:
+                self.check_dex(dex, name)
+            previous = self._entries.get(name.lower())
+            self._log_put(ModEntry(name, dex, type1.upper(), type2.upper() if type2 else None, None, time.time()))
+        return previous
+
+    def release(self, name: str, previous: Optional[ModEntry]):
+        """Undo claim() after a failed write"""
+        with self._update():
+            if previous is None:
+                self._log_drop(name.lower())
+            else:
+                self._log_put(previous)
+
+    def record(self, name: str) -> Optional[ModEntry]:
+        """Store the content hash (and source sprite) of a claimed mod once it is published"""
+        mod_dir = self.mods_dir / name
+        digest = content_hash(mod_dir)
+        config = read_mod_config(mod_dir)
+        source = config[4] if config else None
+        with self._update():
+            entry = self._entries.get(name.lower())
+            if entry is None:
+                return None
+            entry = ModEntry(entry.name, entry.dex, entry.type1, entry.type2, digest, time.time(), source)
+            self._log_put(entry)
+        return entry
+
+    def refresh(self, name: str) -> Optional[ModEntry]:
+        """Re-read one mod edited outside PokeGen from its pokemon.cfg; drops it (None) if it is gone"""
+        mod_dir = self.mods_dir / name
+        config = read_mod_config(mod_dir) if mod_dir.is_dir() else None
+        entry = None
+        if config is not None:
+            _, dex, type1, type2, source = config
+            entry = ModEntry(name, dex, type1, type2, content_hash(mod_dir), time.time(), source)
+        with self._update():
+            if entry is None:
+                self._log_drop(name.lower())
+            else:
+                self._log_put(entry)
+        return entry
+
+    def rebuild(self) -> int:
+        """Re-read every mod's pokemon.cfg (for mods added or edited by hand); returns the count"""
+        with self._update():
+            self._index(self._scan())
+            self._compact()
+        return len(self._entries)
+
+
+def main():
+    """Command-line interface"""
+    parser = argparse.ArgumentParser(description='Inspect the registry of PokeGen mods')
+    parser.add_argument('--mods', type=Path, default=Path(__file__).parent.parent / "mods",
+                        help='Mods directory (default: ../mods)')
+    parser.add_argument('--data', type=Path, default=Path(__file__).parent.parent / "pokemon",
+                        help="Game pokemon/ directory (default: ../pokemon)")
+    commands = parser.add_subparsers(dest='command', required=True)
+    commands.add_parser('rebuild', help='Re-index every mod from its pokemon.cfg')
+    commands.add_parser('next', help='Print the next free dex number')
+    commands.add_parser('collisions', help='List dex numbers used more than once')
+    check = commands.add_parser('check', help='Exit 1 if a dex number is taken')
+    check.add_argument('dex', type=int)
+    listing = commands.add_parser('list', help='List mods')
+    listing.add_argument('query', nargs='?', default='', help='Name substring or dex number')
+    listing.add_argument('--type', help='Only mods with this type')
+
+    args = parser.parse_args()
+    configure_logging()
+
+    registry = ModRegistry(args.mods, SpeciesData(args.data, Path(__file__).parent / "species_table.bin"))
+    if args.command == 'rebuild':
+        print(f"✓ Indexed {registry.rebuild()} mods in {registry.path}")
+    elif args.command == 'next':
+        print(registry.next_free_dex())
+    elif args.command == 'check':
+        holder = registry.holder(args.dex)
+        print(f"#{args.dex}: {holder or 'free'}")
+        sys.exit(1 if holder else 0)
+    elif args.command == 'collisions':
+        collisions = registry.collisions()
+        for dex, holders in collisions.items():
+            print(f"#{dex}: {', '.join(holders)}")
+        sys.exit(1 if collisions else 0)
+    else:
+        entries, total = registry.search(args.query, args.type, limit=sys.maxsize)
+        for entry in entries:
+            types = entry.type1 + (f"/{entry.type2}" if entry.type2 else "")
+            print(f"#{entry.dex:<5} {entry.name:<20} {types:<16} {(entry.content_hash or 'pending')[:12]}")
+        print(f"{total} mods", file=sys.stderr)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,498 @@
+#!/usr/bin/env python3
+"""
+Music Index for PokeGen
+Builds a granule-to-offset seek table and loop points for every music track
+from Ogg page headers, and streams a track from any position with one seek
+"""
+
+import argparse
+import json
+import os
+import struct
+import sys
+import time
+from bisect import bisect_left, bisect_right
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from itertools import accumulate, takewhile
+from pathlib import Path
+from typing import Any, BinaryIO, Dict, Iterator, List, Optional, Tuple, Union
+
+from metrics import configure_logging, log_event, phase
+from ogg_pages import LAST_PAGE, NO_GRANULE, PAGE_HEADER, OggError, iter_pages, read_page, restamp_page, stream_info
+from profiling import add_profile_argument, profiled
+
+
+VERSION = 1
+GAME_DIR = Path(__file__).parent.parent
+MUSIC_DIR = GAME_DIR / "music"
+DEFAULT_INDEX = Path(__file__).parent / "music_index.json"
+
+# The game plays music/<name>_intro.ogg once, then loops music/<name>.ogg
+INTRO_SUFFIX = '_intro'
+LOOP_POINTS = ('loop_start', 'loop_end')
+
+HEADER_PACKETS = {'vorbis': 3, 'opus': 2}  # identification, comment[, setup]
+COMMENT_MAGIC = {'vorbis': b'\x03vorbis', 'opus': b'OpusTags'}
+MAX_COMMENT_SIZE = 1 << 16  # tags past this (e.g. embedded cover art) are not read
+CHUNK_SIZE = 1 << 16
+
+Position = Union[float, str]  # seconds, or 'loop_start' / 'loop_end'
+
+
+def _parse_tags(packet: bytes, codec: str) -> Dict[str, str]:
+    """KEY=value tags of a Vorbis comment packet (keys upper-cased); {} if it is unreadable"""
+    magic = COMMENT_MAGIC[codec]
+    if not packet.startswith(magic):
+        return {}
+    tags = {}
+    try:
+        position = len(magic)
+        vendor, = struct.unpack_from('<I', packet, position)
+        position += 4 + vendor
+        count, = struct.unpack_from('<I', packet, position)
+        position += 4
+        for _ in range(count):
+            size, = struct.unpack_from('<I', packet, position)
+            key, _, value = packet[position + 4:position + 4 + size].decode('utf-8', 'replace').partition('=')
+            tags[key.upper()] = value
+            position += 4 + size
+    except struct.error:
+        pass  # truncated at MAX_COMMENT_SIZE: keep the tags read so far
+    return tags
+
+
+def read_headers(f: BinaryIO, codec: str, serial: int) -> Tuple[int, Dict[str, str]]:
+    """
+    Where the audio pages start, and the tags of the comment header
+
+    Walks the header pages packet by packet using their segment tables; only
+    the comment packet's bytes are read.
+
+    Returns:
+        (offset of the first audio page, tags)
+
+    Raises:
+        OggError: If the stream ends inside its headers
+    """
+    packets = 0
+    comment = bytearray()
+    for page in iter_pages(f):
+        if page.serial != serial:
+            continue
+        f.seek(page.offset + PAGE_HEADER.size)
+        lacing = f.read(page.header_size - PAGE_HEADER.size)
+        body = f.read(page.body_size) if packets <= 1 else b''
+        position = 0
+        for size in lacing:
+            if packets == 1 and len(comment) < MAX_COMMENT_SIZE:
+                comment += body[position:position + size]
+            position += size
+            if size < 255:  # a lacing value under 255 ends a packet
+                packets += 1
+        if packets >= HEADER_PACKETS[codec]:
+            return page.end, _parse_tags(bytes(comment), codec)
+    raise OggError("stream ends inside its headers")
+
+
+def _loop_from_tags(tags: Dict[str, str], samples: int) -> Optional[Tuple[int, int]]:
+    """(start, end) in samples from LOOPSTART with LOOPEND or LOOPLENGTH tags, if present and valid"""
+    try:
+        start = int(tags['LOOPSTART'])
+        end = int(tags['LOOPEND']) if 'LOOPEND' in tags else start + int(tags['LOOPLENGTH'])
+    except (KeyError, ValueError):
+        return None
+    if not 0 <= start < end <= samples:
+        return None
+    return start, end
+
+
+def index_track(path: Path) -> Dict[str, Any]:
+    """
+    Seek table and stream parameters of one Ogg Vorbis/Opus file
+
+    Reads page headers only; no audio is decoded.
+
+    Returns:
+        Index entry (see build_index) without the loop fields that depend
+        on neighbouring tracks
+
+    Raises:
+        OggError: If the file is not a readable Ogg Vorbis/Opus stream
+    """
+    path = Path(path)
+    stat = path.stat()
+    with open(path, 'rb') as f:
+        info = stream_info(f)
+        header_end, tags = read_headers(f, info.codec, info.serial)
+        granules, offsets = [], []
+        for page in iter_pages(f, header_end):
+            if page.serial == info.serial and page.granule != NO_GRANULE:
+                granules.append(page.granule)
+                offsets.append(page.offset)
+    if not granules:
+        raise OggError("no audio page with a granule position")
+    samples = max(0, granules[-1] - info.pre_skip)
+    loop = _loop_from_tags(tags, samples)
+    return {
+        'file': path.name,
+        'size': stat.st_size,
+        'mtime_ns': stat.st_mtime_ns,
+        'codec': info.codec,
+        'channels': info.channels,
+        'sample_rate': info.sample_rate,
+        'pre_skip': info.pre_skip,
+        'samples': samples,
+        'header_end': header_end,
+        'tag_loop': list(loop) if loop else None,
+        # Deltas from the previous page keep the table small
+        'granules': [granules[0]] + [b - a for a, b in zip(granules, granules[1:])],
+        'offsets': [offsets[0]] + [b - a for a, b in zip(offsets, offsets[1:])],
+    }
+
+
+def _link_loops(tracks: Dict[str, Dict[str, Any]]):
+    """Fill in each track's intro/next track and loop points"""
+    for name, track in tracks.items():
+        track['intro'] = f"{name}{INTRO_SUFFIX}" if f"{name}{INTRO_SUFFIX}" in tracks else None
+        body = name[:-len(INTRO_SUFFIX)] if name.endswith(INTRO_SUFFIX) else None
+        track['next'] = body if body in tracks else None
+        if track['tag_loop']:
+            track['loop_start'], track['loop_end'] = track['tag_loop']
+        elif track['next']:
+            track['loop_start'] = track['loop_end'] = None  # played once, then the looping track
+        else:
+            track['loop_start'], track['loop_end'] = 0, track['samples']
+
+
+def build_index(
+    music_dir: Path = MUSIC_DIR,
+    previous: Optional[Dict[str, Any]] = None,
+    workers: Optional[int] = None
+) -> Dict[str, Any]:
+    """
+    Index every .ogg in the music directory
+
+    Args:
+        music_dir: Directory of tracks
+        previous: Earlier index; tracks whose size and mtime match it are
+                  not read again
+        workers: Reader threads (default: 4 per CPU, at most 32)
+
+    Returns:
+        {'version', 'tracks': {name: entry}, 'failed': [{'file', 'error'}]}.
+        An entry holds the stream parameters, the length in samples, the
+        offset where audio pages start ('header_end'), the seek table as
+        delta-encoded 'granules' and 'offsets' (one pair per audio page),
+        and loop points in samples: 'loop_start'/'loop_end' (from LOOPSTART
+        and LOOPEND/LOOPLENGTH tags, otherwise the whole track; None for an
+        intro), 'intro' and 'next' (the track played after an intro).
+    """
+    started = time.perf_counter()
+    known = (previous or {}).get('tracks', {})
+    tracks: Dict[str, Dict[str, Any]] = {}
+    jobs = []  # (name, path)
+    with phase('music_index_scan'), os.scandir(music_dir) as entries:
+        for entry in entries:
+            if not entry.name.endswith('.ogg') or not entry.is_file():
+                continue
+            name = entry.name[:-len('.ogg')]
+            stat = entry.stat()
+            record = known.get(name)
+            if record and record['size'] == stat.st_size and record['mtime_ns'] == stat.st_mtime_ns:
+                tracks[name] = record
+            else:
+                jobs.append((name, Path(entry.path)))
+
+    failed = []
+    if jobs:
+        workers = workers or min(32, 4 * (os.cpu_count() or 1))
+        with phase('music_index_read', files=len(jobs)), ThreadPoolExecutor(workers) as pool:
+            for (name, path), outcome in zip(jobs, pool.map(_try_index, [path for _, path in jobs])):
+                if isinstance(outcome, dict):
+                    tracks[name] = outcome
+                else:
+                    failed.append({'file': str(path), 'error': outcome})
+
+    tracks = dict(sorted(tracks.items()))
+    _link_loops(tracks)
+    duration_ms = round((time.perf_counter() - started) * 1000, 2)
+    log_event('music_index.built', tracks=len(tracks), read=len(jobs), failed=len(failed), duration_ms=duration_ms)
+    return {'version': VERSION, 'tracks': tracks, 'failed': failed,
+            'stats': {'tracks': len(tracks), 'read': len(jobs), 'duration_ms': duration_ms}}
+
+
+def _try_index(path: Path) -> Union[Dict[str, Any], str]:
+    try:
+        return index_track(path)
+    except (OSError, OggError) as e:
+        return str(e)
+
+
+def load_index(path: Path = DEFAULT_INDEX) -> Optional[Dict[str, Any]]:
+    """The saved index, or None if it is missing, unreadable or of another version"""
+    try:
+        index = json.loads(Path(path).read_text())
+    except (OSError, ValueError):
+        return None
+    return index if index.get('version') == VERSION else None
+
+
+def save_index(index: Dict[str, Any], path: Path = DEFAULT_INDEX):
+    """Write the index atomically (without its run statistics)"""
+    path = Path(path)
+    partial = path.with_name(path.name + '.part')
+    partial.write_text(json.dumps({key: value for key, value in index.items() if key != 'stats'},
+                                  separators=(',', ':')))
+    partial.replace(path)
+
+
+@dataclass(frozen=True)
+class Track:
+    """Seek table and loop points of one track"""
+    name: str
+    path: Path
+    sample_rate: int
+    pre_skip: int
+    samples: int
+    header_end: int
+    loop_start: Optional[int]
+    loop_end: Optional[int]
+    intro: Optional[str]
+    next: Optional[str]
+    granules: List[int]  # granule position at the end of each audio page
+    offsets: List[int]  # file offset of each audio page
+
+    @classmethod
+    def from_entry(cls, name: str, path: Path, entry: Dict[str, Any]) -> 'Track':
+        return cls(name, path, entry['sample_rate'], entry['pre_skip'], entry['samples'], entry['header_end'],
+                   entry['loop_start'], entry['loop_end'], entry['intro'], entry['next'],
+                   list(accumulate(entry['granules'])), list(accumulate(entry['offsets'])))
+
+    @property
+    def duration(self) -> float:
+        """Length in seconds"""
+        return self.samples / self.sample_rate
+
+    def sample(self, at: Position) -> int:
+        """
+        Sample number of a position, clamped to the track
+
+        Raises:
+            ValueError: For a loop point of a track that does not loop (an intro)
+        """
+        if isinstance(at, str):
+            if at not in LOOP_POINTS:
+                raise ValueError(f"unknown position {at!r} (expected seconds or {' / '.join(LOOP_POINTS)})")
+            sample = getattr(self, at)
+            if sample is None:
+                raise ValueError(f"{self.name} does not loop (it is followed by {self.next})")
+            return sample
+        return min(self.samples, max(0, round(at * self.sample_rate)))
+
+    def locate(self, sample: int) -> Tuple[int, int]:
+        """
+        Where to start reading to hear a sample
+
+        Reading starts one page before the page holding the sample, so the
+        decoder has the packet that overlaps it.
+
+        Returns:
+            (file offset of the page, sample at which decoded audio starts:
+            at or before the requested one)
+        """
+        target = sample + self.pre_skip
+        page = max(0, bisect_right(self.granules, target) - 1)
+        begins = self.granules[page - 1] if page else 0
+        return self.offsets[page], max(0, begins - self.pre_skip)
+
+    def stop_offset(self, sample: int) -> Optional[int]:
+        """File offset just past the page holding a sample; None if that is the end of the file"""
+        page = bisect_left(self.granules, sample + self.pre_skip)
+        return self.offsets[page + 1] if page + 1 < len(self.offsets) else None
+
+
+class MusicStream:
+    """
+    Ogg bytes of a track starting at a position: the header pages, then the
+    audio pages from the located page on, read in bounded chunks
+
+    Iterating opens the file, reads the headers and seeks once. Feed the
+    chunks to any Ogg decoder; its output starts at `start` seconds, at most
+    one page before the requested position. The audio pages are renumbered
+    and their granule positions rebased to that start, so the clip reads as
+    its own length, and the last page of a clip cut with `end` is marked as
+    the end of the stream.
+    """
+
+    def __init__(self, track: Track, at: Position = 0.0, end: Optional[Position] = None,
+                 chunk_size: int = CHUNK_SIZE):
+        self.track = track
+        self.target = track.sample(at)
+        self.offset, self.start_sample = track.locate(self.target)
+        self.start = self.start_sample / track.sample_rate
+        self.stop = track.stop_offset(track.sample(end)) if end is not None else None
+        self.chunk_size = chunk_size
+
+    def __iter__(self) -> Iterator[bytes]:
+        with open(self.track.path, 'rb') as f:
+            remaining = self.track.header_end
+            while remaining:
+                chunk = f.read(min(self.chunk_size, remaining))
+                if not chunk:
+                    raise OggError(f"{self.track.path} is shorter than its index says")
+                remaining -= len(chunk)
+                yield chunk
+            header_end = self.track.header_end
+            sequence = sum(1 for _ in takewhile(lambda page: page.offset < header_end, iter_pages(f)))
+            chunk = bytearray()
+            offset = self.offset
+            while self.stop is None or offset < self.stop:
+                page = read_page(f, offset)
+                if page is None:
+                    break
+                f.seek(offset)
+                data = f.read(page.header_size + page.body_size)
+                if len(data) < page.header_size + page.body_size:
+                    break  # truncated last page: copy what is whole
+                granule = page.granule if page.granule == NO_GRANULE else page.granule - self.start_sample
+                flags = page.flags | (LAST_PAGE if page.end == self.stop else 0)
+                if chunk and len(chunk) + len(data) > self.chunk_size:
+                    yield bytes(chunk)
+                    chunk.clear()
+                chunk += restamp_page(data, granule, sequence, flags)
+                sequence += 1
+                offset = page.end
+            if chunk:
+                yield bytes(chunk)
+
+
+class MusicIndex:
+    """
+    Seek tables of the music tracks, from the saved index
+
+    Tracks changed since the index was built (or missing from it) are
+    re-indexed in memory when first used.
+    """
+
+    def __init__(self, music_dir: Path = MUSIC_DIR, index_path: Optional[Path] = DEFAULT_INDEX):
+        self.music_dir = Path(music_dir)
+        index = load_index(index_path) if index_path is not None else None
+        self.entries: Dict[str, Dict[str, Any]] = (index or {}).get('tracks', {})
+        self._tracks: Dict[str, Tuple[int, int, Track]] = {}  # name -> (size, mtime_ns, track)
+
+    def names(self) -> List[str]:
+        """Track names (file names without .ogg)"""
+        return sorted(path.stem for path in self.music_dir.glob('*.ogg'))
+
+    def track(self, name: str) -> Track:
+        """
+        One track's seek table and loop points
+
+        Raises:
+            FileNotFoundError: If there is no music/<name>.ogg
+            OggError: If the file is not a readable Ogg stream
+        """
+        path = self.music_dir / f"{name}.ogg"
+        stat = path.stat()
+        cached = self._tracks.get(name)
+        if cached is not None and cached[:2] == (stat.st_size, stat.st_mtime_ns):
+            return cached[2]
+        entry = self.entries.get(name)
+        if entry is None or entry['size'] != stat.st_size or entry['mtime_ns'] != stat.st_mtime_ns:
+            entry = index_track(path)
+            self.entries[name] = entry
+            # Loop points depend on whether an intro or looping track sits next to it
+            others = [f"{name}{INTRO_SUFFIX}"]
+            if name.endswith(INTRO_SUFFIX):
+                others.append(name[:-len(INTRO_SUFFIX)])
+            neighbours = {other: self.entries.get(other, {'tag_loop': None, 'samples': 0})
+                          for other in others if (self.music_dir / f"{other}.ogg").exists()}
+            _link_loops({name: entry, **neighbours})
+        track = Track.from_entry(name, path, entry)
+        self._tracks[name] = (stat.st_size, stat.st_mtime_ns, track)
+        return track
+
+    def open(self, name: str, at: Position = 0.0, end: Optional[Position] = None,
+             chunk_size: int = CHUNK_SIZE) -> MusicStream:
+        """
+        Stream a track from a position
+
+        Args:
+            name: Track name (e.g. 'route_1')
+            at: Seconds from the start, or 'loop_start' / 'loop_end'
+            end: Stop after the page holding this position (default: the end of the file)
+            chunk_size: Largest chunk yielded (audio chunks hold whole pages, so
+                a single larger page is yielded alone); bounds the memory used
+
+        Raises:
+            FileNotFoundError: If there is no such track
+            ValueError: For a loop point of an intro
+        """
+        return MusicStream(self.track(name), at, end, chunk_size)
+
+
+def _describe(track: Track) -> str:
+    rate = track.sample_rate
+    loop = (f"loop {track.loop_start / rate:.3f}-{track.loop_end / rate:.3f} s"
+            if track.loop_start is not None else f"intro, then {track.next}")
+    intro = f", intro {track.intro}" if track.intro else ""
+    return f"{track.name}: {track.duration:.3f} s at {rate} Hz, {len(track.granules)} pages, {loop}{intro}"
+
+
+def main():
+    """Command-line interface"""
+    parser = argparse.ArgumentParser(description='Index music tracks for seeking and extract clips')
+    parser.add_argument('tracks', nargs='*', help='Tracks to describe (e.g. route_1)')
+    parser.add_argument('--music', type=Path, default=MUSIC_DIR, help='Music directory (default: ../music)')
+    parser.add_argument('--index', type=Path, default=DEFAULT_INDEX, help='Index file (default: music_index.json)')
+    parser.add_argument('--full', action='store_true', help='Re-read every track')
+    parser.add_argument('--workers', type=int, help='Reader threads (default: 4 per CPU, at most 32)')
+    parser.add_argument('--extract', type=Path, metavar='OGG',
+                        help='Write the first track from --at to --end as a playable Ogg file')
+    parser.add_argument('--at', default='0', help='Start: seconds, loop_start or loop_end (default: 0)')
+    parser.add_argument('--end', help='End: seconds, loop_start or loop_end (default: the end of the track)')
+    add_profile_argument(parser)
+
+    args = parser.parse_args()
+    configure_logging()
+
+    def position(value: Optional[str]) -> Optional[Position]:
+        return value if value is None or value in LOOP_POINTS else float(value)
+
+    with profiled(args.profile, 'music_index'):
+        index = build_index(args.music, None if args.full else load_index(args.index), args.workers)
+        stats = index['stats']
+        try:
+            save_index(index, args.index)
+        except OSError as e:
+            print(f"✗ {e}", file=sys.stderr)
+            sys.exit(2)
+        pages = sum(len(track['granules']) for track in index['tracks'].values())
+        print(f"✓ {stats['tracks']} tracks ({pages} pages) in {args.index} "
+              f"({args.index.stat().st_size // 1024} KB); {stats['read']} read in {stats['duration_ms']:.1f} ms")
+        for failure in index['failed']:
+            print(f"  ✗ {failure['file']}: {failure['error']}")
+
+        music = MusicIndex(args.music, args.index)
+        try:
+            for name in args.tracks:
+                print(f"  {_describe(music.track(name))}")
+            if args.extract:
+                if not args.tracks:
+                    parser.error("--extract needs a track")
+                stream = music.open(args.tracks[0], position(args.at), position(args.end))
+                written = 0
+                with open(args.extract, 'wb') as f:
+                    for chunk in stream:
+                        written += f.write(chunk)
+                print(f"✓ Wrote {args.extract} ({written // 1024} KB), starting {stream.start:.3f} s into "
+                      f"{args.tracks[0]} (asked for {stream.target / stream.track.sample_rate:.3f} s)")
+        except (OSError, ValueError) as e:
+            print(f"✗ {e}", file=sys.stderr)
+            sys.exit(2)
+    sys.exit(1 if index['failed'] else 0)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,192 @@
+#!/usr/bin/env python3
+"""
+Ogg Pages for PokeGen
+Reads Ogg container page headers (granule positions, offsets, stream info)
+without decoding any audio
+"""
+
+import struct
+from dataclasses import dataclass
+from pathlib import Path
+from typing import BinaryIO, Iterator, Optional
+
+
+# capture pattern, version, flags, granule position, serial, sequence, CRC, segment count
+PAGE_HEADER = struct.Struct('<4sBBqIIIB')
+CAPTURE = b'OggS'
+MAX_PAGE_SIZE = PAGE_HEADER.size + 255 + 255 * 255
+
+CONTINUED, FIRST_PAGE, LAST_PAGE = 1, 2, 4  # header type flags
+NO_GRANULE = -1  # page on which no packet ends
+
+VORBIS_ID = struct.Struct('<7sIBI')  # b'\x01vorbis', version, channels, sample rate
+OPUS_HEAD = struct.Struct('<8sBBHI')  # b'OpusHead', version, channels, pre-skip, input rate
+OPUS_GRANULE_RATE = 48000
+
+CRC_OFFSET = 22  # of the checksum field in a page header
+CRC_POLYNOMIAL = 0x04C11DB7  # Ogg's CRC-32: not bit-reflected, initial value 0
+
+
+def _crc_table():
+    table = []
+    for byte in range(256):
+        crc = byte << 24
+        for _ in range(8):
+            crc = ((crc << 1) ^ CRC_POLYNOMIAL) if crc & 0x80000000 else crc << 1
+        table.append(crc & 0xFFFFFFFF)
+    return table
+
+
+CRC_TABLE = _crc_table()
+
+
+class OggError(ValueError):
+    """The file is not a readable Ogg stream"""
+
+
+@dataclass(frozen=True)
+class OggPage:
+    """Header of one Ogg page"""
+    offset: int
+    flags: int
+    granule: int
+    serial: int
+    sequence: int
+    header_size: int
+    body_size: int
+
+    @property
+    def end(self) -> int:
+        """File offset just past this page"""
+        return self.offset + self.header_size + self.body_size
+
+
+@dataclass(frozen=True)
+class StreamInfo:
+    """Codec parameters from the first packet of a logical stream"""
+    codec: str
+    serial: int
+    channels: int
+    sample_rate: int  # granule positions count samples at this rate
+    pre_skip: int  # samples at the start that are not played (Opus)
+
+
+def parse_page(data: bytes, offset: int = 0, position: int = 0) -> Optional[OggPage]:
+    """
+    Page header starting at data[offset:], or None if there isn't a complete one
+
+    Args:
+        data: Buffer holding the header (the body need not be present)
+        offset: Where the header starts in data
+        position: File offset of data[0]
+    """
+    if len(data) - offset < PAGE_HEADER.size:
+        return None
+    capture, version, flags, granule, serial, sequence, _, segments = PAGE_HEADER.unpack_from(data, offset)
+    if capture != CAPTURE or version != 0:
+        return None
+    table = data[offset + PAGE_HEADER.size:offset + PAGE_HEADER.size + segments]
+    if len(table) < segments:
+        return None
+    return OggPage(position + offset, flags, granule, serial, sequence, PAGE_HEADER.size + segments, sum(table))
+
+
+def page_checksum(page: bytes) -> int:
+    """Ogg CRC-32 of a whole page, computed with its checksum field as zero"""
+    crc = 0
+    table = CRC_TABLE
+    for index, byte in enumerate(page):
+        if CRC_OFFSET <= index < CRC_OFFSET + 4:
+            byte = 0
+        crc = ((crc << 8) & 0xFFFFFFFF) ^ table[(crc >> 24) ^ byte]
+    return crc
+
+
+def restamp_page(page: bytes, granule: int, sequence: int, flags: int) -> bytes:
+    """
+    A copy of a whole page (header and body) with a new granule position,
+    sequence number and header flags, and its checksum recomputed
+    """
+    capture, version, _, _, serial, _, _, segments = PAGE_HEADER.unpack_from(page)
+    data = bytearray(page)
+    PAGE_HEADER.pack_into(data, 0, capture, version, flags, granule, serial, sequence, 0, segments)
+    struct.pack_into('<I', data, CRC_OFFSET, page_checksum(data))
+    return bytes(data)
+
+
+def read_page(f: BinaryIO, offset: int) -> Optional[OggPage]:
+    """Page header at a file offset, or None at the end of the file"""
+    f.seek(offset)
+    header = f.read(PAGE_HEADER.size)
+    if len(header) < PAGE_HEADER.size:
+        return None
+    segments = header[-1]
+    page = parse_page(header + f.read(segments), 0, offset)
+    if page is None:
+        raise OggError(f"no Ogg page at offset {offset}")
+    return page
+
+
+def iter_pages(f: BinaryIO, start: int = 0) -> Iterator[OggPage]:
+    """Every page header from `start` on, seeking over page bodies"""
+    offset = start
+    while True:
+        page = read_page(f, offset)
+        if page is None:
+            return
+        yield page
+        offset = page.end
+
+
+def stream_info(f: BinaryIO) -> StreamInfo:
+    """Codec, channels and sample rate from the identification header on the first page"""
+    page = read_page(f, 0)
+    if page is None:
+        raise OggError("no Ogg page at the start of the file")
+    f.seek(page.offset + page.header_size)
+    packet = f.read(min(page.body_size, 64))
+    if packet.startswith(b'\x01vorbis') and len(packet) >= VORBIS_ID.size:
+        _, _, channels, rate = VORBIS_ID.unpack_from(packet)
+        return StreamInfo('vorbis', page.serial, channels, rate, 0)
+    if packet.startswith(b'OpusHead') and len(packet) >= OPUS_HEAD.size:
+        _, _, channels, pre_skip, _ = OPUS_HEAD.unpack_from(packet)
+        return StreamInfo('opus', page.serial, channels, OPUS_GRANULE_RATE, pre_skip)
+    raise OggError("unsupported codec (expected Vorbis or Opus)")
+
+
+def last_granule(f: BinaryIO, serial: int) -> int:
+    """
+    Granule position of the last page of a stream that has one
+
+    Reads at most one maximum-size page from the end of the file; only falls
+    back to walking every page header if that tail holds no usable page.
+    """
+    size = f.seek(0, 2)
+    start = max(0, size - MAX_PAGE_SIZE)
+    f.seek(start)
+    tail = f.read()
+
+    position = len(tail)
+    while True:
+        position = tail.rfind(CAPTURE, 0, position)
+        if position < 0:
+            break
+        page = parse_page(tail, position, start)
+        if page is not None and page.end <= size and page.serial == serial and page.granule != NO_GRANULE:
+            return page.granule
+
+    granule = None
+    for page in iter_pages(f):
+        if page.serial == serial and page.granule != NO_GRANULE:
+            granule = page.granule
+    if granule is None:
+        raise OggError("no page with a granule position")
+    return granule
+
+
+def duration(path: Path) -> float:
+    """Length of an Ogg Vorbis/Opus file in seconds, from its first and last page headers"""
+    with open(path, 'rb') as f:
+        info = stream_info(f)
+        samples = last_granule(f, info.serial) - info.pre_skip
+    return max(0, samples) / info.sample_rate
@@ -0,0 +1,277 @@
+#!/usr/bin/env python3
+"""
+Overworld Sheets for PokeGen
+Slices every species' overworld frames out of the combined sheets using
+pokemon_overworld_adjustments.asm, and indexes mods' own overworld.png frames
+"""
+
+import argparse
+import json
+import logging
+import os
+import sys
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+from PIL import Image
+
+from metrics import configure_logging, log_event, phase
+from mod_registry import ModRegistry
+from species_table import SOURCES, SpeciesData, SpeciesTable, name_key
+
+
+VERSION = 1
+FRAME = 16  # every overworld frame is 16x16
+
+# overworlds_sheet.png: 6 frames per species (side, side, back, back, front, front) in a row,
+# 26 species per 16-pixel row; `db i` in the adjustments is the species' slot
+SHEET = "overworlds_sheet.png"
+SHEET_FRAMES = 6
+SHEET_SLOTS_PER_ROW = 26
+
+# crystal-overworld-sprites1.png: a labelled "minidex" of dex 1-251, 2 frames per species,
+# 15 species per row, cells 17 pixels apart behind 1-pixel grid lines
+CRYSTAL = "crystal-overworld-sprites1.png"
+CRYSTAL_FRAMES = 2
+CRYSTAL_PER_ROW = 15
+CRYSTAL_LAST_DEX = 251
+CRYSTAL_ORIGIN = (1, 31)
+CRYSTAL_STEP = (17, 25)
+
+# A species' own overworld.png (as in pokemon/credited/pokemon/): the 6 sheet frames stacked vertically
+STRIP_SIZE = (FRAME, FRAME * SHEET_FRAMES)
+
+
+def sheet_frames(sheet: np.ndarray) -> np.ndarray:
+    """overworlds_sheet.png as [slot, frame, 16, 16, RGBA] (a view, nothing is copied)"""
+    rows = sheet.shape[0] // FRAME
+    columns = SHEET_SLOTS_PER_ROW * SHEET_FRAMES
+    grid = sheet[:rows * FRAME, :columns * FRAME].reshape(rows, FRAME, SHEET_SLOTS_PER_ROW, SHEET_FRAMES, FRAME, 4)
+    return grid.transpose(0, 2, 3, 1, 4, 5).reshape(rows * SHEET_SLOTS_PER_ROW, SHEET_FRAMES, FRAME, FRAME, 4)
+
+
+def crystal_origin(dex: int) -> Tuple[int, int]:
+    """Top-left corner of a species' first frame in crystal-overworld-sprites1.png"""
+    row, column = divmod(dex - 1, CRYSTAL_PER_ROW)
+    return (CRYSTAL_ORIGIN[0] + CRYSTAL_STEP[0] * CRYSTAL_FRAMES * column,
+            CRYSTAL_ORIGIN[1] + CRYSTAL_STEP[1] * row)
+
+
+def crystal_frames(sheet: np.ndarray, dexes: np.ndarray) -> np.ndarray:
+    """Frames of some species from crystal-overworld-sprites1.png as [species, frame, 16, 16, RGBA]"""
+    row, column = np.divmod(dexes - 1, CRYSTAL_PER_ROW)
+    frame = np.arange(CRYSTAL_FRAMES)
+    pixel = np.arange(FRAME)
+    x = (CRYSTAL_ORIGIN[0] + CRYSTAL_STEP[0] * (CRYSTAL_FRAMES * column[:, None] + frame))[:, :, None] + pixel
+    y = (CRYSTAL_ORIGIN[1] + CRYSTAL_STEP[1] * row)[:, None] + pixel
+    return sheet[y[:, None, :, None], x[:, :, None, :]]
+
+
+def _load_sheet(path: Path) -> np.ndarray:
+    with Image.open(path) as image:
+        return np.asarray(image.convert('RGBA'))
+
+
+def _file_signature(path: Path) -> List[int]:
+    stat = path.stat()
+    return [stat.st_size, stat.st_mtime_ns]
+
+
+def build_index(data_dir: Path, table: SpeciesTable, registry: Optional[ModRegistry] = None) -> Dict[str, Any]:
+    """
+    Frame index of every species with overworld art
+
+    Species listed in the adjustments (with `db found, true`) use their slot in
+    overworlds_sheet.png; other species up to dex 251 use the Crystal sheet.
+    Frames are [x, y] corners of 16x16 cells in the named source image.
+
+    Args:
+        data_dir: The game's pokemon/ directory
+        table: Compiled species table (holds the parsed adjustments)
+        registry: Mods whose overworld.png should be indexed too
+
+    Returns:
+        {'version', 'frame_size', 'sources', 'species', 'mods', 'problems'}
+    """
+    data_dir = Path(data_dir)
+    species: Dict[str, Dict[str, Any]] = {}
+    problems: List[Dict[str, Any]] = [
+        {'kind': item['kind'], 'source': 'overworld', 'message': f"line {item['line']}: {item['message']}"}
+        for item in table.problems() if item['file'] == SOURCES['overworld']
+    ]
+
+    with phase('overworld_slice'):
+        sheet = sheet_frames(_load_sheet(data_dir / SHEET))
+        crystal = _load_sheet(data_dir / CRYSTAL)
+
+        records = [table.by_dex(dex) for dex in range(1, table.species_count)]
+        listed = [r for r in records if r is not None and r.overworld_index is not None and r.overworld_found]
+        out_of_range = [r for r in listed if r.overworld_index >= len(sheet)]
+        listed = [r for r in listed if r.overworld_index < len(sheet)]
+        listed_dex = {r.dex for r in listed}
+        classic = [r for r in records if r is not None and r.dex <= CRYSTAL_LAST_DEX and r.dex not in listed_dex]
+
+        # One gather per sheet finds every species whose cells are blank
+        slots = np.array([r.overworld_index for r in listed], dtype=np.intp)
+        sheet_empty = (sheet[slots][..., 3] == 0).all(axis=(2, 3))
+        dexes = np.array([r.dex for r in classic], dtype=np.intp)
+        crystal_empty = (crystal_frames(crystal, dexes)[..., 3] == 0).all(axis=(2, 3))
+
+    for record in out_of_range:
+        problems.append({'kind': 'slot_out_of_range', 'source': 'overworld',
+                         'message': f"{record.name}: slot {record.overworld_index} is past the end of {SHEET}"})
+    for record, empty in zip(listed, sheet_empty):
+        row, column = divmod(record.overworld_index, SHEET_SLOTS_PER_ROW)
+        x, y = column * SHEET_FRAMES * FRAME, row * FRAME
+        species[name_key(record.name)] = {
+            'dex': record.dex, 'name': record.name, 'source': 'sheet', 'slot': record.overworld_index,
+            'flip': record.overworld_flip, 'frames': [[x + FRAME * f, y] for f in range(SHEET_FRAMES)],
+        }
+        if empty.all():
+            problems.append({'kind': 'blank_frames', 'source': 'overworld',
+                             'message': f"{record.name}: slot {record.overworld_index} of {SHEET} is blank"})
+    for record, empty in zip(classic, crystal_empty):
+        if empty.all():
+            continue  # no Crystal art for this dex
+        x, y = crystal_origin(record.dex)
+        species[name_key(record.name)] = {
+            'dex': record.dex, 'name': record.name, 'source': 'crystal', 'slot': record.dex - 1,
+            'flip': False, 'frames': [[x + CRYSTAL_STEP[0] * f, y] for f in range(CRYSTAL_FRAMES)],
+        }
+
+    mods: Dict[str, Dict[str, Any]] = {}
+    if registry is not None:
+        entries, _ = registry.search(limit=sys.maxsize)
+        for entry in entries:
+            path = registry.mods_dir / entry.name / "overworld.png"
+            if path.is_file():
+                mods[entry.name] = {'dex': entry.dex, 'path': str(path), 'signature': _file_signature(path),
+                                    'frames': [[0, FRAME * f] for f in range(SHEET_FRAMES)]}
+
+    index = {
+        'version': VERSION,
+        'frame_size': FRAME,
+        'sources': {
+            'sheet': {'path': str(data_dir / SHEET), 'signature': _file_signature(data_dir / SHEET)},
+            'crystal': {'path': str(data_dir / CRYSTAL), 'signature': _file_signature(data_dir / CRYSTAL)},
+        },
+        'species': dict(sorted(species.items(), key=lambda item: item[1]['dex'])),
+        'mods': mods,
+        'problems': problems,
+    }
+    log_event('overworld.indexed', species=len(species), mods=len(mods), problems=len(problems))
+    return index
+
+
+def save_index(index: Dict[str, Any], path: Path):
+    """Write the index atomically"""
+    path = Path(path)
+    partial = path.with_name(path.name + '.part')
+    partial.write_text(json.dumps(index, separators=(',', ':')))
+    partial.replace(path)
+
+
+def export_strips(data_dir: Path, index: Dict[str, Any], output_dir: Path) -> int:
+    """
+    Write each indexed species' frames as <output_dir>/<species>.png
+
+    Sheet species become 16x96 strips, the layout of a species' own
+    overworld.png; Crystal species become 16x32 strips.
+
+    Returns:
+        Number of files written
+    """
+    output_dir = Path(output_dir)
+    output_dir.mkdir(parents=True, exist_ok=True)
+    entries = list(index['species'].items())
+    with phase('overworld_export', species=len(entries)):
+        sheet = sheet_frames(_load_sheet(Path(data_dir) / SHEET))
+        crystal = _load_sheet(Path(data_dir) / CRYSTAL)
+        from_sheet = [(key, e) for key, e in entries if e['source'] == 'sheet']
+        from_crystal = [(key, e) for key, e in entries if e['source'] == 'crystal']
+        strips = [
+            (from_sheet, sheet[np.array([e['slot'] for _, e in from_sheet], dtype=np.intp)]),
+            (from_crystal, crystal_frames(crystal, np.array([e['dex'] for _, e in from_crystal], dtype=np.intp))),
+        ]
+        for chosen, frames in strips:
+            # [species, frame, y, x, RGBA] -> [species, frame * y, x, RGBA]: frames stacked top to bottom
+            stacked = np.ascontiguousarray(frames).reshape(len(chosen), -1, FRAME, 4)
+            for (key, _), strip in zip(chosen, stacked):
+                Image.fromarray(strip, 'RGBA').save(output_dir / f"{key}.png")
+    return len(entries)
+
+
+def register_mod_frames(mod_dir: Path, image: Path) -> Path:
+    """
+    Give a mod its own overworld frames without touching the shared sheets
+
+    Args:
+        mod_dir: The mod's directory
+        image: 6 frames of 16x16 (side, side, back, back, front, front) stacked
+               vertically (16x96) or side by side (96x16)
+
+    Returns:
+        The written <mod_dir>/overworld.png
+
+    Raises:
+        ValueError: If the image is not 16x96 or 96x16
+    """
+    with Image.open(image) as source:
+        frames = source.convert('RGBA')
+    if frames.size == STRIP_SIZE[::-1]:
+        pixels = np.asarray(frames).reshape(FRAME, SHEET_FRAMES, FRAME, 4).transpose(1, 0, 2, 3)
+        frames = Image.fromarray(np.ascontiguousarray(pixels).reshape(FRAME * SHEET_FRAMES, FRAME, 4), 'RGBA')
+    elif frames.size != STRIP_SIZE:
+        raise ValueError(f"overworld frames must be {STRIP_SIZE[0]}x{STRIP_SIZE[1]} or "
+                         f"{STRIP_SIZE[1]}x{STRIP_SIZE[0]} pixels, not {frames.size[0]}x{frames.size[1]}")
+    target = Path(mod_dir) / "overworld.png"
+    frames.save(target)
+    return target
+
+
+def main():
+    """Command-line interface"""
+    parser = argparse.ArgumentParser(description='Index and slice overworld sprite sheets')
+    parser.add_argument('species', nargs='*', help='Species or mod names to show')
+    parser.add_argument('--data', type=Path, default=Path(__file__).parent.parent / "pokemon",
+                        help='Game data directory (default: ../pokemon)')
+    parser.add_argument('--mods', type=Path, default=Path(__file__).parent.parent / "mods",
+                        help='Mods directory (default: ../mods)')
+    parser.add_argument('--index', type=Path, default=Path(__file__).parent / "overworld_index.json",
+                        help='Index file (default: overworld_index.json)')
+    parser.add_argument('--export', type=Path, help='Also write every species as <name>.png into this directory')
+    parser.add_argument('--problems', action='store_true', help='List every problem found')
+
+    args = parser.parse_args()
+    configure_logging()
+
+    try:
+        species_data = SpeciesData(args.data, Path(__file__).parent / "species_table.bin")
+        registry = ModRegistry(args.mods, species_data) if args.mods.is_dir() else None
+        index = build_index(args.data, species_data.table(), registry)
+    except (OSError, ValueError) as e:
+        log_event('overworld.failed', level=logging.ERROR, error=e)
+        print(f"✗ {e}", file=sys.stderr)
+        sys.exit(1)
+    save_index(index, args.index)
+    by_source = {}
+    for entry in index['species'].values():
+        by_source[entry['source']] = by_source.get(entry['source'], 0) + 1
+    print(f"✓ {len(index['species'])} species ({by_source.get('sheet', 0)} from {SHEET}, "
+          f"{by_source.get('crystal', 0)} from {CRYSTAL}), {len(index['mods'])} mods in {args.index} "
+          f"({os.path.getsize(args.index) / 1024:.0f} KB); {len(index['problems'])} problems")
+
+    if args.problems:
+        for problem in index['problems']:
+            print(f"  {problem['kind']}: {problem['message']}")
+    for name in args.species:
+        entry = index['mods'].get(name) or index['species'].get(name_key(name))
+        print(f"  {name}: {json.dumps(entry) if entry else 'not found'}")
+    if args.export:
+        count = export_strips(args.data, index, args.export)
+        print(f"✓ Wrote {count} strips to {args.export}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,277 @@
+#!/usr/bin/env python3
+"""
+PNG Optimizer for PokeGen
+Losslessly re-encodes attack frames, tiles and species sprites in the smallest
+PNG form (palette + tRNS, grayscale, RGB), checking every pixel round-trips
+"""
+
+import argparse
+import io
+import json
+import logging
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
+
+import numpy as np
+from PIL import Image
+
+from metrics import configure_logging, log_event, phase
+from profiling import add_profile_argument, profiled
+
+
+GAME_DIR = Path(__file__).parent.parent
+DEFAULT_DIRECTORIES = (GAME_DIR / "attacks", GAME_DIR / "tiles", GAME_DIR / "pokemon" / "pokemon")
+
+# 16-bit and other exotic modes would lose precision going through RGBA, so they are left alone
+SUPPORTED_MODES = {'1', 'L', 'LA', 'P', 'PA', 'RGB', 'RGBA'}
+
+
+def keeps_rgba(directory: str) -> bool:
+    """
+    Whether PNGs in this directory must stay RGBA
+
+    The Script-Directory frame scripts read attacks/<attack>/output/*.png
+    pixel by pixel as RGBA tuples, so those frames are only recompressed.
+    """
+    parts = Path(directory).parts
+    return len(parts) >= 3 and parts[-1] == 'output' and parts[-3] == 'attacks'
+
+
+def _candidates(rgba: np.ndarray, rgba_only: bool = False) -> Iterator[Tuple[Image.Image, Dict[str, Any]]]:
+    """Every encoding that can represent these RGBA pixels exactly, with its save options"""
+    height, width = rgba.shape[:2]
+    size = (width, height)
+    if rgba_only:
+        yield Image.frombytes('RGBA', size, rgba.tobytes()), {}
+        return
+    alpha = rgba[..., 3]
+    opaque = bool((alpha == 255).all())
+    gray = bool(((rgba[..., 0] == rgba[..., 1]) & (rgba[..., 1] == rgba[..., 2])).all())
+
+    colors, inverse = np.unique(rgba.reshape(-1, 4).view('<u4').ravel(), return_inverse=True)
+    if len(colors) <= 256:
+        # Translucent entries first, so tRNS only needs to list those
+        entries = colors.view(np.uint8).reshape(-1, 4)
+        order = np.argsort(entries[:, 3] == 255, kind='stable')
+        remap = np.empty_like(order)
+        remap[order] = np.arange(len(order))
+        entries = entries[order]
+        image = Image.frombytes('P', size, remap[inverse].astype(np.uint8).tobytes())
+        image.putpalette(entries[:, :3].tobytes())
+        translucent = int((entries[:, 3] != 255).sum())
+        yield image, {'transparency': entries[:translucent, 3].tobytes()} if translucent else {}
+
+    if gray and opaque:
+        image = Image.frombytes('L', size, np.ascontiguousarray(rgba[..., 0]).tobytes())
+        yield image, {}
+        if set(np.unique(rgba[..., 0]).tolist()) <= {0, 255}:
+            yield image.convert('1', dither=Image.Dither.NONE), {}
+    elif gray:
+        yield Image.frombytes('LA', size, np.ascontiguousarray(rgba[..., [0, 3]]).tobytes()), {}
+    if opaque:
+        yield Image.frombytes('RGB', size, np.ascontiguousarray(rgba[..., :3]).tobytes()), {}
+    yield Image.frombytes('RGBA', size, rgba.tobytes()), {}
+
+
+def smallest_encoding(data: bytes, rgba_only: bool = False) -> Tuple[Optional[bytes], str]:
+    """
+    Smallest lossless re-encoding of a PNG
+
+    Text, EXIF and dpi chunks are dropped; an ICC profile is kept.
+
+    Args:
+        data: Original PNG file contents
+        rgba_only: Only consider an RGBA encoding (see keeps_rgba)
+
+    Returns:
+        (new PNG bytes, '') if smaller and pixel-identical, otherwise
+        (None, reason) with reason 'unchanged' or why the file was skipped
+    """
+    with Image.open(io.BytesIO(data)) as original:
+        if original.format != 'PNG':
+            return None, f"not a PNG ({original.format})"
+        if getattr(original, 'is_animated', False):
+            return None, "animated PNG"
+        if original.mode not in SUPPORTED_MODES:
+            return None, f"unsupported mode {original.mode}"
+        icc_profile = original.info.get('icc_profile')
+        rgba = np.ascontiguousarray(np.asarray(original.convert('RGBA')))
+
+    best = None
+    for image, options in _candidates(rgba, rgba_only):
+        buffer = io.BytesIO()
+        if icc_profile:
+            options['icc_profile'] = icc_profile
+        image.save(buffer, 'PNG', optimize=True, **options)
+        if best is None or buffer.tell() < len(best):
+            best = buffer.getvalue()
+
+    if len(best) >= len(data):
+        return None, 'unchanged'
+    with Image.open(io.BytesIO(best)) as encoded:
+        if not np.array_equal(np.asarray(encoded.convert('RGBA')), rgba):
+            return None, "re-encoded pixels differ"
+    return best, ''
+
+
+def optimize_file(path: str, dry_run: bool = False, rgba_only: bool = False) -> Tuple[str, int, int, str]:
+    """
+    Replace one PNG (atomically) with its smallest lossless encoding
+
+    Returns:
+        (status, bytes before, bytes after, detail); status is 'optimized',
+        'unchanged', 'skipped' (format not handled) or 'failed'
+    """
+    try:
+        data = Path(path).read_bytes()
+        encoded, reason = smallest_encoding(data, rgba_only)
+        if encoded is None:
+            return ('unchanged' if reason == 'unchanged' else 'skipped'), len(data), len(data), reason
+        if not dry_run:
+            partial = Path(f"{path}.part")
+            partial.write_bytes(encoded)
+            partial.replace(path)
+        return 'optimized', len(data), len(encoded), ''
+    except Exception as e:  # one bad file must not stop the run
+        return 'failed', 0, 0, str(e) or type(e).__name__
+
+
+def _optimize_job(job: Tuple[str, bool, bool]) -> Tuple[str, int, int, str]:
+    return optimize_file(*job)
+
+
+def _scan(root: Path) -> Iterator[Tuple[str, os.DirEntry]]:
+    """(directory, entry) for every .png under root"""
+    stack = [str(root)]
+    while stack:
+        directory = stack.pop()
+        with os.scandir(directory) as entries:
+            for entry in entries:
+                if entry.is_dir(follow_symlinks=False):
+                    stack.append(entry.path)
+                elif entry.name.lower().endswith('.png') and entry.is_file():
+                    yield directory, entry
+
+
+def optimize_tree(
+    directories: Iterable[Path],
+    cache_path: Optional[Path] = None,
+    workers: Optional[int] = None,
+    dry_run: bool = False
+) -> Dict[str, Any]:
+    """
+    Optimize every PNG under some directories
+
+    Files whose size and mtime match the cache from the last run are skipped
+    without being read; the rest are re-encoded on a process pool.
+
+    Args:
+        directories: Trees to optimize (e.g. ../attacks)
+        cache_path: JSON file remembering files already optimal; None to check every file
+        workers: Worker processes (default: one per CPU)
+        dry_run: Report savings without writing
+
+    Returns:
+        Counts by outcome, total bytes before/after, bytes saved per directory
+        and the files that failed
+    """
+    started = time.perf_counter()
+    cache: Dict[str, Dict[str, List[int]]] = {}
+    if cache_path is not None:
+        try:
+            cache = json.loads(Path(cache_path).read_text())
+        except (OSError, ValueError):
+            cache = {}
+
+    report: Dict[str, Any] = {'files': 0, 'skipped': 0, 'optimized': 0, 'unchanged': 0, 'unsupported': 0,
+                              'bytes_before': 0, 'bytes_after': 0, 'directories': {}, 'failed': []}
+    jobs = []  # (directory, name)
+    with phase('png_optimize_scan'):
+        for root in directories:
+            for directory, entry in _scan(Path(root)):
+                stat = entry.stat()
+                report['files'] += 1
+                if cache.get(directory, {}).get(entry.name) == [stat.st_size, stat.st_mtime_ns]:
+                    report['skipped'] += 1
+                else:
+                    jobs.append((directory, entry.name))
+
+    if jobs:
+        workers = workers or os.cpu_count() or 1
+        with phase('png_optimize_encode', files=len(jobs)), ProcessPoolExecutor(workers) as pool:
+            results = pool.map(_optimize_job, [(os.path.join(d, n), dry_run, keeps_rgba(d)) for d, n in jobs],
+                               chunksize=max(1, min(64, len(jobs) // (workers * 4))))
+            for (directory, name), (status, before, after, detail) in zip(jobs, results):
+                path = os.path.join(directory, name)
+                if status == 'failed':
+                    report['failed'].append({'file': path, 'error': detail})
+                    continue
+                report['unsupported' if status == 'skipped' else status] += 1
+                report['bytes_before'] += before
+                report['bytes_after'] += after
+                if status == 'optimized':
+                    totals = report['directories'].setdefault(directory, {'files': 0, 'saved': 0})
+                    totals['files'] += 1
+                    totals['saved'] += before - after
+                if not dry_run:
+                    stat = os.stat(path)
+                    cache.setdefault(directory, {})[name] = [stat.st_size, stat.st_mtime_ns]
+
+    if cache_path is not None and not dry_run and jobs:
+        partial = Path(cache_path).with_suffix('.part')
+        try:
+            partial.write_text(json.dumps(cache))
+            partial.replace(cache_path)
+        except OSError as e:
+            log_event('png_optimize.cache_failed', level=logging.WARNING, error=e)
+
+    report['checked'] = len(jobs)
+    report['duration_ms'] = round((time.perf_counter() - started) * 1000, 2)
+    log_event('png_optimize.finished', files=report['files'], checked=len(jobs), optimized=report['optimized'],
+              saved=report['bytes_before'] - report['bytes_after'], failed=len(report['failed']),
+              duration_ms=report['duration_ms'])
+    return report
+
+
+def main():
+    """Command-line interface"""
+    parser = argparse.ArgumentParser(description='Losslessly shrink PNG assets')
+    parser.add_argument('directories', nargs='*', type=Path, default=list(DEFAULT_DIRECTORIES),
+                        help='Directories to optimize (default: ../attacks ../tiles ../pokemon/pokemon)')
+    parser.add_argument('--cache', type=Path, default=Path(__file__).parent / "png_optimize.json",
+                        help='Cache of files already optimal (default: png_optimize.json)')
+    parser.add_argument('--full', action='store_true', help='Ignore the cache and check every file')
+    parser.add_argument('--workers', type=int, help='Worker processes (default: one per CPU)')
+    parser.add_argument('--dry-run', action='store_true', help='Only report what would be saved')
+    parser.add_argument('--top', type=int, default=20, help='Directories to list by bytes saved (default: 20)')
+    add_profile_argument(parser)
+
+    args = parser.parse_args()
+    configure_logging()
+
+    with profiled(args.profile, 'png_optimizer'):
+        report = optimize_tree(args.directories, None if args.full else args.cache,
+                               workers=args.workers, dry_run=args.dry_run)
+
+    saved = report['bytes_before'] - report['bytes_after']
+    verb = "Would save" if args.dry_run else "Saved"
+    print(f"{report['files']} files: {report['skipped']} unchanged since last run, "
+          f"{report['checked']} checked in {report['duration_ms'] / 1000:.1f} s")
+    print(f"  {verb} {saved / 1024:.1f} KB in {report['optimized']} files; "
+          f"{report['unchanged']} already smallest, {report['unsupported']} not handled")
+    directories = sorted(report['directories'].items(), key=lambda item: -item[1]['saved'])
+    for directory, totals in directories[:args.top]:
+        print(f"  {totals['saved'] / 1024:9.1f} KB  {totals['files']:5d} files  {directory}")
+    if len(directories) > args.top:
+        print(f"  ... and {len(directories) - args.top} more directories")
+    for failure in report['failed']:
+        print(f"  ✗ {failure['file']}: {failure['error']}")
+    sys.exit(1 if report['failed'] else 0)
+
+
+if __name__ == '__main__':
+    main()
@@ -5,12 +5,55 @@ Programmatically create custom Pokémon mods without recompiling the JAR
 """
 
 import argparse
+import ctypes
+import errno
+import logging
+import os
+import secrets
 import sys
+import threading
+from contextlib import contextmanager
 from pathlib import Path
 from dataclasses import dataclass
-from typing import Optional, List
+from typing import Dict, Optional
 import shutil
 from PIL import Image
+from metrics import MODS_CREATED, configure_logging, log_event, phase
+from mod_registry import DexCollision, ModRegistry, state_dir
+from profiling import add_profile_argument, profiled
+from species_table import SpeciesData
+
+try:
+    import fcntl  # POSIX: also lock mods against other processes (serve.py workers)
+except ImportError:
+    fcntl = None
+
+try:
+    _renameat2 = ctypes.CDLL(None, use_errno=True).renameat2  # Linux (glibc 2.28+)
+except (AttributeError, OSError, TypeError):
+    _renameat2 = None
+AT_FDCWD = -100
+RENAME_EXCHANGE = 2
+
+
+def exchange_paths(a: Path, b: Path) -> bool:
+    """
+    Atomically swap two existing paths, so each name always exists
+
+    Returns:
+        True if swapped, False where the OS or filesystem cannot do it
+
+    Raises:
+        OSError: If the swap failed for another reason
+    """
+    if _renameat2 is None:
+        return False
+    if _renameat2(AT_FDCWD, os.fsencode(a), AT_FDCWD, os.fsencode(b), RENAME_EXCHANGE) == 0:
+        return True
+    error = ctypes.get_errno()
+    if error in (errno.ENOSYS, errno.EINVAL, errno.EOPNOTSUPP):
+        return False
+    raise OSError(error, os.strerror(error), str(a), None, str(b))
 
 
 @dataclass
@@ -43,8 +86,15 @@ class PokemonModGenerator:
         'FLASH_FIRE': 18, 'STATIC': 9, 'VITAL_SPIRIT': 72
     }
     
-    def __init__(self, output_dir: Optional[Path] = None):
-        """Initialize generator with optional output directory"""
+    def __init__(self, output_dir: Optional[Path] = None, species_data: Optional[SpeciesData] = None):
+        """
+        Initialize generator with optional output directory
+        
+        Args:
+            output_dir: Mods directory (default: ../mods, else ~/pokewilds/mods)
+            species_data: Shipped species whose dex numbers mods must not reuse
+                          (default: compiled from ../pokemon)
+        """
         if output_dir is None:
             # Try to find mods directory relative to parent pokewilds
             current = Path(__file__).parent
@@ -56,6 +106,49 @@ class PokemonModGenerator:
         
         self.output_dir = Path(output_dir)
         self.output_dir.mkdir(parents=True, exist_ok=True)
+        
+        # Mods are built here and renamed into place, so readers never see half a mod.
+        # Staging and lock files live beside mods/, never in it: the game scans mods/.
+        self.staging_dir = state_dir(self.output_dir) / "staging"
+        self.locks_dir = state_dir(self.output_dir) / "locks"
+        # Earlier versions staged inside mods/
+        shutil.rmtree(self.output_dir / ".staging", ignore_errors=True)
+        
+        # One lock per mod name; different mods can be written concurrently
+        self._mod_locks: Dict[str, threading.Lock] = {}
+        self._mod_locks_guard = threading.Lock()
+        
+        # Name, dex and types of every mod, for collision checks without walking output_dir
+        if species_data is None:
+            species_data = SpeciesData(Path(__file__).parent.parent / "pokemon",
+                                       Path(__file__).parent / "species_table.bin")
+        self.registry = ModRegistry(self.output_dir, species_data)
+    
+    @staticmethod
+    def is_valid_name(name: str) -> bool:
+        """True if name can be used as a mod directory name"""
+        return bool(name) and not name.startswith('.') and '/' not in name and '\\' not in name
+    
+    @contextmanager
+    def mod_lock(self, name: str):
+        """Serialize writes to one mod directory across threads and processes (case-insensitive)"""
+        key = name.lower()
+        with self._mod_locks_guard:
+            lock = self._mod_locks.get(key)
+            if lock is None:
+                lock = self._mod_locks[key] = threading.Lock()
+        
+        with lock:
+            if fcntl is None:
+                yield
+                return
+            self.locks_dir.mkdir(parents=True, exist_ok=True)
+            with open(self.locks_dir / f"{key}.lock", "a") as lock_file:
+                fcntl.flock(lock_file, fcntl.LOCK_EX)
+                try:
+                    yield
+                finally:
+                    fcntl.flock(lock_file, fcntl.LOCK_UN)
     
     def create_pokemon(
         self,
@@ -68,6 +161,10 @@ class PokemonModGenerator:
         ability2: Optional[str] = None,
         gender_ratio: int = 50,
         template_pokemon: Optional[str] = None,
+        front_sprite: Optional[Path] = None,
+        overworld_sprite: Optional[Path] = None,
+        verbose: bool = True,
+        allow_dex_collision: bool = False,
     ) -> bool:
         """
         Create a new Pokémon mod
@@ -82,6 +179,12 @@ class PokemonModGenerator:
             ability2: Secondary ability (optional)
             gender_ratio: 0-100 (0=always male, 100=always female)
             template_pokemon: Copy sprites from this Pokémon (e.g., 'pikachu')
+            front_sprite: PNG to use as the front sprite (e.g. a generated sprite)
+            overworld_sprite: PNG with the 6 overworld frames (16x96 or 96x16),
+                              written as the mod's own overworld.png
+            verbose: Print a summary of the created mod
+            allow_dex_collision: Create the mod even if a shipped species or
+                                 another mod already uses dex_number
         
         Returns:
             True if successful, False otherwise
@@ -90,51 +193,128 @@ class PokemonModGenerator:
         if stats is None:
             stats = PokemonStats()
         
-        # Create mod directory
+        if not self.is_valid_name(name):
+            log_event('mod.invalid_name', level=logging.ERROR, name=name)
+            MODS_CREATED.inc(result='failed')
+            return False
+        
         mod_dir = self.output_dir / name
-        mod_dir.mkdir(exist_ok=True)
+        
+        with self.mod_lock(name):
+            try:
+                previous = self.registry.claim(name, dex_number, type1, type2, allow_dex_collision)
+            except DexCollision as e:
+                log_event('mod.dex_collision', level=logging.ERROR, name=name, dex=dex_number,
+                          holder=e.holder, next_free=e.next_free)
+                MODS_CREATED.inc(result='failed')
+                return False
+            
+            staged = self.staging_dir / f"{name}.{secrets.token_hex(4)}"
+            try:
+                # Start from the current mod so files we do not generate (e.g. custom sprites) survive
+                self.staging_dir.mkdir(parents=True, exist_ok=True)
+                if mod_dir.is_dir():
+                    shutil.copytree(mod_dir, staged)
+                else:
+                    staged.mkdir()
+                
+                with phase('mod_write', name=name):
+                    self._write_mod(staged, name, dex_number, type1, type2, stats,
+                                    ability1, ability2, gender_ratio, template_pokemon, front_sprite,
+                                    overworld_sprite)
+                with phase('mod_publish', name=name):
+                    self._publish(staged, mod_dir)
+                
+            except Exception as e:
+                log_event('mod.create_failed', level=logging.ERROR, exc_info=True, name=name, error=e)
+                MODS_CREATED.inc(result='failed')
+                shutil.rmtree(staged, ignore_errors=True)
+                self.registry.release(name, previous)
+                return False
+            
+            self.registry.record(name)
+        
+        MODS_CREATED.inc(result='created')
+        
+        if not verbose:
+            return True
+        
+        print(f"✓ Created Pokémon mod: {name}")
+        print(f"  Location: {mod_dir}")
+        print(f"  Dex #: {dex_number}")
+        print(f"  Types: {type1}" + (f"/{type2}" if type2 else ""))
+        print(f"  Stats: HP={stats.hp} Att={stats.attack} Def={stats.defense} " +
+              f"SpA={stats.sp_atk} SpD={stats.sp_def} Spe={stats.speed}")
+        
+        return True
+    
+    def _write_mod(
+        self, mod_dir: Path, name: str, dex_number: int, type1: str, type2: Optional[str],
+        stats: PokemonStats, ability1: str, ability2: Optional[str], gender_ratio: int,
+        template_pokemon: Optional[str], front_sprite: Optional[Path] = None,
+        overworld_sprite: Optional[Path] = None
+    ):
+        """Write every file of a mod into mod_dir"""
         
         # Create graphics directory
         graphics_dir = mod_dir / "graphics"
         graphics_dir.mkdir(exist_ok=True)
         
+        # Generate sprite files
+        if template_pokemon:
+            self._copy_template_sprites(template_pokemon, graphics_dir)
+        else:
+            self._create_default_sprites(graphics_dir)
+        if front_sprite:
+            shutil.copyfile(front_sprite, graphics_dir / "front.png")
+        if overworld_sprite:
+            from overworld_sheets import register_mod_frames  # numpy: only for mods with overworld frames
+            register_mod_frames(mod_dir, overworld_sprite)
+        
+        # Generate ASM files
+        asm_dir = mod_dir / "data" / "pokemon" / "dex_entries"
+        asm_dir.mkdir(parents=True, exist_ok=True)
+        
+        # Create base stats file
+        stats_asm = self._generate_base_stats_asm(
+            name, dex_number, type1, type2, stats, ability1, ability2, gender_ratio
+        )
+        (asm_dir / f"{name.lower()}_base_stats.asm").write_text(stats_asm)
+        
+        # Create moves/evos file
+        moves_asm = self._generate_evos_attacks_asm(name, dex_number)
+        (asm_dir / f"{name.lower()}_moves.asm").write_text(moves_asm)
+        
+        # Create config file
+        config = self._generate_config(name, dex_number, type1, type2,
+                                       front_sprite.name if front_sprite else None)
+        (mod_dir / "pokemon.cfg").write_text(config)
+    
+    def _publish(self, staged: Path, mod_dir: Path):
+        """
+        Swap a fully written staging directory into place; caller holds the mod lock
+
+        Where the OS can exchange two directories atomically (Linux), the mod
+        never disappears from mods/. Elsewhere the old copy is renamed aside
+        first, so for a moment the mod is missing; readers such as the mod
+        registry skip a mod without a pokemon.cfg, and the watcher picks the
+        mod up again on its next poll.
+        """
+        if not mod_dir.exists():
+            staged.rename(mod_dir)
+            return
+        if exchange_paths(staged, mod_dir):
+            shutil.rmtree(staged, ignore_errors=True)  # now holds the old copy
+            return
+        
+        retired = staged.with_name(staged.name + ".old")
+        mod_dir.rename(retired)
         try:
-            # Generate sprite files
-            if template_pokemon:
-                self._copy_template_sprites(template_pokemon, graphics_dir)
-            else:
-                self._create_default_sprites(graphics_dir)
-            
-            # Generate ASM files
-            asm_dir = mod_dir / "data" / "pokemon" / "dex_entries"
-            asm_dir.mkdir(parents=True, exist_ok=True)
-            
-            # Create base stats file
-            stats_asm = self._generate_base_stats_asm(
-                name, dex_number, type1, type2, stats, ability1, ability2, gender_ratio
-            )
-            (asm_dir / f"{name.lower()}_base_stats.asm").write_text(stats_asm)
-            
-            # Create moves/evos file
-            moves_asm = self._generate_evos_attacks_asm(name, dex_number)
-            (asm_dir / f"{name.lower()}_moves.asm").write_text(moves_asm)
-            
-            # Create config file
-            config = self._generate_config(name, dex_number, type1, type2)
-            (mod_dir / "pokemon.cfg").write_text(config)
-            
-            print(f"✓ Created Pokémon mod: {name}")
-            print(f"  Location: {mod_dir}")
-            print(f"  Dex #: {dex_number}")
-            print(f"  Types: {type1}" + (f"/{type2}" if type2 else ""))
-            print(f"  Stats: HP={stats.hp} Att={stats.attack} Def={stats.defense} " +
-                  f"SpA={stats.sp_atk} SpD={stats.sp_def} Spe={stats.speed}")
-            
-            return True
-            
-        except Exception as e:
-            print(f"✗ Error creating Pokémon: {e}")
-            return False
+            staged.rename(mod_dir)
+        except Exception:
+            retired.rename(mod_dir)
+            raise
+        shutil.rmtree(retired, ignore_errors=True)
     
     def _generate_base_stats_asm(
         self, name: str, dex: int, type1: str, type2: Optional[str],
@@ -190,7 +370,9 @@ db  0, 0    ; End learnset
 """
         return asm.strip()
     
-    def _generate_config(self, name: str, dex: int, type1: str, type2: Optional[str]) -> str:
+    def _generate_config(
+        self, name: str, dex: int, type1: str, type2: Optional[str], source_sprite: Optional[str] = None
+    ) -> str:
         """Generate mod configuration file"""
         
         config = f"""# {name} Pokémon Configuration
@@ -209,15 +391,19 @@ sprite_back = graphics/back.png
 sprite_front_shiny = graphics/front_shiny.png
 sprite_back_shiny = graphics/back_shiny.png
 """
+        if source_sprite:
+            config += f"source_sprite = {source_sprite}\n"
         return config.strip()
     
     def _copy_template_sprites(self, template: str, target_dir: Path):
         """Copy sprites from template Pokémon"""
         
-        # Look for template in pokemon/sprites or pokewilds pokemon directory
+        # Look for template in pokemon/sprites, the pokewilds pokemon directory or
+        # a shipped species folder (pokemon/pokemon/<template>/front.png, back.png)
         template_paths = [
             Path.home() / "pokewilds" / "pokemon" / f"{template.lower()}_*.png",
             self.output_dir.parent / "pokemon" / f"{template.lower()}_*.png",
+            self.output_dir.parent / "pokemon" / "pokemon" / template.lower() / "*.png",
         ]
         
         files_copied = 0
@@ -232,10 +418,10 @@ sprite_back_shiny = graphics/back_shiny.png
                     shutil.copy2(sprite_file, target_file)
                     files_copied += 1
                 except Exception as e:
-                    print(f"  Warning: Could not copy {sprite_file}: {e}")
+                    log_event('mod.template_copy_failed', level=logging.WARNING, file=sprite_file, error=e)
         
         if files_copied == 0:
-            print(f"  Note: Template '{template}' sprites not found, creating defaults")
+            log_event('mod.template_missing', level=logging.WARNING, template=template)
             self._create_default_sprites(target_dir)
     
     def _create_default_sprites(self, target_dir: Path):
@@ -258,7 +444,9 @@ def main():
     )
     
     parser.add_argument('name', help='Pokémon name (mod directory name)')
-    parser.add_argument('--dex', type=int, default=888, help='National Pokédex number (default: 888)')
+    parser.add_argument('--dex', type=int, help='National Pokédex number (default: the next free number)')
+    parser.add_argument('--allow-dex-collision', action='store_true',
+                        help='Create the mod even if its dex number is already in use')
     parser.add_argument('--type1', default='NORMAL', help='Primary type (FIRE, WATER, etc.)')
     parser.add_argument('--type2', help='Secondary type (optional)')
     parser.add_argument('--hp', type=int, default=45, help='HP stat (default: 45)')
@@ -271,27 +459,36 @@ def main():
     parser.add_argument('--ability2', help='Secondary ability')
     parser.add_argument('--gender', type=int, default=50, help='Gender ratio 0-100 (default: 50)')
     parser.add_argument('--template', help='Template Pokémon for sprites (e.g., pikachu)')
+    parser.add_argument('--sprite', type=Path, help='PNG to use as the front sprite')
+    parser.add_argument('--overworld', type=Path,
+                        help='PNG with the 6 overworld frames (side, side, back, back, front, front), 16x96 or 96x16')
     parser.add_argument('--output', type=Path, help='Output directory (defaults to mods/)')
+    add_profile_argument(parser)
     
     args = parser.parse_args()
+    configure_logging()
     
-    gen = PokemonModGenerator(args.output)
-    stats = PokemonStats(
-        hp=args.hp, attack=args.att, defense=args.defense,
-        sp_atk=args.spa, sp_def=args.spd, speed=args.spe
-    )
-    
-    success = gen.create_pokemon(
-        name=args.name,
-        dex_number=args.dex,
-        type1=args.type1,
-        type2=args.type2,
-        stats=stats,
-        ability1=args.ability1,
-        ability2=args.ability2,
-        gender_ratio=args.gender,
-        template_pokemon=args.template
-    )
+    with profiled(args.profile, 'pokemon_mod_generator'):
+        gen = PokemonModGenerator(args.output)
+        stats = PokemonStats(
+            hp=args.hp, attack=args.att, defense=args.defense,
+            sp_atk=args.spa, sp_def=args.spd, speed=args.spe
+        )
+        
+        success = gen.create_pokemon(
+            name=args.name,
+            dex_number=args.dex if args.dex is not None else gen.registry.next_free_dex(),
+            type1=args.type1,
+            type2=args.type2,
+            stats=stats,
+            ability1=args.ability1,
+            ability2=args.ability2,
+            gender_ratio=args.gender,
+            template_pokemon=args.template,
+            front_sprite=args.sprite,
+            overworld_sprite=args.overworld,
+            allow_dex_collision=args.allow_dex_collision
+        )
     
     sys.exit(0 if success else 1)
 
@@ -0,0 +1,182 @@
+#!/usr/bin/env python3
+"""
+Profiling for PokeGen
+Shared --profile option: cProfile hotspots, tracemalloc peak allocation sites
+and per-phase wall-clock totals, written as one sorted text report
+"""
+
+import cProfile
+import io
+import logging
+import pstats
+import sys
+import threading
+import time
+import tracemalloc
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Optional
+
+from metrics import PHASE_SECONDS, log_event
+
+AUTO = 'auto'
+TOP_FUNCTIONS = 30
+TOP_ALLOCATIONS = 15
+SAMPLE_INTERVAL = 0.25  # seconds between checks for a new memory peak
+
+_session: Optional['ProfileSession'] = None
+
+
+def add_profile_argument(parser):
+    """Add --profile [REPORT] to an argparse parser"""
+    parser.add_argument('--profile', nargs='?', const=AUTO, metavar='REPORT',
+                        help='Profile the run and write a hotspot/allocation report '
+                             '(default: profile-<tool>-<time>.txt)')
+
+
+class ProfileSession:
+    """One profiled run: a profiler per thread, merged into one report"""
+
+    def __init__(self, tool: str, report: Path):
+        self.tool = tool
+        self.report = report
+        self.stats: Optional[pstats.Stats] = None
+        self.lock = threading.Lock()
+        self.peak_bytes = 0
+        self.peak_snapshot: Optional[tracemalloc.Snapshot] = None
+        self.phases_before = PHASE_SECONDS.snapshot()
+        self.started = time.perf_counter()
+        self._stop = threading.Event()
+        self._sampler = threading.Thread(target=self._sample, name='profile-sampler', daemon=True)
+
+    def add(self, profiler: cProfile.Profile):
+        """Merge a finished thread profiler into the session"""
+        with self.lock:
+            if self.stats is None:
+                self.stats = pstats.Stats(profiler)
+            else:
+                self.stats.add(profiler)
+
+    def _sample(self):
+        """Keep a snapshot of the largest traced heap seen so far"""
+        while not self._stop.wait(SAMPLE_INTERVAL):
+            self._check_peak()
+
+    def _check_peak(self):
+        current, _ = tracemalloc.get_traced_memory()
+        if current > self.peak_bytes:
+            self.peak_bytes = current
+            self.peak_snapshot = tracemalloc.take_snapshot()
+
+    def write_report(self):
+        """Write the text report next to a raw .prof file for other viewers"""
+        wall = time.perf_counter() - self.started
+        _, traced_peak = tracemalloc.get_traced_memory()
+        out = io.StringIO()
+        out.write(f"Profile of {self.tool}: {wall:.3f}s wall clock\n\n")
+
+        out.write("Phases (wall clock)\n")
+        phases = PHASE_SECONDS.snapshot()
+        rows = []
+        for key, counts in phases.items():
+            before = self.phases_before.get(key)
+            count = sum(counts[:-1]) - (sum(before[:-1]) if before else 0)
+            total = counts[-1] - (before[-1] if before else 0)
+            if count:
+                rows.append((total, key[0], count))
+        if rows:
+            out.write(f"  {'phase':<20} {'calls':>7} {'total s':>10} {'mean ms':>10}\n")
+            for total, name, count in sorted(rows, reverse=True):
+                out.write(f"  {name:<20} {count:>7} {total:>10.3f} {total / count * 1000:>10.2f}\n")
+        else:
+            out.write("  (no phases recorded)\n")
+
+        out.write(f"\nMemory: peak traced {traced_peak / 1024 / 1024:.1f} MB\n")
+        if self.peak_snapshot is not None:
+            out.write(f"Top allocation sites at the largest sampled heap ({self.peak_bytes / 1024 / 1024:.1f} MB)\n")
+            # Leave out the profiler's own bookkeeping
+            snapshot = self.peak_snapshot.filter_traces([
+                tracemalloc.Filter(False, cProfile.__file__),
+                tracemalloc.Filter(False, pstats.__file__),
+                tracemalloc.Filter(False, tracemalloc.__file__),
+            ])
+            for stat in snapshot.statistics('lineno')[:TOP_ALLOCATIONS]:
+                frame = stat.traceback[0]
+                out.write(f"  {stat.size / 1024:>10.1f} KiB {stat.count:>8} blocks  {frame.filename}:{frame.lineno}\n")
+
+        if self.stats is not None:
+            for sort, title in (('cumulative', 'cumulative time'), ('tottime', 'own time')):
+                out.write(f"\nHotspots by {title}\n")
+                self.stats.stream = out
+                self.stats.sort_stats(sort).print_stats(TOP_FUNCTIONS)
+            self.stats.dump_stats(str(self.report.with_suffix('.prof')))
+
+        self.report.parent.mkdir(parents=True, exist_ok=True)
+        self.report.write_text(out.getvalue())
+
+
+@contextmanager
+def profiled(report: Optional[str], tool: str):
+    """
+    Profile the with-block when report is set (the value of --profile)
+
+    Args:
+        report: Report path, AUTO for profile-<tool>-<time>.txt, or None to do nothing
+        tool: Name used in the report and default file name
+    """
+    global _session
+    if not report:
+        yield
+        return
+
+    if report == AUTO:
+        report = f"profile-{tool}-{time.strftime('%Y%m%d-%H%M%S')}.txt"
+    session = ProfileSession(tool, Path(report))
+
+    tracemalloc.start()
+    _session = session
+    session._sampler.start()
+    try:
+        with profile_thread():
+            yield
+    finally:
+        session._stop.set()
+        session._sampler.join()
+        session._check_peak()
+        _session = None
+        session.write_report()
+        tracemalloc.stop()
+        print(f"✓ Profile written to {session.report} (raw stats: {session.report.with_suffix('.prof')})",
+              file=sys.stderr)
+
+
+@contextmanager
+def profile_thread():
+    """
+    Profile the with-block on the current thread if a profiled() run is active
+
+    Before Python 3.12, cProfile only sees the thread that enabled it, so work
+    handed to other threads (request handlers, the sprite worker) is wrapped
+    in this. From 3.12 the profiler that profiled() started already covers
+    every thread, and a second one cannot be enabled, so the thread is skipped.
+    """
+    session = _session
+    if session is None:
+        yield
+        return
+    if sys.getprofile() is not None:
+        yield  # this thread is already being profiled
+        return
+    profiler = cProfile.Profile()
+    try:
+        profiler.enable()
+    except ValueError as e:  # "Another profiling tool is already active"
+        log_event('profile.thread_skipped', level=logging.DEBUG,
+                  thread=threading.current_thread().name, reason=str(e))
+        yield
+        return
+    try:
+        yield
+    finally:
+        profiler.disable()
+        session.add(profiler)
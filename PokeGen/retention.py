@@ -0,0 +1,243 @@
+#!/usr/bin/env python3
+"""
+Sprite Retention for PokeGen
+Keeps generated_sprites/ under a byte budget and maximum age by evicting the
+least recently used sprites that no mod was built from
+"""
+
+import argparse
+import json
+import logging
+import re
+import sys
+import threading
+import time
+from collections import deque
+from pathlib import Path
+from typing import Any, Dict, Optional
+
+from metrics import REGISTRY, configure_logging, log_event
+from mod_registry import ModRegistry
+from sprite_store import SpriteStore
+
+
+MB = 1024 * 1024
+DAY = 24 * 3600
+
+SPRITES_EVICTED = REGISTRY.counter('pokegen_sprites_evicted_total', 'Generated sprites removed by retention')
+BYTES_RECLAIMED = REGISTRY.counter('pokegen_sprite_bytes_reclaimed_total', 'Bytes freed by sprite retention')
+
+
+class RetentionManager:
+    """
+    Evict generated sprites once they exceed a byte budget or maximum age
+
+    Works from the sprite store's in-memory index, which already lists sprites
+    from least to most recently used, so a pass only looks at the oldest
+    entries and never rescans the directory. A sprite is kept as long as any
+    mod's pokemon.cfg names it as its source_sprite; the mod registry records
+    those, so the mods are not rescanned either. Off unless a budget or
+    maximum age is set.
+    """
+
+    def __init__(
+        self,
+        store: SpriteStore,
+        mods_dir: Path,
+        budget_bytes: int = 0,
+        max_age: float = 0,
+        interval: float = 60,
+        batch: int = 100,
+        grace: float = 600
+    ):
+        """
+        Initialize retention manager
+
+        Args:
+            store: Sprite store to keep in check
+            mods_dir: Mods directory, for checking pins and its mod registry
+            budget_bytes: Evict until the store is at most this size (0 = no limit)
+            max_age: Evict sprites unused for this many seconds (0 = keep forever)
+            interval: Seconds between background passes
+            batch: Most sprites evicted per pass, so one pass never stalls the disk
+            grace: Never evict sprites used more recently than this (seconds)
+        """
+        self.store = store
+        self.mods_dir = Path(mods_dir)
+        self.registry = ModRegistry(self.mods_dir)
+        self.budget_bytes = budget_bytes
+        self.max_age = max_age
+        self.interval = interval
+        self.batch = batch
+        self.grace = grace
+        self.report_path = store.save_dir / "retention.json"
+
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+        self._totals = {'passes': 0, 'evicted': 0, 'reclaimed_bytes': 0}
+        self._recent: deque = deque(maxlen=50)
+        self._last_pass: Optional[Dict[str, Any]] = None
+
+    def start(self):
+        """Run passes on a background thread until stop(); does nothing without a limit"""
+        if not (self.budget_bytes or self.max_age):
+            return
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._loop, name='sprite-retention', daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        """Stop the background thread"""
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def run_pass(self, dry_run: bool = False) -> Dict[str, Any]:
+        """
+        Evict up to `batch` sprites that are over budget or too old
+
+        Args:
+            dry_run: Report what would be evicted without deleting anything
+
+        Returns:
+            dict with evicted names, reclaimed bytes and whether more work remains
+        """
+        with self._lock:
+            started = time.monotonic()
+            self.store.flush_touches()
+            now = time.time()
+            total = self.store.total_bytes()
+            evicted, reclaimed, kept = [], 0, 0
+            referenced = None  # from the mod registry, once a pass finds a candidate
+
+            for entry in self.store.least_recently_used():
+                over_budget = self.budget_bytes and total > self.budget_bytes
+                expired = self.max_age and now - entry['used'] > self.max_age
+                if not (over_budget or expired) or now - entry['used'] < self.grace:
+                    break
+                if len(evicted) >= self.batch:
+                    break
+                if referenced is None:
+                    referenced = self.registry.sprite_references()
+                if entry['name'] in referenced or self._is_pinned(entry, dry_run):
+                    kept += 1
+                    continue
+
+                size = sum(entry['bytes'].values()) + entry.get('thumb_bytes', 0)
+                freed = size if dry_run else self.store.delete(entry['name'])
+                evicted.append(entry['name'])
+                reclaimed += freed
+                total -= size
+
+            result = {
+                'evicted': evicted,
+                'reclaimed_bytes': reclaimed,
+                'kept_pinned': kept,
+                'more': len(evicted) >= self.batch,
+                'total_bytes': total,
+                'duration': time.monotonic() - started,
+            }
+            if not dry_run:
+                self._record(result)
+            return result
+
+    def report(self) -> Dict[str, Any]:
+        """Lifetime totals, the last pass and recently evicted sprites"""
+        with self._lock:
+            return {
+                **self._totals,
+                'budget_bytes': self.budget_bytes,
+                'max_age': self.max_age,
+                'total_bytes': self.store.total_bytes(),
+                'last_pass': self._last_pass,
+                'recently_evicted': list(self._recent),
+            }
+
+    def _is_pinned(self, entry: Dict[str, Any], dry_run: bool) -> bool:
+        """True if a mod still uses this sprite; drops pins whose mod has moved on"""
+        pinned = False
+        reference = re.compile(rf"^source_sprite = {re.escape(entry['name'])}_\d+\.png$", re.M)
+        for mod in list(entry['pins']):
+            try:
+                uses = reference.search((self.mods_dir / mod / "pokemon.cfg").read_text()) is not None
+            except OSError:
+                uses = False
+            if uses:
+                pinned = True
+            elif not dry_run:
+                self.store.unpin(entry['name'], mod)
+        return pinned
+
+    def _record(self, result: Dict[str, Any]):
+        """Add a pass to the totals and publish the report; caller holds the lock"""
+        self._totals['passes'] += 1
+        self._totals['evicted'] += len(result['evicted'])
+        self._totals['reclaimed_bytes'] += result['reclaimed_bytes']
+        self._recent.extend(result['evicted'])
+        SPRITES_EVICTED.inc(len(result['evicted']))
+        BYTES_RECLAIMED.inc(result['reclaimed_bytes'])
+        self._last_pass = {'time': time.time(), **{k: v for k, v in result.items() if k != 'evicted'},
+                           'evicted': len(result['evicted'])}
+
+        if result['evicted']:
+            log_event('retention.reclaimed', evicted=len(result['evicted']),
+                      reclaimed_bytes=result['reclaimed_bytes'], total_bytes=result['total_bytes'],
+                      duration_ms=round(result['duration'] * 1000, 2))
+        if result['evicted'] or self._totals['passes'] == 1:
+            # Shared with other processes (e.g. serve.py web workers) through a file
+            partial = self.report_path.with_suffix('.json.part')
+            try:
+                partial.write_text(json.dumps({
+                    **self._totals,
+                    'budget_bytes': self.budget_bytes,
+                    'max_age': self.max_age,
+                    'last_pass': self._last_pass,
+                    'recently_evicted': list(self._recent),
+                }))
+                partial.replace(self.report_path)
+            except OSError as e:
+                log_event('retention.report_failed', level=logging.WARNING, error=e)
+
+    def _loop(self):
+        delay = 0.0
+        while not self._stop.wait(delay):
+            try:
+                result = self.run_pass()
+            except Exception as e:
+                log_event('retention.failed', level=logging.ERROR, exc_info=True, error=e)
+                result = {'more': False}
+            # Keep going straight away while a backlog remains
+            delay = 0.0 if result['more'] else self.interval
+
+
+def main():
+    """Command-line interface"""
+    parser = argparse.ArgumentParser(description='Evict old generated sprites to stay within a disk budget')
+    parser.add_argument('--dir', type=Path, default=Path(__file__).parent / "generated_sprites",
+                        help='Generated sprites directory (default: generated_sprites/)')
+    parser.add_argument('--mods', type=Path, default=Path(__file__).parent.parent / "mods",
+                        help='Mods directory whose sprites are kept (default: ../mods)')
+    parser.add_argument('--budget-mb', type=float, default=0, help='Byte budget in MB; 0 for none (default: 0)')
+    parser.add_argument('--max-age-days', type=float, default=0, help='Evict sprites unused for this long; 0 for never (default: 0)')
+    parser.add_argument('--dry-run', action='store_true', help='Only report what would be evicted')
+
+    args = parser.parse_args()
+    if not (args.budget_mb or args.max_age_days):
+        parser.error("nothing to evict without --budget-mb or --max-age-days")
+    configure_logging()
+
+    store = SpriteStore(args.dir)
+    manager = RetentionManager(store, args.mods, budget_bytes=int(args.budget_mb * MB),
+                               max_age=args.max_age_days * DAY, batch=sys.maxsize, grace=0)
+    print(f"Sprites on disk: {store.total_bytes() / MB:.1f} MB")
+    result = manager.run_pass(dry_run=args.dry_run)
+    verb = "Would evict" if args.dry_run else "Evicted"
+    print(f"{verb} {len(result['evicted'])} sprites ({result['reclaimed_bytes'] / MB:.1f} MB); "
+          f"kept {result['kept_pinned']} used by mods")
+    print(f"Sprites on disk after: {result['total_bytes'] / MB:.1f} MB")
+
+
+if __name__ == '__main__':
+    main()
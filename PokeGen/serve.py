@@ -0,0 +1,186 @@
+#!/usr/bin/env python3
+"""
+PokeGen Production Server
+Runs the web app in several pre-forked worker processes. Sprite generation is
+sent over local IPC to one shared model process, so the model loads only once.
+"""
+
+import argparse
+import logging
+import multiprocessing
+import os
+import signal
+import socket
+import sys
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+from werkzeug.serving import make_server
+
+import app as webapp
+from job_queue import serve_job_queue, connect_job_queue, connect_metrics
+from metrics import REGISTRY, configure_logging, log_event
+
+# How often web workers report their metrics to the model process
+METRICS_PUSH_INTERVAL = 5
+
+
+def run_model_process(address: str, authkey: bytes, ready):
+    """Own the sprite model and job queue; serve them to the web workers"""
+    signal.signal(signal.SIGINT, signal.SIG_IGN)  # the supervisor decides when to stop
+
+    queue = webapp.get_job_queue()
+    server = serve_job_queue(queue, address, authkey, metrics=REGISTRY)
+    webapp.retention.start()
+    signal.signal(signal.SIGTERM, lambda *_: server.stop_event.set())
+    ready.set()
+
+    try:
+        server.serve_forever()
+    finally:
+        # Cancel waiting jobs, let the running one finish and flush sprite writes
+        queue.shutdown(wait=True)
+        webapp.retention.stop()
+        webapp.sprite_store.close()
+
+
+def run_worker(listen_fd: int, host: str, port: int, address: str, authkey: bytes):
+    """Serve HTTP on the shared listening socket until told to stop"""
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+
+    webapp.use_job_queue(connect_job_queue(address, authkey))
+    hub = connect_metrics(address, authkey)
+    webapp.use_metrics_hub(hub)
+    server = make_server(host, port, webapp.app, threaded=True, fd=listen_fd)
+    # Join request threads on close so in-flight requests finish during shutdown
+    server.daemon_threads = False
+
+    stopping = threading.Event()
+
+    def push_metrics():
+        try:
+            hub.merge(REGISTRY.take())
+        except (OSError, EOFError) as e:
+            log_event('server.metrics_push_failed', level=logging.WARNING, error=e)
+
+    def push_loop():
+        while not stopping.wait(METRICS_PUSH_INTERVAL):
+            push_metrics()
+
+    threading.Thread(target=push_loop, name='metrics-push', daemon=True).start()
+
+    signal.signal(signal.SIGTERM, lambda *_: threading.Thread(target=server.shutdown).start())
+    try:
+        server.serve_forever()
+        server.server_close()
+    finally:
+        # Process exits skip atexit, so flush the access times this worker buffered
+        # (retention's LRU order depends on them) before leaving
+        webapp.sprite_store.close()
+        stopping.set()
+        push_metrics()
+
+
+class Supervisor:
+    """Start the model process and web workers, restart crashed workers, stop cleanly"""
+
+    def __init__(self, host: str, port: int, workers: int, shutdown_timeout: float):
+        self.host = host
+        self.port = port
+        self.workers = workers
+        self.shutdown_timeout = shutdown_timeout
+        self.context = multiprocessing.get_context('fork')
+        self.stopping = threading.Event()
+
+    def run(self):
+        listener = socket.create_server((self.host, self.port), backlog=128)
+        listener.set_inheritable(True)
+
+        ipc_dir = tempfile.mkdtemp(prefix='pokegen-')
+        address = str(Path(ipc_dir) / 'model.sock')
+        authkey = os.urandom(32)
+
+        ready = self.context.Event()
+        model = self.context.Process(
+            target=run_model_process, args=(address, authkey, ready), name='pokegen-model'
+        )
+        model.start()
+        if not ready.wait(30):
+            model.terminate()
+            raise RuntimeError("Model process did not start")
+
+        def spawn(index):
+            worker = self.context.Process(
+                target=run_worker,
+                args=(listener.fileno(), self.host, self.port, address, authkey),
+                name=f'pokegen-worker-{index}'
+            )
+            worker.start()
+            return worker
+
+        workers = [spawn(i) for i in range(self.workers)]
+        print(f"✓ Serving on http://{self.host}:{self.port} with {self.workers} workers "
+              f"(model process pid {model.pid})")
+
+        signal.signal(signal.SIGTERM, lambda *_: self.stopping.set())
+        signal.signal(signal.SIGINT, lambda *_: self.stopping.set())
+
+        try:
+            while not self.stopping.wait(1):
+                if not model.is_alive():
+                    log_event('server.model_exited', level=logging.ERROR, exitcode=model.exitcode)
+                    break
+                for index, worker in enumerate(workers):
+                    if not worker.is_alive():
+                        log_event('server.worker_restarted', level=logging.WARNING,
+                                  pid=worker.pid, exitcode=worker.exitcode)
+                        workers[index] = spawn(index)
+        finally:
+            print("Shutting down...")
+            self._stop(workers)
+            self._stop([model])
+            listener.close()
+            Path(address).unlink(missing_ok=True)
+            os.rmdir(ipc_dir)
+            print("✓ Stopped")
+
+    def _stop(self, processes):
+        """SIGTERM, wait up to the shutdown timeout, then kill stragglers"""
+        for process in processes:
+            if process.is_alive():
+                process.terminate()
+        deadline = time.monotonic() + self.shutdown_timeout
+        for process in processes:
+            process.join(max(0.0, deadline - time.monotonic()))
+            if process.is_alive():
+                log_event('server.kill', level=logging.WARNING, process=process.name)
+                process.kill()
+                process.join()
+
+
+def main():
+    """Command-line interface"""
+    parser = argparse.ArgumentParser(description='Run PokeGen with multiple web workers and one shared model process')
+    parser.add_argument('--host', default='127.0.0.1', help='Address to bind (default: 127.0.0.1)')
+    parser.add_argument('--port', type=int, default=5000, help='Port to bind (default: 5000)')
+    parser.add_argument('--workers', type=int, default=min(4, os.cpu_count() or 1),
+                        help='Web worker processes (default: CPU count, at most 4)')
+    parser.add_argument('--shutdown-timeout', type=float, default=30.0,
+                        help='Seconds to let in-flight requests finish on shutdown (default: 30)')
+
+    args = parser.parse_args()
+    configure_logging()
+
+    if 'fork' not in multiprocessing.get_all_start_methods():
+        print("✗ serve.py needs a platform with fork(); use app.py instead")
+        sys.exit(1)
+    if args.workers < 1:
+        parser.error('--workers must be at least 1')
+
+    Supervisor(args.host, args.port, args.workers, args.shutdown_timeout).run()
+
+
+if __name__ == '__main__':
+    main()
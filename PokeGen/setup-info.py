@@ -107,7 +107,7 @@ def main():
     print(f"   Then open: http://localhost:5000")
     
     print("\n3️⃣  OR Use Command Line")
-    print(f"   ./create-pokemon.sh MyPokemon 888 FIRE")
+    print(f"   ./create-pokemon.sh MyPokemon 901 FIRE")
     
     print("\n4️⃣  Generate Sprite (Optional)")
     print(f"   python3 sprite_generator.py MyMon 'red fire dragon'")
@@ -0,0 +1,241 @@
+#!/usr/bin/env python3
+"""
+Species Similarity Index for PokeGen
+Perceptual hashes of every shipped front sprite in a BK-tree, for suggesting
+which species a generated sprite should use as its template
+"""
+
+import argparse
+import json
+import threading
+import time
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple, Union
+from PIL import Image
+
+from metrics import configure_logging, log_event, phase
+
+
+HASH_VERSION = 1
+HASH_BITS = 128
+
+
+def perceptual_hash(image: Image.Image) -> int:
+    """
+    128-bit perceptual hash of a sprite
+
+    The first (square) frame is flattened onto white. The high 64 bits are a
+    difference hash of its brightness (interior detail). The low 64 bits are an
+    8x8 silhouette (overall shape), so species with similar outlines land close
+    together even when their colors differ.
+    """
+    width, height = image.size
+    if height > width:
+        image = image.crop((0, 0, width, width))  # animated fronts are vertical frame strips
+
+    background = Image.new('RGBA', image.size, (255, 255, 255, 255))
+    gray = Image.alpha_composite(background, image.convert('RGBA')).convert('L')
+
+    # Difference hash: is each pixel brighter than its right neighbour?
+    pixels = gray.resize((9, 8), resample=Image.BILINEAR).tobytes()  # one byte per 'L' pixel
+    detail = 0
+    for row in range(8):
+        for col in range(8):
+            detail = (detail << 1) | (pixels[row * 9 + col] > pixels[row * 9 + col + 1])
+
+    # Silhouette: which cells are mostly non-background?
+    shape = 0
+    for value in gray.point(lambda v: 255 if v < 240 else 0).resize((8, 8), resample=Image.BOX).tobytes():
+        shape = (shape << 1) | (value >= 64)
+
+    return (detail << 64) | shape
+
+
+try:
+    _popcount = int.bit_count  # Python 3.10+
+except AttributeError:
+    def _popcount(value: int) -> int:
+        return bin(value).count('1')
+
+
+def hamming(a: int, b: int) -> int:
+    """Number of differing bits"""
+    return _popcount(a ^ b)
+
+
+class BKTree:
+    """Burkhard-Keller tree over Hamming distance"""
+
+    def __init__(self):
+        # Node: [hash, names, {distance: child}]
+        self.root: Optional[list] = None
+        self.size = 0
+
+    def add(self, value: int, name: str):
+        """Insert one hash (identical hashes share a node)"""
+        self.size += 1
+        if self.root is None:
+            self.root = [value, [name], {}]
+            return
+        node = self.root
+        while True:
+            distance = hamming(value, node[0])
+            if distance == 0:
+                node[1].append(name)
+                return
+            child = node[2].get(distance)
+            if child is None:
+                node[2][distance] = [value, [name], {}]
+                return
+            node = child
+
+    def nearest(self, value: int, k: int = 1) -> List[Tuple[int, str]]:
+        """
+        The k closest entries
+
+        Returns:
+            (distance, name) pairs, closest first
+        """
+        if self.root is None or k < 1:
+            return []
+        popcount = _popcount
+        best: List[Tuple[int, str]] = []
+        worst = HASH_BITS + 1  # distance of the k-th best so far
+        stack = [self.root]
+        while stack:
+            node = stack.pop()
+            distance = popcount(value ^ node[0])
+            if distance < worst:
+                best.extend((distance, name) for name in node[1])
+                best.sort()
+                if len(best) >= k:
+                    del best[k:]
+                    worst = best[-1][0]
+            # Triangle inequality: only children within `worst` of our distance can do better
+            low, high = distance - worst, distance + worst
+            stack.extend(child for edge, child in node[2].items() if low < edge < high)
+        return best
+
+
+class SpeciesIndex:
+    """
+    Nearest shipped species for a sprite
+
+    Hashes are cached in a JSON file keyed by each front.png's size and
+    mtime, so only new or changed sprites are hashed when the index loads.
+    """
+
+    def __init__(self, species_dir: Path, cache_path: Path):
+        """
+        Initialize species index
+
+        Args:
+            species_dir: Directory with one <species>/front.png per species
+            cache_path: JSON file for cached hashes
+        """
+        self.species_dir = Path(species_dir)
+        self.cache_path = Path(cache_path)
+        self._tree: Optional[BKTree] = None
+        self._lock = threading.Lock()
+
+    def tree(self) -> BKTree:
+        """The BK-tree, built on first use"""
+        if self._tree is None:
+            with self._lock:
+                if self._tree is None:
+                    self._tree = self._build()
+        return self._tree
+
+    def nearest(self, sprite: Union[Image.Image, int], k: int = 3) -> List[Dict[str, object]]:
+        """
+        Species that look most like a sprite
+
+        Args:
+            sprite: PIL image or a perceptual_hash() value
+            k: Number of suggestions
+
+        Returns:
+            [{'species', 'distance', 'similarity'}], closest first; similarity
+            is 1.0 for identical hashes
+        """
+        value = sprite if isinstance(sprite, int) else perceptual_hash(sprite)
+        return [
+            {'species': name, 'distance': distance, 'similarity': round(1 - distance / HASH_BITS, 3)}
+            for distance, name in self.tree().nearest(value, k)
+        ]
+
+    def _build(self) -> BKTree:
+        with phase('species_index_build'):
+            try:
+                cache = json.loads(self.cache_path.read_text())
+                if cache.get('version') != HASH_VERSION:
+                    cache = {}
+            except (OSError, ValueError):
+                cache = {}
+            cached = cache.get('species', {})
+
+            species = {}
+            hashed = 0
+            for front in sorted(self.species_dir.glob('*/front.png')):
+                name = front.parent.name
+                stat = front.stat()
+                entry = cached.get(name)
+                if entry is None or entry['mtime'] != stat.st_mtime_ns or entry['size'] != stat.st_size:
+                    try:
+                        with Image.open(front) as image:
+                            value = perceptual_hash(image)
+                    except OSError as e:
+                        log_event('species_index.unreadable', file=front, error=e)
+                        continue
+                    entry = {'mtime': stat.st_mtime_ns, 'size': stat.st_size, 'hash': f"{value:032x}"}
+                    hashed += 1
+                species[name] = entry
+
+            if hashed or len(species) != len(cached):
+                try:
+                    self.cache_path.parent.mkdir(parents=True, exist_ok=True)
+                    partial = self.cache_path.with_suffix('.part')
+                    partial.write_text(json.dumps({'version': HASH_VERSION, 'species': species}))
+                    partial.replace(self.cache_path)
+                except OSError as e:
+                    log_event('species_index.cache_failed', error=e)
+
+            tree = BKTree()
+            for name, entry in species.items():
+                tree.add(int(entry['hash'], 16), name)
+            log_event('species_index.loaded', species=tree.size, hashed=hashed)
+            return tree
+
+
+def main():
+    """Command-line interface"""
+    parser = argparse.ArgumentParser(description='Find the shipped species a sprite looks most like')
+    parser.add_argument('sprite', type=Path, help='Sprite image (e.g. generated_sprites/abc123_96.png)')
+    parser.add_argument('-k', type=int, default=5, help='Number of suggestions (default: 5)')
+    parser.add_argument('--species', type=Path, default=Path(__file__).parent.parent / "pokemon" / "pokemon",
+                        help='Species directory (default: ../pokemon/pokemon)')
+    parser.add_argument('--cache', type=Path, default=Path(__file__).parent / "species_hashes.json",
+                        help='Hash cache file (default: species_hashes.json)')
+
+    args = parser.parse_args()
+    configure_logging()
+
+    index = SpeciesIndex(args.species, args.cache)
+    started = time.perf_counter()
+    index.tree()
+    built = time.perf_counter() - started
+
+    with Image.open(args.sprite) as image:
+        value = perceptual_hash(image)
+    started = time.perf_counter()
+    suggestions = index.nearest(value, args.k)
+    lookup = time.perf_counter() - started
+
+    print(f"Index of {index.tree().size} species loaded in {built * 1000:.1f} ms; lookup took {lookup * 1000:.3f} ms")
+    for suggestion in suggestions:
+        print(f"  {suggestion['species']:<16} distance {suggestion['distance']:>3}  "
+              f"similarity {suggestion['similarity']:.3f}")
+
+
+if __name__ == '__main__':
+    main()
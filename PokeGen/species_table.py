@@ -0,0 +1,463 @@
+#!/usr/bin/env python3
+"""
+Species Table for PokeGen
+Compiles the flat species data files into one memory-mapped binary table with
+constant-time lookups by dex number, species name and move name
+"""
+
+import argparse
+import json
+import mmap
+import os
+import re
+import struct
+import sys
+import threading
+import time
+import unicodedata
+import zlib
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+from metrics import configure_logging, log_event, phase
+
+
+MAGIC = b'PGST'
+VERSION = 1
+
+SOURCES = {
+    'names': "pokemon_to_index.txt",
+    'weights': "pokemon_weights_kg.txt",
+    'categories': "spec_phys_lookup.txt",
+    'overworld': "pokemon_overworld_adjustments.asm",
+}
+
+# magic, version, species count, species offset, species slots, species hash offset,
+# move count, move offset, move slots, move hash offset, strings offset, report offset, report length
+HEADER = struct.Struct('<4sI11I')
+# name offset, name length, weight rows, weight (kg), overworld index, flags, padding
+SPECIES = struct.Struct('<IHHfhBx')
+# name offset, name length, category, padding
+MOVE = struct.Struct('<IHBx')
+SLOT = struct.Struct('<I')
+
+PRESENT, HAS_OVERWORLD, OVERWORLD_FOUND, OVERWORLD_FLIP = 1, 2, 4, 8
+CATEGORIES = ('STATUS', 'PHYSICAL', 'SPECIAL')
+
+OVERWORLD_LABEL = re.compile(r'^(\S+):\s*$')
+OVERWORLD_FIELD = re.compile(r'^\s*db\s+(\w+)\s*,\s*(\w+)\s*$')
+
+
+def name_key(name: str) -> str:
+    """Lookup key for a name: case, accents and punctuation ignored (Farfetch’d -> farfetchd)"""
+    ascii_name = unicodedata.normalize('NFKD', name).encode('ascii', 'ignore').decode()
+    return re.sub(r'[^a-z0-9]', '', ascii_name.lower())
+
+
+def _slot(key: str, slots: int) -> int:
+    return zlib.crc32(key.encode()) & (slots - 1)
+
+
+def _slot_count(entries: int) -> int:
+    """Power of two at least twice the entries, so probe runs stay short"""
+    slots = 8
+    while slots < entries * 2:
+        slots *= 2
+    return slots
+
+
+def source_signature(data_dir: Path) -> Dict[str, List[int]]:
+    """Size and mtime of each source file; a table is stale when this changes"""
+    signature = {}
+    for source, filename in SOURCES.items():
+        stat = (Path(data_dir) / filename).stat()
+        signature[source] = [stat.st_size, stat.st_mtime_ns]
+    return signature
+
+
+@dataclass(frozen=True)
+class SpeciesRecord:
+    """Merged data for one species"""
+    dex: int
+    name: str
+    weight_kg: Optional[float]
+    weight_rows: int  # rows for this dex in pokemon_weights_kg.txt (more than 1 for alternate forms)
+    overworld_index: Optional[int]
+    overworld_found: bool
+    overworld_flip: bool
+
+
+def compile_table(data_dir: Path, output: Path) -> Dict[str, Any]:
+    """
+    Validate the source files and write the binary table
+
+    Malformed lines are skipped and every problem is reported; the first
+    value wins when a key appears more than once.
+
+    Args:
+        data_dir: The game's pokemon/ directory
+        output: Table file to write (replaced atomically)
+
+    Returns:
+        Report: counts per source and a list of problems
+    """
+    data_dir = Path(data_dir)
+    with phase('species_table_compile'):
+        signature = source_signature(data_dir)
+        problems: List[Dict[str, Any]] = []
+
+        def problem(kind: str, source: str, line: int, message: str, **fields):
+            problems.append({'kind': kind, 'file': SOURCES[source], 'line': line, 'message': message, **fields})
+
+        # Species names: line number is the dex number (the file is Windows-1252)
+        names: Dict[int, str] = {}
+        dex_by_key: Dict[str, int] = {}
+        text = (data_dir / SOURCES['names']).read_bytes().decode('cp1252')
+        for dex, line in enumerate(text.splitlines(), start=1):
+            name = line.strip()
+            if not name:
+                problem('blank', 'names', dex, 'blank species name')
+                continue
+            key = name_key(name)
+            if key in dex_by_key:
+                problem('duplicate_name', 'names', dex, f"{name} is already dex {dex_by_key[key]}",
+                        name=name, dex=dex_by_key[key])
+                continue
+            names[dex] = name
+            dex_by_key[key] = dex
+
+        # Weights: "<dex>\t<kg>"; alternate forms repeat the dex number
+        weights: Dict[int, Tuple[float, int]] = {}
+        duplicates: Dict[int, List[float]] = {}
+        for number, line in enumerate((data_dir / SOURCES['weights']).read_text().splitlines(), start=1):
+            if not line.strip():
+                continue
+            try:
+                dex_text, weight_text = line.split()
+                dex, weight = int(dex_text), float(weight_text)
+            except ValueError:
+                problem('malformed', 'weights', number, f"expected '<dex> <kg>', got {line.strip()!r}")
+                continue
+            if dex not in names:
+                problem('unknown_dex', 'weights', number, f"no species with dex {dex}", dex=dex)
+                continue
+            if dex in weights:
+                first, rows = weights[dex]
+                weights[dex] = (first, rows + 1)
+                duplicates.setdefault(dex, [first]).append(weight)
+                continue
+            weights[dex] = (weight, 1)
+        for dex, values in duplicates.items():
+            problem('duplicate_weight', 'weights', 0, f"{names[dex]} (dex {dex}) has {len(values)} weights; "
+                    f"using the first ({values[0]} kg)", dex=dex, weights=values)
+
+        # Move categories: "<MOVE>,<PHYSICAL|SPECIAL|STATUS>"
+        moves: Dict[str, Tuple[str, int]] = {}
+        for number, line in enumerate((data_dir / SOURCES['categories']).read_text().splitlines(), start=1):
+            if not line.strip():
+                continue
+            move, _, category = (part.strip() for part in line.partition(','))
+            if not move or category.upper() not in CATEGORIES:
+                problem('malformed', 'categories', number, f"expected '<MOVE>,<category>', got {line.strip()!r}")
+                continue
+            key = name_key(move)
+            if key in moves:
+                if moves[key][1] != CATEGORIES.index(category.upper()):
+                    problem('conflicting_category', 'categories', number,
+                            f"{move} is listed as both {CATEGORIES[moves[key][1]]} and {category.upper()}", move=move)
+                continue
+            moves[key] = (move, CATEGORIES.index(category.upper()))
+
+        # Overworld sprites: "<Name>:" followed by db i / found / flip
+        overworld: Dict[int, Dict[str, Any]] = {}
+        current: Optional[Dict[str, Any]] = None
+        label_line = 0
+        lines = (data_dir / SOURCES['overworld']).read_text().splitlines() + ['']
+        for number, line in enumerate(lines, start=1):
+            label = OVERWORLD_LABEL.match(line)
+            field = OVERWORLD_FIELD.match(line)
+            if current is not None and (label or not line.strip()):
+                # End of a block
+                missing = {'i', 'found', 'flip'} - set(current)
+                dex = dex_by_key.get(name_key(current['name']))
+                if missing:
+                    problem('malformed', 'overworld', label_line, f"{current['name']} is missing {sorted(missing)}")
+                elif dex is None:
+                    problem('unknown_species', 'overworld', label_line, f"no species named {current['name']}",
+                            name=current['name'])
+                elif dex in overworld:
+                    problem('duplicate_overworld', 'overworld', label_line,
+                            f"{current['name']} already defined", name=current['name'])
+                else:
+                    overworld[dex] = current
+                current = None
+            if label:
+                current, label_line = {'name': label.group(1)}, number
+            elif field and current is not None:
+                key, value = field.groups()
+                if key == 'i' and value.isdigit():
+                    current['i'] = int(value)
+                elif key in ('found', 'flip') and value in ('true', 'false'):
+                    current[key] = value == 'true'
+                else:
+                    problem('malformed', 'overworld', number, f"unexpected {line.strip()!r}")
+            elif line.strip() and not label:
+                problem('malformed', 'overworld', number, f"unexpected {line.strip()!r}")
+
+        # Encode
+        strings = bytearray()
+
+        def string(value: str) -> Tuple[int, int]:
+            encoded = value.encode('utf-8')
+            offset = len(strings)
+            strings.extend(encoded)
+            return offset, len(encoded)
+
+        species_count = max(names, default=0) + 1
+        species = bytearray(SPECIES.size * species_count)
+        for dex, name in names.items():
+            offset, length = string(name)
+            weight, rows = weights.get(dex, (float('nan'), 0))
+            flags, index = PRESENT, -1
+            sprite = overworld.get(dex)
+            if sprite is not None:
+                flags |= HAS_OVERWORLD | (OVERWORLD_FOUND if sprite['found'] else 0) | (OVERWORLD_FLIP if sprite['flip'] else 0)
+                index = sprite['i']
+            SPECIES.pack_into(species, dex * SPECIES.size, offset, length, rows, weight, index, flags)
+
+        species_slots = _slot_count(len(names))
+        species_hash = _hash_table(species_slots, ((key, dex) for key, dex in dex_by_key.items()))
+
+        move_list = sorted(moves.values())
+        move_records = bytearray()
+        for move, category in move_list:
+            offset, length = string(move)
+            move_records += MOVE.pack(offset, length, category)
+        move_slots = _slot_count(len(move_list))
+        move_hash = _hash_table(move_slots, ((name_key(move), i + 1) for i, (move, _) in enumerate(move_list)))
+
+        report = {
+            'sources': signature,
+            'data_dir': str(data_dir.resolve()),
+            'counts': {'species': len(names), 'weights': len(weights), 'moves': len(move_list),
+                       'overworld': len(overworld)},
+            'problems': problems,
+        }
+        report_bytes = json.dumps(report).encode()
+
+        species_offset = HEADER.size
+        species_hash_offset = species_offset + len(species)
+        move_offset = species_hash_offset + len(species_hash)
+        move_hash_offset = move_offset + len(move_records)
+        strings_offset = move_hash_offset + len(move_hash)
+        report_offset = strings_offset + len(strings)
+        header = HEADER.pack(MAGIC, VERSION, species_count, species_offset, species_slots, species_hash_offset,
+                             len(move_list), move_offset, move_slots, move_hash_offset, strings_offset,
+                             report_offset, len(report_bytes))
+
+        output = Path(output)
+        output.parent.mkdir(parents=True, exist_ok=True)
+        partial = output.with_name(f"{output.name}.{os.getpid()}.part")
+        with partial.open('wb') as out:
+            for section in (header, species, species_hash, move_records, move_hash, strings, report_bytes):
+                out.write(section)
+        partial.replace(output)
+
+    log_event('species_table.compiled', path=output, problems=len(problems), **report['counts'])
+    return report
+
+
+def _hash_table(slots: int, entries) -> bytearray:
+    """Open-addressing table of 1-based values (0 = empty), linear probing"""
+    table = bytearray(SLOT.size * slots)
+    for key, value in entries:
+        slot = _slot(key, slots)
+        while SLOT.unpack_from(table, slot * SLOT.size)[0]:
+            slot = (slot + 1) & (slots - 1)
+        SLOT.pack_into(table, slot * SLOT.size, value)
+    return table
+
+
+class SpeciesTable:
+    """
+    Read-only view of a compiled table
+
+    The file is memory-mapped, so opening it reads nothing but the header and
+    every lookup touches a few bytes; processes share the pages.
+    """
+
+    def __init__(self, path: Path):
+        """
+        Open a compiled table
+
+        Raises:
+            ValueError: If the file is not a table of this version
+        """
+        self.path = Path(path)
+        with self.path.open('rb') as f:
+            self._map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        if len(self._map) < HEADER.size:
+            raise ValueError(f"{self.path} is not a species table")
+        (magic, version, self.species_count, self._species_offset, self._species_slots, self._species_hash,
+         self.move_count, self._move_offset, self._move_slots, self._move_hash, self._strings,
+         report_offset, report_length) = HEADER.unpack_from(self._map)
+        if magic != MAGIC or version != VERSION:
+            raise ValueError(f"{self.path} is not a version {VERSION} species table")
+        self.report: Dict[str, Any] = json.loads(self._map[report_offset:report_offset + report_length])
+
+    def by_dex(self, dex: int) -> Optional[SpeciesRecord]:
+        """Species with this dex number, or None"""
+        if not 0 < dex < self.species_count:
+            return None
+        name_offset, length, rows, weight, index, flags = SPECIES.unpack_from(
+            self._map, self._species_offset + dex * SPECIES.size)
+        if not flags & PRESENT:
+            return None
+        return SpeciesRecord(
+            dex=dex,
+            name=self._string(name_offset, length),
+            weight_kg=None if weight != weight else round(weight, 4),  # NaN: no weight row
+            weight_rows=rows,
+            overworld_index=index if flags & HAS_OVERWORLD else None,
+            overworld_found=bool(flags & OVERWORLD_FOUND),
+            overworld_flip=bool(flags & OVERWORLD_FLIP),
+        )
+
+    def by_name(self, name: str) -> Optional[SpeciesRecord]:
+        """Species with this name (any case, accents or punctuation), or None"""
+        key = name_key(name)
+        slots, table = self._species_slots, self._species_hash
+        slot = _slot(key, slots)
+        while True:
+            dex = SLOT.unpack_from(self._map, table + slot * SLOT.size)[0]
+            if not dex:
+                return None
+            name_offset, length = SPECIES.unpack_from(self._map, self._species_offset + dex * SPECIES.size)[:2]
+            if name_key(self._string(name_offset, length)) == key:
+                return self.by_dex(dex)
+            slot = (slot + 1) & (slots - 1)
+
+    def move_category(self, move: str) -> Optional[str]:
+        """PHYSICAL, SPECIAL or STATUS for a move, or None if it is not listed"""
+        key = name_key(move)
+        slots, table = self._move_slots, self._move_hash
+        slot = _slot(key, slots)
+        while True:
+            index = SLOT.unpack_from(self._map, table + slot * SLOT.size)[0]
+            if not index:
+                return None
+            name_offset, length, category = MOVE.unpack_from(self._map, self._move_offset + (index - 1) * MOVE.size)
+            if name_key(self._string(name_offset, length)) == key:
+                return CATEGORIES[category]
+            slot = (slot + 1) & (slots - 1)
+
+    def problems(self) -> List[Dict[str, Any]]:
+        """Problems found in the sources when the table was compiled"""
+        return self.report['problems']
+
+    def _string(self, offset: int, length: int) -> str:
+        start = self._strings + offset
+        return self._map[start:start + length].decode('utf-8')
+
+
+class SpeciesData:
+    """
+    A compiled table that keeps itself current
+
+    The table is rebuilt whenever a source file's size or mtime no longer
+    matches what it was compiled from (checked at most once per
+    check_interval seconds), so callers never parse the text files.
+    """
+
+    def __init__(self, data_dir: Path, table_path: Path, check_interval: float = 1.0):
+        """
+        Initialize species data
+
+        Args:
+            data_dir: The game's pokemon/ directory
+            table_path: Compiled table file (created on first use)
+            check_interval: Seconds between checks of the source files
+        """
+        self.data_dir = Path(data_dir)
+        self.table_path = Path(table_path)
+        self.check_interval = check_interval
+        self._resolved_dir = str(self.data_dir.resolve())
+        self._table: Optional[SpeciesTable] = None
+        self._checked = 0.0
+        self._lock = threading.Lock()
+
+    def table(self) -> SpeciesTable:
+        """The current table, recompiled first if a source changed"""
+        if self._table is not None and time.monotonic() - self._checked < self.check_interval:
+            return self._table
+        with self._lock:
+            if self._table is None or time.monotonic() - self._checked >= self.check_interval:
+                self._table = self._current()
+                self._checked = time.monotonic()
+            return self._table
+
+    def _current(self) -> SpeciesTable:
+        signature = source_signature(self.data_dir)
+        table = self._table
+        if table is None:
+            try:
+                table = SpeciesTable(self.table_path)
+            except (OSError, ValueError):
+                table = None
+        if (table is not None and table.report['sources'] == signature
+                and table.report['data_dir'] == self._resolved_dir):
+            return table
+        compile_table(self.data_dir, self.table_path)
+        return SpeciesTable(self.table_path)
+
+
+def main():
+    """Command-line interface"""
+    parser = argparse.ArgumentParser(description='Compile and query the binary species table')
+    parser.add_argument('lookup', nargs='*', help='Dex numbers, species names or move names to look up')
+    parser.add_argument('--data', type=Path, default=Path(__file__).parent.parent / "pokemon",
+                        help='Game data directory (default: ../pokemon)')
+    parser.add_argument('--table', type=Path, default=Path(__file__).parent / "species_table.bin",
+                        help='Table file (default: species_table.bin)')
+    parser.add_argument('--force', action='store_true', help='Recompile even if the sources are unchanged')
+    parser.add_argument('--problems', action='store_true', help='List every problem found in the sources')
+
+    args = parser.parse_args()
+    configure_logging()
+
+    if args.force:
+        compile_table(args.data, args.table)
+    table = SpeciesData(args.data, args.table).table()
+    counts = table.report['counts']
+    problems = table.problems()
+    print(f"{table.path}: {counts['species']} species, {counts['weights']} weights, "
+          f"{counts['moves']} moves, {counts['overworld']} overworld sprites; {len(problems)} problems")
+
+    by_kind: Dict[str, int] = {}
+    for item in problems:
+        by_kind[item['kind']] = by_kind.get(item['kind'], 0) + 1
+    for kind, count in sorted(by_kind.items()):
+        print(f"  {kind}: {count}")
+    if args.problems:
+        for item in problems:
+            location = f"{item['file']}:{item['line']}" if item['line'] else item['file']
+            print(f"  {location}: {item['message']}")
+
+    missing = False
+    for value in args.lookup:
+        record = table.by_dex(int(value)) if value.isdigit() else table.by_name(value)
+        if record is not None:
+            print(record)
+            continue
+        category = table.move_category(value)
+        if category is not None:
+            print(f"{value.upper()}: {category}")
+        else:
+            print(f"{value}: not found")
+            missing = True
+    sys.exit(1 if missing else 0)
+
+
+if __name__ == '__main__':
+    main()
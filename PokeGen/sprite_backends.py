@@ -0,0 +1,294 @@
+#!/usr/bin/env python3
+"""
+Sprite Backends for PokeGen
+Pluggable image sources used by SpriteGenerator: the real Stable Diffusion
+pipeline and a deterministic offline stand-in for tests and benchmarks
+"""
+
+import hashlib
+import importlib.util
+import random
+import time
+from typing import Callable, List, Optional
+from PIL import Image, ImageDraw
+from metrics import log_event
+
+
+DEFAULT_MODEL = "justinpinkney/pokemon-stable-diffusion"
+
+# Per-step progress hook: callback(step, total_steps, preview) where preview()
+# returns a small PIL image of the current state. Previews are only computed
+# when the callback asks for them, so a plain progress hook costs nothing.
+StepCallback = Callable[[int, int, Callable[[], Image.Image]], None]
+
+# Approximate linear projection of Stable Diffusion 1.x latents to RGB, used
+# for cheap previews without running the VAE decoder
+LATENT_RGB_FACTORS = [
+    [0.298, 0.207, 0.208],
+    [0.187, 0.286, 0.173],
+    [-0.158, 0.189, 0.264],
+    [-0.184, -0.271, -0.473],
+]
+
+
+class SpriteBackend:
+    """Base class for sprite generation backends"""
+
+    name = "base"
+    requires = ()  # modules imported by load(), probed without importing them
+
+    def load(self):
+        """Prepare the backend for generation (lazy loading)"""
+
+    @property
+    def loaded(self) -> bool:
+        """True once load() has completed"""
+        return True
+
+    def memory_bytes(self) -> Optional[int]:
+        """Bytes held by model weights, or None if not loaded or not applicable"""
+        return None
+
+    def generate(
+        self,
+        prompt: str,
+        num_inference_steps: int,
+        guidance_scale: float,
+        height: int,
+        width: int,
+        seed: Optional[int] = None,
+        callback: Optional[StepCallback] = None
+    ) -> Image.Image:
+        """
+        Produce one image for a prompt
+
+        Args:
+            callback: Called after every inference step (see StepCallback);
+                exceptions it raises abort the generation
+
+        Returns:
+            PIL Image object
+        """
+        raise NotImplementedError
+
+
+class DiffusersBackend(SpriteBackend):
+    """Stable Diffusion through diffusers.StableDiffusionPipeline"""
+
+    name = "diffusers"
+    requires = ('torch', 'diffusers')
+
+    def __init__(self, device: str = "cpu", low_memory: bool = True, model_name: str = DEFAULT_MODEL):
+        """
+        Initialize diffusers backend
+
+        Args:
+            device: 'cpu' or 'cuda' (default: cpu)
+            low_memory: Enable memory optimization for CPU (default: True)
+            model_name: HuggingFace model ID
+
+        Raises:
+            ImportError: If torch or diffusers is not installed (checked
+                without importing them; they are imported by load())
+        """
+        missing = missing_modules(self.name)
+        if missing:
+            raise ImportError(f"the {self.name} sprite backend needs {', '.join(missing)}")
+
+        self.torch = None
+        self.device = device
+        self.low_memory = low_memory
+        self.model_name = model_name
+        self.pipe = None
+        self._memory_bytes: Optional[int] = None
+
+    @property
+    def loaded(self) -> bool:
+        return self.pipe is not None
+
+    def load(self):
+        """Load Stable Diffusion model (lazy loading)"""
+        if self.pipe is not None:
+            return
+
+        # This may take a few minutes on first run while downloading the ~4GB model
+        log_event('model.loading', model=self.model_name, device=self.device)
+
+        import torch
+        from diffusers import StableDiffusionPipeline
+
+        self.torch = torch
+
+        # Load pipeline
+        self.pipe = StableDiffusionPipeline.from_pretrained(
+            self.model_name,
+            torch_dtype=self.torch.float32
+        )
+
+        # CPU-specific optimizations
+        if self.device == "cpu":
+            # Enable attention slicing to reduce memory usage
+            self.pipe.enable_attention_slicing()
+
+            # Optional: Enable CPU offloading if available
+            try:
+                self.pipe.enable_sequential_cpu_offload()
+            except:
+                pass
+        else:
+            # Move to device (only for non-CPU devices to avoid meta tensor issues)
+            self.pipe = self.pipe.to(self.device)
+
+        log_event('model.loaded', model=self.model_name, device=self.device, memory_bytes=self.memory_bytes())
+
+    def memory_bytes(self) -> Optional[int]:
+        if self.pipe is None:
+            return None
+        if self._memory_bytes is None:
+            modules = [c for c in self.pipe.components.values() if isinstance(c, self.torch.nn.Module)]
+            self._memory_bytes = sum(
+                tensor.numel() * tensor.element_size()
+                for module in modules
+                for tensor in list(module.parameters()) + list(module.buffers())
+            )
+        return self._memory_bytes
+
+    def generate(self, prompt, num_inference_steps, guidance_scale, height, width, seed=None, callback=None):
+        if self.pipe is None:
+            self.load()
+
+        # Set seed for reproducibility
+        if seed is not None:
+            self.torch.manual_seed(seed)
+
+        step_options = {}
+        if callback is not None:
+            def on_step_end(pipe, step, timestep, tensors):
+                latents = tensors["latents"]
+                callback(step + 1, num_inference_steps, lambda: self._latent_preview(latents))
+                return tensors
+
+            step_options = {
+                "callback_on_step_end": on_step_end,
+                "callback_on_step_end_tensor_inputs": ["latents"],
+            }
+
+        # Generate with no_grad to save memory
+        with self.torch.no_grad():
+            result = self.pipe(
+                prompt=prompt,
+                num_inference_steps=num_inference_steps,
+                guidance_scale=guidance_scale,
+                height=height,
+                width=width,
+                **step_options
+            )
+
+        return result.images[0]
+
+    def _latent_preview(self, latents) -> Image.Image:
+        """Project latents to a small RGB image (1/8 of the output size)"""
+        factors = self.torch.tensor(LATENT_RGB_FACTORS, dtype=self.torch.float32)
+        rgb = self.torch.einsum("chw,cr->hwr", latents[0].detach().float().cpu(), factors)
+        rgb = ((rgb + 1.0) * 127.5).clamp(0, 255).to(self.torch.uint8)
+        return Image.fromarray(rgb.numpy(), mode="RGB")
+
+
+class StubBackend(SpriteBackend):
+    """
+    Deterministic offline stand-in for the diffusion pipeline
+
+    Draws a symmetric pixel-art creature derived from the prompt and seed, so
+    identical requests always give identical images. Needs no network, no
+    model weights and no torch.
+    """
+
+    name = "stub"
+
+    GRID = 16
+
+    def __init__(self, latency: float = 0.0, step_latency: float = 0.0):
+        """
+        Initialize stub backend
+
+        Args:
+            latency: Fixed fake latency per image in seconds
+            step_latency: Additional fake latency per inference step in seconds
+        """
+        self.latency = latency
+        self.step_latency = step_latency
+
+    def generate(self, prompt, num_inference_steps, guidance_scale, height, width, seed=None, callback=None):
+        key = f"{prompt}|{seed}|{num_inference_steps}|{guidance_scale}".encode("utf-8")
+        rng = random.Random(hashlib.sha256(key).digest())
+
+        sprite = self._draw(rng)
+
+        # Spread the fake latency over the steps so progress looks real
+        step_delay = self.latency / max(1, num_inference_steps) + self.step_latency
+        for step in range(1, num_inference_steps + 1):
+            if step_delay > 0:
+                time.sleep(step_delay)
+            if callback is not None:
+                callback(step, num_inference_steps, lambda: sprite.convert("RGB"))
+
+        return sprite.resize((width, height), resample=Image.NEAREST)
+
+    def _draw(self, rng: random.Random) -> Image.Image:
+        """Draw the small symmetric sprite for one request"""
+        palette = [tuple(rng.randrange(256) for _ in range(3)) + (255,) for _ in range(3)]
+        grid = self.GRID
+        half = grid // 2
+
+        sprite = Image.new("RGBA", (grid, grid), (255, 255, 255, 255))
+        draw = ImageDraw.Draw(sprite)
+        for y in range(1, grid - 1):
+            for x in range(1, half):
+                # Denser towards the middle so the result reads as a body
+                if rng.random() < 0.25 + 0.5 * x / half:
+                    color = palette[rng.randrange(len(palette))]
+                    draw.point((x, y), fill=color)
+                    draw.point((grid - 1 - x, y), fill=color)
+
+        return sprite
+
+
+BACKENDS = {
+    DiffusersBackend.name: DiffusersBackend,
+    StubBackend.name: StubBackend,
+}
+
+
+def missing_modules(name: str) -> List[str]:
+    """
+    Modules a backend needs that are not installed
+
+    Uses importlib.util.find_spec, so nothing is imported: probing takes
+    milliseconds where importing torch takes seconds.
+
+    Raises:
+        ValueError: If there is no such backend
+    """
+    try:
+        backend_cls = BACKENDS[name]
+    except KeyError:
+        raise ValueError(f"Unknown sprite backend: {name} (choose from {', '.join(BACKENDS)})")
+    return [module for module in backend_cls.requires if importlib.util.find_spec(module) is None]
+
+
+def create_backend(name: str, **kwargs) -> SpriteBackend:
+    """
+    Build a backend by name
+
+    Args:
+        name: One of BACKENDS ('diffusers' or 'stub')
+        **kwargs: Passed to the backend constructor
+
+    Returns:
+        SpriteBackend instance
+    """
+    try:
+        backend_cls = BACKENDS[name]
+    except KeyError:
+        raise ValueError(f"Unknown sprite backend: {name} (choose from {', '.join(BACKENDS)})")
+    return backend_cls(**kwargs)
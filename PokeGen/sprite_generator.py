@@ -5,17 +5,33 @@ Generates Pokémon sprites from text descriptions using Stable Diffusion
 Optimized for CPU-only inference with low memory footprint
 """
 
-import torch
+import io
+import logging
 import sys
+import time
 from pathlib import Path
-from typing import Optional
+from typing import Any, Callable, Dict, Optional, Union
 from PIL import Image
+from sprite_backends import DEFAULT_MODEL, BACKENDS, SpriteBackend, DiffusersBackend, create_backend
+from metrics import INFERENCE_STEP_SECONDS, configure_logging, log_event, phase
+from profiling import add_profile_argument, profiled
+
+# Sprites are generated at HIGH_RES for detail and downscaled to LOW_RES for the game
+HIGH_RES = 512
+LOW_RES = 96
 
 
 class SpriteGenerator:
     """Generate Pokémon sprites from text descriptions using Stable Diffusion"""
     
-    def __init__(self, device: str = "cpu", low_memory: bool = True, model_name: str = "justinpinkney/pokemon-stable-diffusion"):
+    def __init__(
+        self,
+        device: str = "cpu",
+        low_memory: bool = True,
+        model_name: str = DEFAULT_MODEL,
+        backend: Union[str, SpriteBackend] = DiffusersBackend.name,
+        **backend_options
+    ):
         """
         Initialize sprite generator
         
@@ -23,43 +39,29 @@ class SpriteGenerator:
             device: 'cpu' or 'cuda' (default: cpu)
             low_memory: Enable memory optimization for CPU (default: True)
             model_name: HuggingFace model ID (default: Stable Diffusion v1.5)
+            backend: Backend name ('diffusers' or 'stub') or a SpriteBackend instance
+            **backend_options: Extra options for a named non-diffusers backend
+                (e.g. latency=0.5 for the stub)
         """
         self.device = device
         self.low_memory = low_memory
         self.model_name = model_name
-        self.pipe = None
-    
-    def load_model(self):
-        """Load Stable Diffusion model (lazy loading)"""
-        if self.pipe is not None:
-            return
-        
-        print(f"Loading Stable Diffusion model ({self.model_name})...")
-        print("(This may take a few minutes on first run while downloading ~4GB model)")
-        
-        from diffusers import StableDiffusionPipeline
-        
-        # Load pipeline
-        self.pipe = StableDiffusionPipeline.from_pretrained(
-            self.model_name,
-            torch_dtype=torch.float32
-        )
         
-        # CPU-specific optimizations
-        if self.device == "cpu":
-            # Enable attention slicing to reduce memory usage
-            self.pipe.enable_attention_slicing()
-            
-            # Optional: Enable CPU offloading if available
-            try:
-                self.pipe.enable_sequential_cpu_offload()
-            except:
-                pass
+        if isinstance(backend, SpriteBackend):
+            self.backend = backend
+        elif backend == DiffusersBackend.name:
+            self.backend = DiffusersBackend(device=device, low_memory=low_memory, model_name=model_name)
         else:
-            # Move to device (only for non-CPU devices to avoid meta tensor issues)
-            self.pipe = self.pipe.to(self.device)
-        
-        print(f"✓ Model loaded on {self.device}")
+            self.backend = create_backend(backend, **backend_options)
+    
+    def load_model(self):
+        """Load the backend model (lazy loading)"""
+        with phase('load_model', backend=self.backend.name):
+            self.backend.load()
+    
+    def memory_bytes(self) -> Optional[int]:
+        """Bytes held by the loaded model weights, if known"""
+        return self.backend.memory_bytes()
     
 
     def generate_sprite(
@@ -69,7 +71,9 @@ class SpriteGenerator:
         guidance_scale: float = 7.5,
         height: int = 96,
         width: int = 96,
-        seed: Optional[int] = None
+        seed: Optional[int] = None,
+        progress: Optional[Callable[[Dict[str, Any]], None]] = None,
+        preview_every: int = 0
     ) -> Image.Image:
         """
         Generate a sprite from text description
@@ -81,35 +85,95 @@ class SpriteGenerator:
             height: Image height in pixels (default: 96)
             width: Image width in pixels (default: 96)
             seed: Random seed for reproducibility
+            progress: Called after every step with a dict holding step, total,
+                elapsed and eta (seconds) and, every preview_every steps,
+                preview (a small PIL image of the work in progress)
+            preview_every: Attach a preview every N steps (0 = never)
         
         Returns:
             PIL Image object
         """
         
-        if self.pipe is None:
+        if not self.backend.loaded:
             self.load_model()
         
-        # Set seed for reproducibility
-        if seed is not None:
-            torch.manual_seed(seed)
-        
-        print(f"Generating sprite: '{prompt}'")
-        
-        # Generate with no_grad to save memory
-        with torch.no_grad():
-            result = self.pipe(
+        with phase('inference', backend=self.backend.name, steps=num_inference_steps, prompt=prompt):
+            image = self.backend.generate(
                 prompt=prompt,
                 num_inference_steps=num_inference_steps,
                 guidance_scale=guidance_scale,
                 height=height,
-                width=width
+                width=width,
+                seed=seed,
+                callback=self._step_callback(progress, preview_every)
             )
         
-        image = result.images[0]
-        print("✓ Sprite generated successfully")
-        
         return image
     
+    def _step_callback(self, progress: Optional[Callable[[Dict[str, Any]], None]], preview_every: int):
+        """Time every step and adapt a progress(event) hook to the backend step callback"""
+        started = time.monotonic()
+        last_step = started
+        
+        def on_step(step, total, preview):
+            nonlocal last_step
+            now = time.monotonic()
+            INFERENCE_STEP_SECONDS.observe(now - last_step, backend=self.backend.name)
+            last_step = now
+            if progress is None:
+                return
+            
+            elapsed = now - started
+            event = {
+                'step': step,
+                'total': total,
+                'elapsed': elapsed,
+                'eta': elapsed / step * (total - step),
+            }
+            if preview_every and (step % preview_every == 0 or step == total):
+                event['preview'] = preview()
+            progress(event)
+        
+        return on_step
+    
+    def generate_pngs(
+        self,
+        prompt: str,
+        num_inference_steps: int = 20,
+        **kwargs
+    ) -> Dict[int, bytes]:
+        """
+        Generate sprite and return it PNG-encoded in memory
+        
+        Args:
+            prompt: Text description
+            num_inference_steps: Number of inference steps
+            **kwargs: Additional arguments for generate_sprite()
+        
+        Returns:
+            PNG bytes keyed by size: {512: high-res, 96: downscaled}
+        """
+        
+        # Generate at high resolution (512x512) for better detail
+        high_res = self.generate_sprite(
+            prompt,
+            num_inference_steps=num_inference_steps,
+            height=HIGH_RES,
+            width=HIGH_RES,
+            **kwargs
+        )
+        
+        # Downscale to 96x96 using nearest neighbor to preserve pixel-art look
+        downscaled = high_res.resize((LOW_RES, LOW_RES), resample=Image.NEAREST)
+        
+        pngs = {}
+        with phase('png_encode'):
+            for size, image in ((HIGH_RES, high_res), (LOW_RES, downscaled)):
+                buffer = io.BytesIO()
+                image.save(buffer, format='PNG')
+                pngs[size] = buffer.getvalue()
+        return pngs
+    
     def generate_and_save(
         self,
         prompt: str,
@@ -131,33 +195,43 @@ class SpriteGenerator:
         """
         
         try:
-            # Generate at high resolution (512x512) for better detail
-            high_res = self.generate_sprite(
-                prompt,
-                num_inference_steps=num_inference_steps,
-                height=512,
-                width=512,
-                **kwargs
-            )
-
+            pngs = self.generate_pngs(prompt, num_inference_steps=num_inference_steps, **kwargs)
+            
             output_path.parent.mkdir(parents=True, exist_ok=True)
-
-            # Save high-resolution image with _512 suffix
-            high_res_path = output_path.parent / f"{output_path.stem}_512.png"
-            high_res.save(str(high_res_path))
-
-            # Downscale to 96x96 using nearest neighbor to preserve pixel-art look
-            downscaled = high_res.resize((96, 96), resample=Image.NEAREST)
-            down_res_path = output_path.parent / f"{output_path.stem}_96.png"
-            downscaled.save(str(down_res_path))
-
-            print(f"✓ Saved high-res to {high_res_path} and downscaled sprite to {down_res_path}")
+            
+            # Save both sizes with _512 / _96 suffixes
+            high_res_path = output_path.parent / f"{output_path.stem}_{HIGH_RES}.png"
+            down_res_path = output_path.parent / f"{output_path.stem}_{LOW_RES}.png"
+            with phase('sprite_write'):
+                high_res_path.write_bytes(pngs[HIGH_RES])
+                down_res_path.write_bytes(pngs[LOW_RES])
+            
+            log_event('sprite.saved', high=high_res_path, low=down_res_path)
             return True
         except Exception as e:
-            print(f"✗ Error generating sprite: {e}")
+            log_event('sprite.failed', level=logging.ERROR, error=e)
             return False
 
 
+class ConsoleProgress:
+    """Text progress bar for generate_sprite(progress=...)"""
+    
+    def __init__(self, width: int = 30, stream=sys.stderr):
+        self.width = width
+        self.stream = stream
+    
+    def __call__(self, event: Dict[str, Any]):
+        filled = int(self.width * event['step'] / event['total'])
+        bar = '#' * filled + '-' * (self.width - filled)
+        self.stream.write(
+            f"\r[{bar}] {event['step']}/{event['total']}  "
+            f"{event['elapsed']:.1f}s elapsed, ETA {event['eta']:.1f}s"
+        )
+        if event['step'] == event['total']:
+            self.stream.write("\n")
+        self.stream.flush()
+
+
 def main():
     """Command-line interface"""
     import argparse
@@ -169,8 +243,13 @@ def main():
     parser.add_argument('--seed', type=int, help='Random seed for reproducibility')
     parser.add_argument('--output', type=Path, help='Output directory (default: ./generated_sprites/)')
     parser.add_argument('--device', choices=['cpu', 'cuda'], default='cpu', help='Device to use')
+    parser.add_argument('--backend', choices=list(BACKENDS), default=DiffusersBackend.name,
+                        help='Image backend (stub = offline deterministic stand-in)')
+    parser.add_argument('--stub-latency', type=float, default=0.0, help='Fake seconds per image for the stub backend')
+    add_profile_argument(parser)
     
     args = parser.parse_args()
+    configure_logging()
     
     # Setup output: allow `--output` to be either a directory or an explicit file path.
     if args.output:
@@ -196,13 +275,16 @@ def main():
         output_path = output_dir / f"{args.name}.png"
     
     # Generate
-    gen = SpriteGenerator(device=args.device, low_memory=True)
-    success = gen.generate_and_save(
-        prompt=args.prompt,
-        output_path=output_path,
-        num_inference_steps=args.steps,
-        seed=args.seed
-    )
+    backend_options = {'latency': args.stub_latency} if args.backend != DiffusersBackend.name else {}
+    with profiled(args.profile, 'sprite_generator'):
+        gen = SpriteGenerator(device=args.device, low_memory=True, backend=args.backend, **backend_options)
+        success = gen.generate_and_save(
+            prompt=args.prompt,
+            output_path=output_path,
+            num_inference_steps=args.steps,
+            seed=args.seed,
+            progress=ConsoleProgress()
+        )
     
     sys.exit(0 if success else 1)
 
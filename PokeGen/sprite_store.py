@@ -0,0 +1,380 @@
+#!/usr/bin/env python3
+"""
+Sprite Store for PokeGen
+Write-behind persistence and a metadata index for generated_sprites/
+"""
+
+import hashlib
+import io
+import json
+import logging
+import queue
+import re
+import threading
+import time
+from collections import OrderedDict
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+from PIL import Image
+from metrics import log_event, phase
+
+
+THUMB_SIZE = 48
+TOUCH_FLUSH_INTERVAL = 60  # seconds between writes of buffered access times
+SAVE_TIMEOUT = 10.0  # longest a lookup waits for a sprite that is still being written
+INDEX_POLL = 0.05  # seconds between index checks for a sprite saved by another process
+SPRITE_FILE = re.compile(r'^(?P<name>.+)_(?P<size>\d+)\.png$')
+
+
+class SpriteStore:
+    """
+    Persist encoded sprite files on a background thread and index them
+
+    Every saved sprite gets one line in index.jsonl (prompt, seed, steps,
+    timestamp, file sizes, thumbnail ETag). Later lines record accesses, mod
+    references (pins) and deletions. The index is append-only, so any number
+    of processes can follow it by reading only the bytes added since their
+    last look; the directory itself is never scanned per request.
+    """
+
+    def __init__(self, save_dir: Path):
+        """
+        Initialize sprite store
+
+        Args:
+            save_dir: Directory that receives <name>_<size>.png files
+        """
+        self.save_dir = Path(save_dir)
+        self.thumb_dir = self.save_dir / "thumbs"
+        self.index_path = self.save_dir / "index.jsonl"
+
+        self._queue: 'queue.Queue[Optional[tuple]]' = queue.Queue()
+        self._writer: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+        self._pending: Dict[str, threading.Event] = {}  # names queued but not yet indexed; set once written
+
+        # In-memory view of index.jsonl; position in _entries is the cursor
+        self._index_lock = threading.Lock()
+        self._entries: List[Optional[Dict[str, Any]]] = []
+        self._by_name: 'OrderedDict[str, Dict[str, Any]]' = OrderedDict()  # least recently used first
+        self._total_bytes = 0
+        self._index_offset = 0
+
+        self._touches: Dict[str, float] = {}
+        self._touches_flushed = time.monotonic()
+
+    def path(self, name: str, size: int) -> Path:
+        """Location of one size of a stored sprite"""
+        return self.save_dir / f"{name}_{size}.png"
+
+    def thumb_path(self, name: str) -> Path:
+        """Location of a sprite's pre-rendered thumbnail"""
+        return self.thumb_dir / f"{name}.png"
+
+    def save(self, name: str, files: Dict[int, bytes], metadata: Optional[Dict[str, Any]] = None) -> Dict[int, Path]:
+        """
+        Queue encoded PNGs for writing and return where they will land
+
+        Args:
+            name: Sprite name (file stem)
+            files: Encoded PNG bytes keyed by size (e.g. {512: ..., 96: ...})
+            metadata: Extra fields for the index entry (prompt, seed, steps)
+
+        Returns:
+            Paths keyed by size; files appear once the writer catches up
+        """
+        self._ensure_writer()
+        with self._lock:
+            self._pending[name] = threading.Event()
+        self._queue.put((name, files, dict(metadata or {}, created=time.time())))
+        return {size: self.path(name, size) for size in files}
+
+    def wait_saved(self, name: str, timeout: float = SAVE_TIMEOUT) -> bool:
+        """
+        Block until a sprite has been written and indexed
+
+        Waits for the writer when the sprite was queued in this process, and
+        otherwise polls the index (a sprite saved by serve.py's model process).
+
+        Returns:
+            True if the sprite is indexed, False if writing it failed or timed out
+        """
+        deadline = time.monotonic() + timeout
+        with self._lock:
+            written = self._pending.get(name)
+        if written is not None and not written.wait(timeout):
+            return False
+        while self._lookup(name) is None:
+            if written is not None or time.monotonic() >= deadline:
+                return False
+            time.sleep(INDEX_POLL)
+        return True
+
+    def flush(self):
+        """Block until every queued sprite has been written"""
+        self._queue.join()
+
+    def close(self):
+        """Write everything still queued and stop the writer thread"""
+        self.flush_touches()
+        with self._lock:
+            writer = self._writer
+            self._writer = None
+        if writer is not None:
+            self._queue.put(None)
+            writer.join()
+
+    def exists(self, name: str) -> bool:
+        """True if a sprite with this name is indexed or queued for writing"""
+        with self._lock:
+            if name in self._pending:
+                return True
+        return self._lookup(name) is not None
+
+    def get(self, name: str) -> Optional[Dict[str, Any]]:
+        """
+        Index entry for one sprite, or None
+
+        A sprite still queued for writing in this process is waited for (up
+        to SAVE_TIMEOUT), so its name can be used as soon as save() returns.
+        """
+        with self._lock:
+            written = self._pending.get(name)
+        if written is not None:
+            written.wait(SAVE_TIMEOUT)
+        return self._lookup(name)
+
+    def _lookup(self, name: str) -> Optional[Dict[str, Any]]:
+        self._refresh()
+        return self._by_name.get(name)
+
+    def total_bytes(self) -> int:
+        """Bytes used by every indexed sprite, including thumbnails"""
+        self._refresh()
+        return self._total_bytes
+
+    def least_recently_used(self) -> Iterator[Dict[str, Any]]:
+        """Index entries from least to most recently used (a snapshot)"""
+        self._refresh()
+        with self._index_lock:
+            entries = list(self._by_name.values())
+        return iter(entries)
+
+    def touch(self, name: str):
+        """Record that a sprite was used; written to the index in batches"""
+        with self._index_lock:
+            self._touches[name] = time.time()
+            due = time.monotonic() - self._touches_flushed >= TOUCH_FLUSH_INTERVAL
+        if due:
+            self.flush_touches()
+
+    def flush_touches(self):
+        """Write buffered access times to the index"""
+        with self._index_lock:
+            touches, self._touches = self._touches, {}
+            self._touches_flushed = time.monotonic()
+        if touches:
+            self._append({'op': 'touch', 'names': touches})
+
+    def pin(self, name: str, mod: str):
+        """Record that a mod was built from a sprite, so retention keeps it"""
+        self._append({'op': 'pin', 'name': name, 'mod': mod})
+
+    def unpin(self, name: str, mod: str):
+        """Record that a mod no longer uses a sprite"""
+        self._append({'op': 'unpin', 'name': name, 'mod': mod})
+
+    def delete(self, name: str) -> int:
+        """
+        Remove a sprite, its thumbnail and its index entry
+
+        Returns:
+            Bytes freed
+        """
+        entry = self.get(name)
+        if entry is None:
+            return 0
+        # Unindex first so no reader is handed files that are about to go
+        self._append({'op': 'delete', 'name': name})
+        freed = 0
+        for path in [self.path(name, int(size)) for size in entry['bytes']] + [self.thumb_path(name)]:
+            try:
+                freed += path.stat().st_size
+                path.unlink()
+            except FileNotFoundError:
+                pass
+        return freed
+
+    def page(self, limit: int = 50, cursor: Optional[int] = None) -> Tuple[List[Dict[str, Any]], Optional[int]]:
+        """
+        Newest-first page of index entries
+
+        Args:
+            limit: Maximum entries to return
+            cursor: Value returned as next_cursor by the previous page
+
+        Returns:
+            (entries, next_cursor); next_cursor is None on the last page
+        """
+        self._refresh()
+        with self._index_lock:
+            position = len(self._entries) if cursor is None else min(cursor, len(self._entries))
+            items = []
+            while position > 0 and len(items) < limit:
+                position -= 1
+                entry = self._entries[position]
+                if entry is not None:
+                    items.append(entry)
+            return items, (position if position > 0 else None)
+
+    def _refresh(self):
+        """Apply index lines appended since the last refresh (by any process)"""
+        with self._index_lock:
+            if self._index_offset == 0 and not self.index_path.exists():
+                self._build_index()
+            try:
+                if self.index_path.stat().st_size == self._index_offset:
+                    return
+                with self.index_path.open('rb') as index:
+                    index.seek(self._index_offset)
+                    data = index.read()
+            except FileNotFoundError:
+                return
+
+            # Only consume whole lines; a partial last line is picked up next time
+            complete = data[:data.rfind(b'\n') + 1]
+            self._index_offset += len(complete)
+            for line in complete.splitlines():
+                if line.strip():
+                    self._apply(json.loads(line))
+
+    def _apply(self, record: Dict[str, Any]):
+        """Apply one index record; caller holds the index lock"""
+        op = record.pop('op', 'add')
+        if op == 'add':
+            if record['name'] in self._by_name:
+                self._remove(record['name'])
+            record['cursor'] = len(self._entries)
+            record['used'] = record['created']
+            record['pins'] = set()
+            self._entries.append(record)
+            self._by_name[record['name']] = record
+            self._total_bytes += sum(record['bytes'].values()) + record.get('thumb_bytes', 0)
+            return
+
+        if op == 'touch':
+            for name, used in record['names'].items():
+                entry = self._by_name.get(name)
+                if entry is not None and used > entry['used']:
+                    entry['used'] = used
+                    self._by_name.move_to_end(name)
+            return
+
+        entry = self._by_name.get(record['name'])
+        if entry is None:
+            return
+        if op == 'delete':
+            self._remove(record['name'])
+        elif op == 'pin':
+            entry['pins'].add(record['mod'])
+        elif op == 'unpin':
+            entry['pins'].discard(record['mod'])
+
+    def _remove(self, name: str):
+        """Drop an entry from the in-memory index; caller holds the index lock"""
+        entry = self._by_name.pop(name)
+        self._entries[entry['cursor']] = None
+        self._total_bytes -= sum(entry['bytes'].values()) + entry.get('thumb_bytes', 0)
+
+    def _append(self, record: Dict[str, Any]):
+        """Append one line to the index (a single write, so lines never interleave)"""
+        self.save_dir.mkdir(parents=True, exist_ok=True)
+        self._refresh()
+        with self.index_path.open('a') as index:
+            index.write(json.dumps(record) + '\n')
+
+    def _build_index(self):
+        """One-time index of sprites saved before the index existed; caller holds the index lock"""
+        try:
+            index = self.index_path.open('x')  # whoever creates the file does the migration
+        except FileExistsError:
+            return
+        except FileNotFoundError:
+            return  # nothing has been saved yet
+
+        with index:
+            sizes: Dict[str, Dict[int, int]] = {}
+            for path in self.save_dir.glob('*.png'):
+                match = SPRITE_FILE.match(path.name)
+                if match:
+                    sizes.setdefault(match['name'], {})[int(match['size'])] = path.stat().st_size
+            for name in sorted(sizes, key=lambda n: min(self.path(n, s).stat().st_mtime for s in sizes[n])):
+                record = {
+                    'name': name,
+                    'created': min(self.path(name, s).stat().st_mtime for s in sizes[name]),
+                    'bytes': sizes[name],
+                }
+                small = self.path(name, min(sizes[name])).read_bytes()
+                record['thumb_etag'], record['thumb_bytes'] = self._write_thumb(name, small)
+                index.write(json.dumps(record) + '\n')
+
+    def _write_thumb(self, name: str, png: bytes) -> Tuple[str, int]:
+        """Render and save a thumbnail from the smallest sprite; returns its ETag and size"""
+        image = Image.open(io.BytesIO(png))
+        thumb = image.resize((THUMB_SIZE, THUMB_SIZE), resample=Image.NEAREST)
+        buffer = io.BytesIO()
+        thumb.save(buffer, format='PNG', optimize=True)
+        data = buffer.getvalue()
+        self.thumb_dir.mkdir(parents=True, exist_ok=True)
+        self._write_file(self.thumb_path(name), data)
+        return hashlib.sha1(data).hexdigest(), len(data)
+
+    def _ensure_writer(self):
+        with self._lock:
+            if self._writer is None:
+                self._writer = threading.Thread(target=self._write_loop, name='sprite-writer', daemon=True)
+                self._writer.start()
+
+    def _write_loop(self):
+        while True:
+            item = self._queue.get()
+            try:
+                if item is None:
+                    return
+                self._write(*item)
+            except Exception as e:
+                log_event('sprite_store.write_failed', level=logging.ERROR, name=item[0], error=e)
+            finally:
+                if item is not None:
+                    with self._lock:
+                        written = self._pending.pop(item[0], None)
+                    if written is not None:
+                        written.set()
+                self._queue.task_done()
+
+    def _write(self, name: str, files: Dict[int, bytes], metadata: Dict[str, Any]):
+        with phase('sprite_write', name=name):
+            self._write_files(name, files, metadata)
+
+    def _write_files(self, name: str, files: Dict[int, bytes], metadata: Dict[str, Any]):
+        self.save_dir.mkdir(parents=True, exist_ok=True)
+        self._refresh()  # migrate a pre-index directory before adding files to it
+        for size, data in files.items():
+            self._write_file(self.path(name, size), data)
+
+        # Index last, so an indexed sprite always has its files and thumbnail
+        thumb_etag, thumb_bytes = self._write_thumb(name, files[min(files)])
+        self._append({
+            'name': name,
+            **metadata,
+            'bytes': {size: len(data) for size, data in files.items()},
+            'thumb_etag': thumb_etag,
+            'thumb_bytes': thumb_bytes,
+        })
+
+    @staticmethod
+    def _write_file(target: Path, data: bytes):
+        # Write under a temporary name so readers never see a partial PNG
+        partial = target.with_suffix('.png.part')
+        partial.write_bytes(data)
+        partial.replace(target)
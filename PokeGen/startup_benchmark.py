@@ -0,0 +1,118 @@
+#!/usr/bin/env python3
+"""
+PokeGen Startup Benchmark
+Times how long the web app and the mod generator CLI take to start in fresh
+interpreters, and checks that they never import the sprite model's modules
+"""
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+
+POKEGEN_DIR = Path(__file__).parent
+
+# Only sprite generation may import these; startup must not
+MODEL_MODULES = ('torch', 'diffusers', 'transformers')
+# Reported, but allowed (e.g. balance reports need numpy)
+WATCHED_MODULES = MODEL_MODULES + ('numpy', 'flask', 'PIL')
+
+# Runs in the child interpreter; reports its import time and loaded modules on stderr's last line
+CHILD = """
+import json, runpy, sys, time
+started = time.perf_counter()
+{body}
+sys.stderr.write('\\n' + json.dumps({{
+    'seconds': time.perf_counter() - started,
+    'modules': sorted(m for m in {watched!r} if m in sys.modules),
+}}) + '\\n')
+"""
+
+RUN_SCRIPT = """
+sys.argv = {argv!r}
+try:
+    runpy.run_path(sys.argv[0], run_name='__main__')
+except SystemExit:
+    pass
+"""
+
+
+def scenarios(scratch: Path):
+    """(name, child body) for every startup path measured"""
+    return [
+        ('app import', "import app"),
+        ('/api/sprite-available', "import app\napp.app.test_client().get('/api/sprite-available')"),
+        ('mod CLI --help', RUN_SCRIPT.format(argv=['pokemon_mod_generator.py', '--help'])),
+        ('mod CLI create', RUN_SCRIPT.format(argv=['pokemon_mod_generator.py', 'Benchmon', '--type1', 'FIRE',
+                                                  '--output', str(scratch)])),
+    ]
+
+
+def run_once(body: str, env: dict) -> dict:
+    """
+    Start one fresh interpreter
+
+    Returns:
+        {'wall': seconds including interpreter startup, 'seconds': import and
+        run time inside the child, 'modules': watched modules it imported}
+
+    Raises:
+        RuntimeError: If the child fails
+    """
+    code = CHILD.format(body=body, watched=WATCHED_MODULES)
+    started = time.perf_counter()
+    result = subprocess.run([sys.executable, '-c', code], cwd=POKEGEN_DIR, env=env,
+                            stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, text=True)
+    wall = time.perf_counter() - started
+    lines = result.stderr.strip().splitlines()
+    if result.returncode != 0 or not lines:
+        raise RuntimeError(result.stderr.strip() or f"exit status {result.returncode}")
+    report = json.loads(lines[-1])
+    report['wall'] = wall
+    return report
+
+
+def main():
+    """Run the benchmark"""
+    parser = argparse.ArgumentParser(description='Time web app and mod generator CLI startup')
+    parser.add_argument('--runs', type=int, default=5, help='Fresh interpreters per scenario (default: 5)')
+    parser.add_argument('--budget', type=float, default=1.0,
+                        help='Largest acceptable median startup in seconds (default: 1.0)')
+    args = parser.parse_args()
+
+    failed = False
+    with tempfile.TemporaryDirectory(prefix='pokegen-startup-') as scratch:
+        env = dict(os.environ, POKEGEN_LOG_LEVEL='WARNING',
+                   POKEGEN_MODS_DIR=str(Path(scratch) / "mods"))
+        print(f"{'scenario':24} {'median':>8} {'max':>8} {'in-process':>11}  modules")
+        for name, body in scenarios(Path(scratch) / "mods"):
+            try:
+                runs = [run_once(body, env) for _ in range(args.runs)]
+            except RuntimeError as e:
+                print(f"{name:24} ✗ {e.splitlines()[-1] if str(e) else e}")
+                failed = True
+                continue
+            walls = [run['wall'] for run in runs]
+            median = statistics.median(walls)
+            modules = sorted({module for run in runs for module in run['modules']})
+            model = [module for module in modules if module in MODEL_MODULES]
+            over = median > args.budget
+            failed = failed or over or bool(model)
+            mark = '✗' if over or model else '✓'
+            print(f"{name:24} {median:7.3f}s {max(walls):7.3f}s "
+                  f"{statistics.median(run['seconds'] for run in runs):10.3f}s  {mark} {', '.join(modules) or '-'}")
+            if model:
+                print(f"  ✗ imported {', '.join(model)} at startup")
+
+    print(f"\nBudget: {args.budget:.2f} s median per scenario, including interpreter startup")
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,105 @@
+#!/usr/bin/env python3
+"""
+PokeGen Mod Writer Stress Test
+Fires hundreds of concurrent /api/create requests at a scratch mods directory
+and checks that every resulting mod is complete and internally consistent
+"""
+
+import argparse
+import contextlib
+import io
+import os
+import re
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+from mod_registry import state_dir
+
+
+MOD_FILES = [
+    'pokemon.cfg',
+    'graphics/front.png',
+    'graphics/back.png',
+    'graphics/front_shiny.png',
+    'graphics/back_shiny.png',
+]
+
+
+def request_for(index, names):
+    """Request body for one create; HP encodes the dex so mixed writes are detectable"""
+    dex = 1000 + index
+    return {
+        'name': names[index % len(names)],
+        'dex': dex,
+        'type1': 'FIRE',
+        'hp': dex % 200 + 1,
+    }
+
+
+def check_mod(mod_dir: Path):
+    """Return a list of problems with one mod directory"""
+    problems = [f"{mod_dir.name}: missing {f}" for f in MOD_FILES if not (mod_dir / f).is_file()]
+    if problems:
+        return problems
+
+    dex = int(re.search(r'^dex_number = (\d+)$', (mod_dir / 'pokemon.cfg').read_text(), re.M).group(1))
+    stats_asm = mod_dir / 'data' / 'pokemon' / 'dex_entries' / f"{mod_dir.name.lower()}_base_stats.asm"
+    if not stats_asm.is_file():
+        return [f"{mod_dir.name}: missing {stats_asm.name}"]
+    hp = int(re.search(r'^db\s+(\d+)\s+; HP$', stats_asm.read_text(), re.M).group(1))
+    if hp != dex % 200 + 1:
+        return [f"{mod_dir.name}: pokemon.cfg (dex {dex}) and base stats (HP {hp}) come from different requests"]
+    return []
+
+
+def main():
+    """Run the stress test"""
+    parser = argparse.ArgumentParser(description='Stress test concurrent mod creation')
+    parser.add_argument('--requests', type=int, default=500, help='Total create requests (default: 500)')
+    parser.add_argument('--names', type=int, default=25, help='Distinct mod names; fewer means more collisions (default: 25)')
+    parser.add_argument('--threads', type=int, default=64, help='Concurrent clients (default: 64)')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory(prefix='pokegen-stress-') as scratch:
+        # mods/ inside the scratch directory, so the staging beside it is cleaned up too
+        mods_root = Path(scratch) / 'mods'
+        os.environ['POKEGEN_MODS_DIR'] = str(mods_root)
+        import app as webapp
+
+        client = webapp.app.test_client()
+        names = [f"Stress{i:03d}" for i in range(args.names)]
+
+        def create(index):
+            response = client.post('/api/create', json=request_for(index, names))
+            return response.status_code
+
+        print(f"Firing {args.requests} creates for {args.names} mods on {args.threads} threads...")
+        started = time.perf_counter()
+        with contextlib.redirect_stdout(io.StringIO()):
+            with ThreadPoolExecutor(max_workers=args.threads) as pool:
+                statuses = list(pool.map(create, range(args.requests)))
+        elapsed = time.perf_counter() - started
+
+        failures = len([s for s in statuses if s != 200])
+        mod_dirs = [d for d in mods_root.iterdir() if d.is_dir() and not d.name.startswith('.')]
+        problems = [p for d in mod_dirs for p in check_mod(d)]
+        staging = state_dir(mods_root) / 'staging'
+        leftovers = [p.name for p in staging.iterdir()] if staging.is_dir() else []
+
+        print(f"  {args.requests} requests in {elapsed:.2f}s ({args.requests / elapsed:.0f}/s)")
+        print(f"  Failed requests: {failures}")
+        print(f"  Mods on disk: {len(mod_dirs)}/{args.names}")
+        print(f"  Leftover staging dirs: {len(leftovers)}")
+        for problem in problems:
+            print(f"  ✗ {problem}")
+
+        ok = not failures and not problems and not leftovers and len(mod_dirs) == args.names
+        print("\n✓ Stress test PASSED" if ok else "\n✗ Stress test FAILED")
+        return ok
+
+
+if __name__ == '__main__':
+    sys.exit(0 if main() else 1)
@@ -0,0 +1,122 @@
+#!/usr/bin/env python3
+"""
+Web API Tests for PokeGen
+Sprite job events and cancellation, and batch mod creation, against an
+offline job queue and a temporary mods directory
+"""
+
+import json
+import threading
+
+import pytest
+
+import app as pokegen
+from job_queue import SpriteJobQueue
+
+
+class Steps:
+    """run_job stand-in that reports three steps once released"""
+
+    def __init__(self):
+        self.started = threading.Event()
+        self.release = threading.Event()
+
+    def __call__(self, generator, params, progress):
+        self.started.set()
+        self.release.wait(5)
+        for step in (1, 2, 3):
+            progress({'step': step, 'total': 3})
+        return {}
+
+
+@pytest.fixture
+def steps():
+    return Steps()
+
+
+@pytest.fixture
+def client(tmp_path, steps, monkeypatch):
+    queue = SpriteJobQueue(lambda: object(), steps)
+    monkeypatch.setitem(pokegen.app.config, 'MODS_DIR', tmp_path / "mods")
+    monkeypatch.setattr(pokegen, 'generator', None)
+    monkeypatch.setattr(pokegen, 'job_queue', queue)
+    yield pokegen.app.test_client()
+    steps.release.set()
+    queue.shutdown(timeout=5)
+
+
+def submit(client, seed=1):
+    response = client.post('/api/jobs', json={'prompt': 'a fire lizard', 'seed': seed})
+    assert response.status_code == 202
+    return response.get_json()['job']
+
+
+def sse_events(response):
+    """(id, event, data) for each server-sent event in a response"""
+    events = []
+    for block in response.get_data(as_text=True).strip().split('\n\n'):
+        fields = dict(line.split(': ', 1) for line in block.splitlines())
+        events.append((fields.get('id'), fields['event'], json.loads(fields['data'])))
+    return events
+
+
+def test_events_resume_after_last_event_id(client, steps):
+    job = submit(client)
+    steps.release.set()
+    pokegen.job_queue.wait(job['id'], timeout=5)
+
+    resumed = sse_events(client.get(f"/api/jobs/{job['id']}/events", headers={'Last-Event-ID': '2'}))
+    assert [(event_id, event) for event_id, event, _ in resumed] == [(None, 'status'), ('3', 'progress'),
+                                                                      (None, 'done')]
+
+    restarted = sse_events(client.get(f"/api/jobs/{job['id']}/events", headers={'Last-Event-ID': 'junk'}))
+    assert [event_id for event_id, event, _ in restarted if event == 'progress'] == ['1', '2', '3']
+
+    assert client.get('/api/jobs/missing/events').status_code == 404
+
+
+def test_shared_job_needs_each_subscribers_ticket(client, steps):
+    first = submit(client, seed=5)
+    second = submit(client, seed=5)
+    assert second['coalesced'] and steps.started.wait(5)
+    url = f"/api/jobs/{first['id']}"
+
+    assert client.delete(url).status_code == 403
+    assert client.delete(f"{url}?ticket={first['ticket']}").status_code == 200
+    assert client.delete(f"{url}?ticket={first['ticket']}").status_code == 403
+    assert client.get(url).get_json()['job']['status'] == 'running'
+
+    assert client.delete(f"{url}?ticket={second['ticket']}").status_code == 200
+    steps.release.set()
+    assert pokegen.job_queue.wait(first['id'], timeout=5)['status'] == 'cancelled'
+    assert client.delete(url).status_code == 409
+    assert client.delete('/api/jobs/missing').status_code == 404
+
+
+def batch(client, body):
+    return client.post('/api/create-batch', data=body, content_type='application/json')
+
+
+def test_batch_rejects_invalid_input_before_writing(client, tmp_path):
+    mods = [{'name': f'Batchmon{n}', 'dex': 3100 + n, 'type1': 'fire'} for n in range(2)]
+
+    trailing = batch(client, json.dumps(mods) + ' {"name": "Extra"}')
+    assert trailing.status_code == 400 and 'after the JSON array' in trailing.get_json()['error']
+
+    duplicate = batch(client, json.dumps(mods + [{'name': 'Batchmon9', 'dex': 3100, 'type1': 'fire'}]))
+    assert duplicate.status_code == 400
+    assert duplicate.get_json()['errors'][0]['index'] == 2
+
+    assert not any((tmp_path / "mods").glob('Batchmon*'))
+
+
+def test_batch_streams_one_line_per_mod(client, tmp_path):
+    mods = [{'name': f'Batchmon{n}', 'dex': 3100 + n, 'type1': 'fire'} for n in range(3)]
+
+    response = batch(client, json.dumps(mods))
+    lines = [json.loads(line) for line in response.get_data(as_text=True).splitlines()]
+
+    assert sorted(line['index'] for line in lines[:-1]) == [0, 1, 2]
+    assert all(line['success'] for line in lines[:-1])
+    assert lines[-1] == {'done': True, 'count': 3, 'created': 3, 'failed': 0}
+    assert sorted(path.name for path in (tmp_path / "mods").iterdir()) == ['Batchmon0', 'Batchmon1', 'Batchmon2']
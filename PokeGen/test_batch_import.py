@@ -0,0 +1,85 @@
+#!/usr/bin/env python3
+"""
+Batch Import Tests for PokeGen
+Streaming JSON readers, validation spooling and the bounded runner
+"""
+
+import io
+import json
+import threading
+
+import pytest
+
+import batch_import
+from batch_import import iter_json_array, iter_ndjson, run_bounded, spool_validated
+
+
+def read_array(data: bytes):
+    return list(iter_json_array(io.BytesIO(data)))
+
+
+def test_json_array_yields_elements():
+    assert read_array(b' [ {"a": 1}, 2 , "x", [3] ] \n') == [{'a': 1}, 2, 'x', [3]]
+    assert read_array(b'[]') == []
+
+
+def test_json_array_values_split_across_chunks(monkeypatch):
+    monkeypatch.setattr(batch_import, 'CHUNK_SIZE', 3)
+    items = [{'name': 'Pikachu', 'dex': 25}, 12345678, 'é' * 5, None]
+
+    assert read_array(json.dumps(items).encode('utf-8')) == items
+
+
+@pytest.mark.parametrize('data', [
+    b'{"a": 1}',
+    b'[1, 2',
+    b'[1 2]',
+    b'[1,]',
+    b'[1] trailing',
+    b'[] []',
+])
+def test_json_array_rejects_malformed_input(data):
+    with pytest.raises(ValueError):
+        read_array(data)
+
+
+def test_ndjson_skips_blank_lines_and_numbers_errors():
+    assert list(iter_ndjson(io.BytesIO(b'{"a": 1}\n\n2\n'))) == [{'a': 1}, 2]
+
+    with pytest.raises(ValueError, match='Line 2'):
+        list(iter_ndjson(io.BytesIO(b'1\n{oops\n')))
+
+
+def test_spool_validated_collects_errors():
+    def validate(item):
+        if item < 0:
+            raise ValueError(f"negative: {item}")
+        return {'n': item}
+
+    spool, count, errors = spool_validated(iter([1, -2, 3, -4, -5]), validate, max_errors=2)
+    with spool:
+        assert [json.loads(line) for line in spool] == [{'n': 1}, {'n': 3}]
+    assert count == 5
+    assert errors == [{'index': 1, 'error': 'negative: -2'},
+                      {'index': 4, 'error': 'Too many errors; stopped listing them'}]
+
+
+def test_run_bounded_limits_entries_in_flight():
+    lock = threading.Lock()
+    active = 0
+    peak = 0
+
+    def work(entry):
+        nonlocal active, peak
+        with lock:
+            active += 1
+            peak = max(peak, active)
+        threading.Event().wait(0.01)
+        with lock:
+            active -= 1
+        return {'value': entry['n'] * 2}
+
+    results = list(run_bounded(({'n': n} for n in range(20)), work, parallelism=3))
+
+    assert peak <= 3
+    assert sorted((result['index'], result['value']) for result in results) == [(n, n * 2) for n in range(20)]
@@ -0,0 +1,80 @@
+#!/usr/bin/env python3
+"""
+Damage Engine Tests for PokeGen
+Stat and damage formulas checked by hand, and balance reports over the shipped data
+"""
+
+from pathlib import Path
+
+import numpy as np
+import pytest
+
+from damage_engine import DamageEngine, TYPE_INDEX, stats_at_level
+from pokemon_mod_generator import PokemonStats
+from species_table import SpeciesData
+
+
+DATA_DIR = Path(__file__).parent.parent / "pokemon"
+
+
+@pytest.fixture(scope='module')
+def engine(tmp_path_factory):
+    table = tmp_path_factory.mktemp('species') / "species_table.bin"
+    engine = DamageEngine(DATA_DIR, species_data=SpeciesData(DATA_DIR, table))
+    engine._ensure_loaded()
+    return engine
+
+
+def types(*names):
+    return np.array([[TYPE_INDEX[name] for name in pair] for pair in names], dtype=np.intp)
+
+
+def test_stats_at_level():
+    assert stats_at_level([100, 100, 100, 100, 100, 100], 50).tolist() == [175, 120, 120, 120, 120, 120]
+    assert stats_at_level([[1, 5, 5, 5, 5, 5]], 100).tolist() == [[142, 45, 45, 45, 45, 45]]
+
+
+def test_base_stats_columns(engine):
+    abra = engine.species_index['abra']
+    # base_stats/*.asm lists hp atk def spd sat sdf
+    assert engine.base_stats[abra].tolist() == [25, 20, 15, 105, 55, 90]
+    assert engine.types[abra].tolist() == [TYPE_INDEX['PSYCHIC']] * 2
+
+
+def test_damage_ranges_match_the_formula(engine):
+    attacker = np.array([[150, 100, 80, 120, 80, 80]])
+    defenders = np.array([[150, 80, 80, 80, 100, 80]] * 2)
+    moves = np.array([engine.move_index[m] for m in ('FLAMETHROWER', 'TACKLE', 'SONICBOOM', 'DOUBLESLAP')])
+
+    low, high = engine.damage_ranges(attacker, types(('FIRE', 'FIRE')), defenders,
+                                     types(('GRASS', 'GRASS'), ('GHOST', 'GHOST')), moves)
+
+    # Flamethrower: special, STAB, super effective on grass; normal moves can't touch ghosts
+    assert high[0, 0].tolist() == [156, 21, 20, 50]
+    assert low[0, 0].tolist() == [132, 17, 20, 16]
+    assert high[0, 1].tolist() == [78, 0, 0, 0]
+
+
+def test_balance_report(engine):
+    stats = PokemonStats(hp=80, attack=100, defense=70, sp_atk=60, sp_def=70, speed=90)
+
+    report = engine.balance_report(stats, 'FIRE', 'FLYING', moves=['FLAMETHROWER'], top=3)
+
+    assert report['stat_total'] == 470 and report['species'] == len(engine.species)
+    assert report['weak_to']['ROCK'] == 4.0 and report['resists']['GRASS'] == 0.25
+    assert 'GROUND' in report['resists']
+    assert all(entry['move'] == 'FLAMETHROWER' for entry in report['ohkos']['top'])
+    assert len(report['ohko_by']['top']) <= 3
+
+    with pytest.raises(ValueError):
+        engine.balance_report(stats, 'FIRE', moves=['NOT_A_MOVE'])
+    with pytest.raises(ValueError):
+        engine.balance_report(stats, 'PLASMA')
+
+
+def test_matchup_matrix_uses_learned_moves(engine):
+    best = engine.matchup_matrix()
+    magikarp = engine.species_index['magikarp']
+
+    assert best.shape == (len(engine.species),) * 2
+    assert best[magikarp].max() < 0.5
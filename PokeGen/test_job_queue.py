@@ -0,0 +1,138 @@
+#!/usr/bin/env python3
+"""
+Job Queue Tests for PokeGen
+Ordering, coalescing and per-ticket cancellation of SpriteJobQueue
+"""
+
+import threading
+
+import pytest
+
+from job_queue import CANCELLED, DONE, FAILED, QueueFull, SpriteJobQueue
+
+
+class Gate:
+    """run_job stand-in that blocks each job until released"""
+
+    def __init__(self):
+        self.started = threading.Event()
+        self.release = threading.Event()
+        self.ran = []
+
+    def __call__(self, generator, params, progress):
+        self.ran.append(params['n'])
+        self.started.set()
+        progress({'step': 1, 'total': 2})
+        self.release.wait(5)
+        progress({'step': 2, 'total': 2})
+        return {'n': params['n']}
+
+
+@pytest.fixture
+def gate():
+    return Gate()
+
+
+@pytest.fixture
+def queue(gate):
+    queue = SpriteJobQueue(lambda: object(), gate, max_queued=2)
+    yield queue
+    gate.release.set()
+    queue.shutdown(timeout=5)
+
+
+def test_jobs_run_in_submission_order(queue, gate):
+    first = queue.submit({'n': 1})
+    second = queue.submit({'n': 2})
+    gate.release.set()
+
+    assert queue.wait(first['id'], timeout=5, include_result=True)['result'] == {'n': 1}
+    assert queue.wait(second['id'], timeout=5)['status'] == DONE
+    assert gate.ran == [1, 2]
+
+
+def test_full_queue_rejects_submit(queue, gate):
+    queue.submit({'n': 1})
+    assert gate.started.wait(5)
+    queue.submit({'n': 2})
+    queue.submit({'n': 3})
+
+    with pytest.raises(QueueFull):
+        queue.submit({'n': 4})
+    assert queue.stats()['rejected'] == 1
+
+
+def test_matching_key_joins_inflight_job(queue, gate):
+    first = queue.submit({'n': 1}, key='same')
+    second = queue.submit({'n': 1}, key='same')
+
+    assert second['coalesced'] and second['id'] == first['id']
+    assert second['ticket'] != first['ticket']
+    assert queue.status(first['id'])['subscribers'] == 2
+
+    gate.release.set()
+    queue.wait(first['id'], timeout=5)
+    assert gate.ran == [1]
+    assert not queue.submit({'n': 1}, key='same')['coalesced']
+
+
+def test_coalesced_job_runs_until_every_ticket_cancels(queue, gate):
+    first = queue.submit({'n': 1}, key='same')
+    queue.submit({'n': 1}, key='same')
+    assert gate.started.wait(5)
+
+    # A shared job can't be cancelled without a ticket, and each ticket counts once
+    assert not queue.cancel(first['id'])
+    assert queue.cancel(first['id'], first['ticket'])
+    assert not queue.cancel(first['id'], first['ticket'])
+    gate.release.set()
+
+    assert queue.wait(first['id'], timeout=5)['status'] == DONE
+
+
+def test_cancel_running_job_stops_at_next_progress(queue, gate):
+    job = queue.submit({'n': 1})
+    assert gate.started.wait(5)
+
+    assert queue.cancel(job['id'], job['ticket'])
+    gate.release.set()
+
+    assert queue.wait(job['id'], timeout=5)['status'] == CANCELLED
+    assert queue.result(job['id']) is None
+
+
+def test_cancel_queued_job_removes_it(queue, gate):
+    queue.submit({'n': 1})
+    assert gate.started.wait(5)
+    waiting = queue.submit({'n': 2})
+
+    assert queue.cancel(waiting['id'])
+    assert queue.status(waiting['id'])['status'] == CANCELLED
+    assert queue.stats()['queued'] == 0
+    assert not queue.cancel(waiting['id'])
+
+
+def test_failed_job_reports_error():
+    def explode(generator, params, progress):
+        raise ValueError("boom")
+
+    queue = SpriteJobQueue(lambda: object(), explode)
+    try:
+        job = queue.submit({})
+        info = queue.wait(job['id'], timeout=5, include_result=True)
+        assert info['status'] == FAILED and info['error'] == 'boom'
+        assert 'result' not in info
+    finally:
+        queue.shutdown(timeout=5)
+
+
+def test_events_resume_after_seen_count(queue, gate):
+    job = queue.submit({'n': 1})
+    first = queue.events(job['id'], since=0, timeout=5)
+    assert [event['step'] for event in first['events']] == [1]
+
+    gate.release.set()
+    queue.wait(job['id'], timeout=5)
+    rest = queue.events(job['id'], since=len(first['events']), timeout=5)
+    assert [event['step'] for event in rest['events']] == [2]
+    assert rest['job']['status'] == DONE
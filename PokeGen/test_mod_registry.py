@@ -0,0 +1,126 @@
+#!/usr/bin/env python3
+"""
+Mod Registry Tests for PokeGen
+Dex collisions under concurrency, journal replay and compaction, allocation
+"""
+
+import threading
+
+import pytest
+
+import mod_registry
+from mod_registry import DexCollision, ModRegistry
+
+
+def write_mod(mods_dir, name, dex, source_sprite=None):
+    mod_dir = mods_dir / name
+    mod_dir.mkdir(parents=True)
+    config = f"[pokemon]\nname = {name}\ndex_number = {dex}\ntype1 = fire\ntype2 = none\n"
+    if source_sprite:
+        config += f"[graphics]\nsource_sprite = {source_sprite}\n"
+    (mod_dir / "pokemon.cfg").write_text(config)
+
+
+@pytest.fixture
+def mods_dir(tmp_path):
+    return tmp_path / "mods"
+
+
+def registry(mods_dir):
+    return ModRegistry(mods_dir, check_interval=0)
+
+
+def test_existing_mods_are_indexed_once(mods_dir):
+    write_mod(mods_dir, 'Emberling', 900, source_sprite='ember_seed7_96.png')
+    write_mod(mods_dir, 'Cindra', 901)
+
+    first = registry(mods_dir)
+    assert len(first) == 2
+    assert first.get('emberling').type2 is None
+    assert first.sprite_references() == {'ember_seed7'}
+
+    write_mod(mods_dir, 'Unindexed', 902)
+    assert len(registry(mods_dir)) == 2
+    assert registry(mods_dir).rebuild() == 3
+
+
+def test_claim_rejects_taken_dex(mods_dir):
+    reg = registry(mods_dir)
+    reg.claim('A', 5, 'fire', None)
+    reg.claim('A', 5, 'water', None)  # re-creating a mod keeps its own number
+
+    with pytest.raises(DexCollision) as error:
+        reg.claim('B', 5, 'fire', None)
+    assert error.value.holder == 'mod A' and error.value.next_free == 1
+
+    reg.claim('B', 5, 'fire', None, allow_collision=True)
+    assert reg.collisions() == {5: ['A', 'B']}
+
+
+def test_concurrent_claims_take_a_number_once(mods_dir):
+    # One registry per thread, like separate serve.py worker processes
+    barrier = threading.Barrier(8)
+    winners = []
+
+    def claim(n):
+        reg = registry(mods_dir)
+        barrier.wait()
+        try:
+            reg.claim(f'Mod{n}', 42, 'fire', None)
+            winners.append(n)
+        except DexCollision:
+            pass
+
+    threads = [threading.Thread(target=claim, args=(n,)) for n in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert len(winners) == 1
+    assert registry(mods_dir).holder(42) == f'mod Mod{winners[0]}'
+
+
+def test_other_instances_replay_the_journal(mods_dir, monkeypatch):
+    monkeypatch.setattr(mod_registry, 'COMPACT_AFTER', 5)
+    writer = registry(mods_dir)
+    reader = registry(mods_dir)
+    assert len(reader) == 0
+
+    previous = writer.claim('Temp', 7, 'fire', None)
+    assert reader.get('temp').dex == 7
+    writer.release('Temp', previous)
+    assert reader.get('temp') is None
+
+    for n in range(12):  # more lines than the index holds: folded into registry.json
+        writer.claim(f'Mod{n}', 100 + n, 'fire', None)
+    assert len(writer.journal_path.read_bytes().splitlines()) < 14
+    assert 'Mod0' in writer.path.read_text()
+    assert len(reader) == 12
+    assert len(registry(mods_dir)) == 12
+
+
+def test_record_stores_hash_and_source_sprite(mods_dir):
+    reg = registry(mods_dir)
+    reg.claim('Sprout', 300, 'grass', None)
+    assert reg.get('sprout').content_hash is None
+
+    write_mod(mods_dir, 'Sprout', 300, source_sprite='leafy_512.png')
+    entry = reg.record('Sprout')
+
+    assert entry.content_hash == mod_registry.content_hash(mods_dir / 'Sprout')
+    assert reg.sprite_references() == {'leafy'}
+
+
+def test_next_free_dex_skips_taken_and_reuses_freed(mods_dir):
+    reg = registry(mods_dir)
+    for dex in (1, 2, 3):
+        reg.claim(f'Mod{dex}', dex, 'fire', None)
+    assert reg.next_free_dex() == 4
+
+    reg.release('Mod2', None)
+    assert reg.next_free_dex() == 2
+
+    reg.claim('Again', 2, 'fire', None)
+    reg.claim('Moved', 9, 'fire', None)
+    assert reg.next_free_dex() == 4
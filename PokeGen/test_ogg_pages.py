@@ -0,0 +1,150 @@
+#!/usr/bin/env python3
+"""
+Ogg Page Tests for PokeGen
+Page parsing, checksums and durations, and seeking and clipping in music_index
+"""
+
+import io
+import struct
+from pathlib import Path
+
+import pytest
+
+from music_index import MusicIndex, index_track
+from ogg_pages import (CRC_OFFSET, LAST_PAGE, NO_GRANULE, PAGE_HEADER, OggError, duration,
+                       iter_pages, page_checksum, parse_page, read_page, restamp_page, stream_info)
+
+
+GAME_DIR = Path(__file__).parent.parent
+SAMPLE_RATE = 22050
+PAGE_SAMPLES = 1000
+
+
+def page(body: bytes, granule: int, sequence: int, flags: int = 0, packets_end: bool = True) -> bytes:
+    """One Ogg page holding body; its last packet ends on the page unless packets_end is False"""
+    lacing = [255] * (len(body) // 255) + ([len(body) % 255] if packets_end else [])
+    header = PAGE_HEADER.pack(b'OggS', 0, flags, granule, 7, sequence, 0, len(lacing)) + bytes(lacing)
+    return restamp_page(header + body, granule, sequence, flags)
+
+
+def ogg_file(audio_pages: int = 10, tags=()) -> bytes:
+    """A Vorbis-like stream: identification, comment and setup headers, then audio pages"""
+    identification = struct.pack('<7sIBI', b'\x01vorbis', 0, 1, SAMPLE_RATE) + bytes(16)
+    comments = [f"{key}={value}".encode() for key, value in tags]
+    comment = (b'\x03vorbis' + struct.pack('<I', 4) + b'test' + struct.pack('<I', len(comments))
+               + b''.join(struct.pack('<I', len(c)) + c for c in comments))
+    setup = b'\x05vorbis' + bytes(20)
+    data = page(identification, 0, 0, flags=0x02)
+    # Comment and setup packets share the second page
+    data += restamp_page(PAGE_HEADER.pack(b'OggS', 0, 0, 0, 7, 1, 0, 2) + bytes([len(comment), len(setup)])
+                         + comment + setup, 0, 1, 0)
+    for n in range(audio_pages):
+        flags = LAST_PAGE if n == audio_pages - 1 else 0
+        data += page(bytes([n]) * 100, (n + 1) * PAGE_SAMPLES, n + 2, flags)
+    return data
+
+
+def pages(data: bytes):
+    return list(iter_pages(io.BytesIO(data)))
+
+
+def test_parse_page_needs_a_whole_header():
+    data = ogg_file()
+    first = parse_page(data)
+    assert first.granule == 0 and first.serial == 7 and first.sequence == 0
+    assert parse_page(data[:20]) is None
+    assert parse_page(b'xxxx' + data[4:]) is None
+
+
+def test_page_checksum_matches_game_files():
+    cries = sorted((GAME_DIR / "pokemon" / "cries").glob('*.ogg'))[:5]
+    if not cries:
+        pytest.skip("no game cries to read")
+    for path in cries:
+        data = path.read_bytes()
+        for info in pages(data):
+            raw = data[info.offset:info.end]
+            assert page_checksum(raw) == struct.unpack_from('<I', raw, CRC_OFFSET)[0]
+
+
+def test_restamp_page_rewrites_header_fields():
+    data = ogg_file()
+    audio = pages(data)[2]
+    raw = data[audio.offset:audio.end]
+
+    stamped = restamp_page(raw, 123, 9, LAST_PAGE)
+    info = parse_page(stamped)
+
+    assert (info.granule, info.sequence, info.flags) == (123, 9, LAST_PAGE)
+    assert stamped[PAGE_HEADER.size:] == raw[PAGE_HEADER.size:]
+    assert page_checksum(stamped) == struct.unpack_from('<I', stamped, CRC_OFFSET)[0]
+
+
+def test_stream_info_and_duration(tmp_path):
+    path = tmp_path / 'track.ogg'
+    path.write_bytes(ogg_file(audio_pages=10))
+    with open(path, 'rb') as f:
+        info = stream_info(f)
+    assert (info.codec, info.channels, info.sample_rate) == ('vorbis', 1, SAMPLE_RATE)
+    assert duration(path) == pytest.approx(10 * PAGE_SAMPLES / SAMPLE_RATE)
+
+    path.write_bytes(b'not an ogg file')
+    with pytest.raises(OggError):
+        duration(path)
+
+
+def test_read_page_rejects_garbage():
+    with pytest.raises(OggError):
+        read_page(io.BytesIO(bytes(64)), 0)
+    assert read_page(io.BytesIO(b''), 0) is None
+
+
+def test_index_track_reads_tags_and_seek_table(tmp_path):
+    path = tmp_path / 'route.ogg'
+    path.write_bytes(ogg_file(tags=[('LOOPSTART', 2000), ('LOOPLENGTH', 5000)]))
+
+    entry = index_track(path)
+
+    assert entry['samples'] == 10 * PAGE_SAMPLES
+    assert entry['tag_loop'] == [2000, 7000]
+    assert entry['granules'] == [PAGE_SAMPLES] * 10
+    assert entry['header_end'] == pages(path.read_bytes())[2].offset
+
+
+@pytest.fixture
+def music(tmp_path):
+    (tmp_path / 'route.ogg').write_bytes(ogg_file(audio_pages=10))
+    return MusicIndex(tmp_path, index_path=None)
+
+
+def test_stream_without_cut_copies_the_file(music, tmp_path):
+    data = b''.join(music.open('route', chunk_size=256))
+    assert data == (tmp_path / 'route.ogg').read_bytes()
+
+
+def test_clip_is_rebased_and_ends_the_stream(music):
+    stream = music.open('route', at=3500 / SAMPLE_RATE, end=6500 / SAMPLE_RATE, chunk_size=256)
+    data = b''.join(stream)
+    clip = pages(data)
+
+    assert stream.start_sample == 2000  # one page before the one holding the target
+    audio = clip[2:]
+    assert [p.granule for p in audio] == [1000, 2000, 3000, 4000, 5000]
+    assert [p.sequence for p in clip] == list(range(len(clip)))
+    assert [bool(p.flags & LAST_PAGE) for p in audio] == [False] * 4 + [True]
+    for info in clip:
+        raw = data[info.offset:info.end]
+        assert page_checksum(raw) == struct.unpack_from('<I', raw, CRC_OFFSET)[0]
+
+
+def test_clip_keeps_pages_without_a_granule(tmp_path):
+    data = ogg_file(audio_pages=3)
+    last = pages(data)[-1]
+    # A page on which no packet ends, inserted before the last audio page
+    continued = page(b'\x00' * 255, NO_GRANULE, 0, packets_end=False)
+    (tmp_path / 'odd.ogg').write_bytes(data[:last.offset] + continued + data[last.offset:])
+
+    clip = pages(b''.join(MusicIndex(tmp_path, index_path=None).open('odd', at=0.0)))
+
+    assert [p.granule for p in clip[2:]] == [1000, 2000, NO_GRANULE, 3000]
+    assert [p.sequence for p in clip] == list(range(len(clip)))
@@ -0,0 +1,86 @@
+#!/usr/bin/env python3
+"""
+Retention Tests for PokeGen
+Budget eviction order, batching, and sprites kept for the mods built from them
+"""
+
+import io
+
+import pytest
+from PIL import Image
+
+from mod_registry import ModRegistry
+from retention import RetentionManager
+from sprite_store import SpriteStore
+
+
+def png(size: int) -> bytes:
+    buffer = io.BytesIO()
+    Image.new('RGBA', (size, size), (0, 0, 255, 255)).save(buffer, format='PNG')
+    return buffer.getvalue()
+
+
+def write_mod(mods_dir, name, source_sprite):
+    mod_dir = mods_dir / name
+    mod_dir.mkdir(parents=True)
+    (mod_dir / "pokemon.cfg").write_text(
+        f"[pokemon]\nname = {name}\ndex_number = 500\ntype1 = WATER\n\n"
+        f"[graphics]\nsource_sprite = {source_sprite}\n")
+
+
+@pytest.fixture
+def store(tmp_path):
+    store = SpriteStore(tmp_path / "generated_sprites")
+    for name in ('a', 'b', 'c', 'd'):
+        store.save(name, {16: png(16)})
+    store.flush()
+    yield store
+    store.close()
+
+
+def sprite_size(store):
+    return store.total_bytes() // 4
+
+
+def test_evicts_least_recently_used_down_to_budget(store, tmp_path):
+    store.touch('a')
+    manager = RetentionManager(store, tmp_path / "mods", budget_bytes=2 * sprite_size(store), grace=0)
+
+    result = manager.run_pass()
+
+    assert result['evicted'] == ['b', 'c']
+    assert result['total_bytes'] <= manager.budget_bytes
+    assert [entry['name'] for entry in store.least_recently_used()] == ['d', 'a']
+    assert manager.report()['evicted'] == 2
+
+
+def test_dry_run_and_batches(store, tmp_path):
+    manager = RetentionManager(store, tmp_path / "mods", budget_bytes=1, batch=2, grace=0)
+
+    assert manager.run_pass(dry_run=True)['evicted'] == ['a', 'b']
+    assert store.total_bytes() == 4 * sprite_size(store)
+
+    first = manager.run_pass()
+    assert first['more'] and first['evicted'] == ['a', 'b']
+    assert manager.run_pass()['evicted'] == ['c', 'd']
+
+
+def test_grace_keeps_recent_sprites(store, tmp_path):
+    manager = RetentionManager(store, tmp_path / "mods", budget_bytes=1, grace=600)
+    assert manager.run_pass()['evicted'] == []
+
+
+def test_keeps_sprites_mods_were_built_from(store, tmp_path):
+    mods_dir = tmp_path / "mods"
+    write_mod(mods_dir, 'Aqua', 'a_16.png')
+    ModRegistry(mods_dir).rebuild()
+    write_mod(mods_dir, 'Pinned', 'b_16.png')
+    store.pin('b', 'Pinned')
+    store.pin('c', 'Gone')
+    manager = RetentionManager(store, mods_dir, budget_bytes=1, grace=0)
+
+    result = manager.run_pass()
+
+    assert result['evicted'] == ['c', 'd']
+    assert result['kept_pinned'] == 2
+    assert store.get('a') is not None and store.get('b')['pins'] == {'Pinned'}
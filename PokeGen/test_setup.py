@@ -4,6 +4,7 @@ PokeGen Setup Test
 Verifies that all components are installed and working
 """
 
+import importlib.util
 import sys
 from pathlib import Path
 
@@ -37,10 +38,10 @@ def test_imports():
     print("\nOptional packages (for AI sprite generation):")
     missing_optional = []
     for package, name in optional.items():
-        try:
-            __import__(package)
+        # Probe without importing: importing torch alone takes seconds
+        if importlib.util.find_spec(package) is not None:
             print(f"  ✓ {name}")
-        except ImportError:
+        else:
             print(f"  ⊘ {name} - not installed")
             missing_optional.append(package)
     
@@ -108,7 +109,7 @@ def main():
     print("\n" + "=" * 60)
     print("\nNext steps:")
     print("  1. Web UI:  ./start-web-app.sh")
-    print("  2. CLI:     ./create-pokemon.sh MyPokemon 888 FIRE")
+    print("  2. CLI:     ./create-pokemon.sh MyPokemon 901 FIRE")
     print("\nRead README.md for more information.")
     print("=" * 60 + "\n")
     
@@ -0,0 +1,64 @@
+#!/usr/bin/env python3
+"""
+Species Table Tests for PokeGen
+Compiling the flat species files, lookups in the mapped table, and rebuilds
+"""
+
+import pytest
+
+from species_table import SpeciesData, SpeciesTable, compile_table, name_key
+
+
+@pytest.fixture
+def data_dir(tmp_path):
+    data = tmp_path / "pokemon"
+    data.mkdir()
+    (data / "pokemon_to_index.txt").write_bytes("Bulbasaur\nFarfetch\x92d\n\nbulbasaur\nMr. Mime\n".encode('latin-1'))
+    (data / "pokemon_weights_kg.txt").write_text("1\t6.9\n2\t15\n2\t16\n9\t1\nbad line here\n")
+    (data / "spec_phys_lookup.txt").write_text("TACKLE,PHYSICAL\nEMBER,SPECIAL\nEMBER,PHYSICAL\nGROWL\n")
+    (data / "pokemon_overworld_adjustments.asm").write_text(
+        "Bulbasaur:\n db i, 12\n db found, true\n db flip, false\n\nMissingno:\n db i, 1\n db found, true\n db flip, true\n")
+    return data
+
+
+def test_compiled_lookups(data_dir, tmp_path):
+    compile_table(data_dir, tmp_path / "species.bin")
+    table = SpeciesTable(tmp_path / "species.bin")
+
+    bulbasaur = table.by_dex(1)
+    assert (bulbasaur.name, bulbasaur.weight_kg, bulbasaur.overworld_index) == ('Bulbasaur', 6.9, 12)
+    assert bulbasaur.overworld_found and not bulbasaur.overworld_flip
+    assert table.by_name("FARFETCH'D").dex == 2 and table.by_dex(2).weight_rows == 2
+    assert table.by_name('mr mime').weight_kg is None
+    assert table.by_dex(3) is None and table.by_dex(99) is None and table.by_name('Pikachu') is None
+
+    assert table.move_category('ember') == 'SPECIAL'
+    assert table.move_category('Tackle') == 'PHYSICAL'
+    assert table.move_category('Growl') is None
+
+
+def test_problems_are_reported(data_dir, tmp_path):
+    report = compile_table(data_dir, tmp_path / "species.bin")
+
+    kinds = sorted(problem['kind'] for problem in report['problems'])
+    assert kinds == ['blank', 'conflicting_category', 'duplicate_name', 'duplicate_weight', 'malformed',
+                     'malformed', 'unknown_dex', 'unknown_species']
+    assert report['counts'] == {'species': 3, 'weights': 2, 'moves': 2, 'overworld': 1}
+
+
+def test_name_key_ignores_case_accents_and_punctuation():
+    assert name_key('Farfetch’d') == name_key("farfetch'd") == 'farfetchd'
+    assert name_key('Flabébé') == 'flabebe'
+
+
+def test_species_data_recompiles_when_a_source_changes(data_dir, tmp_path):
+    data = SpeciesData(data_dir, tmp_path / "species.bin", check_interval=0)
+    assert data.table().by_dex(4) is None
+
+    with open(data_dir / "pokemon_to_index.txt", 'ab') as names:
+        names.write(b"Charmander\n")
+    assert data.table().by_dex(6).name == 'Charmander'
+
+    (tmp_path / "junk.bin").write_bytes(b'not a table' * 10)
+    with pytest.raises(ValueError):
+        SpeciesTable(tmp_path / "junk.bin")
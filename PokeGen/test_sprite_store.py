@@ -0,0 +1,106 @@
+#!/usr/bin/env python3
+"""
+Sprite Store Tests for PokeGen
+Write-behind saving, cross-process index reads, paging and deletion
+"""
+
+import io
+import threading
+
+import pytest
+from PIL import Image
+
+from sprite_store import SpriteStore
+
+
+def png(size: int) -> bytes:
+    buffer = io.BytesIO()
+    Image.new('RGBA', (size, size), (255, 0, 0, 255)).save(buffer, format='PNG')
+    return buffer.getvalue()
+
+
+@pytest.fixture
+def store(tmp_path):
+    store = SpriteStore(tmp_path)
+    yield store
+    store.close()
+
+
+def test_save_returns_before_write_and_get_waits_for_it(store):
+    release = threading.Event()
+    write = store._write
+
+    def slow_write(*args):
+        release.wait(5)
+        write(*args)
+
+    store._write = slow_write
+    paths = store.save('bulba', {96: png(96), 16: png(16)}, {'seed': 7})
+
+    assert not paths[96].exists()
+    assert store.exists('bulba')
+    threading.Timer(0.05, release.set).start()
+
+    entry = store.get('bulba')
+    assert entry['seed'] == 7 and entry['thumb_etag']
+    assert paths[96].read_bytes() == png(96)
+    assert store.thumb_path('bulba').exists()
+
+
+def test_other_instance_follows_the_index(store, tmp_path):
+    other = SpriteStore(tmp_path)
+    assert other.get('charm') is None
+
+    store.save('charm', {16: png(16)})
+    assert other.wait_saved('charm', timeout=5)
+    assert other.exists('charm')
+    assert not other.wait_saved('missing', timeout=0.1)
+
+
+def test_page_walks_newest_first(store):
+    for n in range(5):
+        store.save(f's{n}', {16: png(16)})
+    store.flush()
+
+    first, cursor = store.page(limit=2)
+    second, cursor = store.page(limit=2, cursor=cursor)
+    last, cursor = store.page(limit=2, cursor=cursor)
+
+    assert [entry['name'] for entry in first + second + last] == ['s4', 's3', 's2', 's1', 's0']
+    assert cursor is None
+
+
+def test_delete_and_pins(store):
+    store.save('squirt', {96: png(96), 16: png(16)})
+    store.flush()
+    total = store.total_bytes()
+
+    store.pin('squirt', 'MyMod')
+    assert store.get('squirt')['pins'] == {'MyMod'}
+    store.unpin('squirt', 'MyMod')
+    assert store.get('squirt')['pins'] == set()
+
+    assert store.delete('squirt') == total
+    assert store.get('squirt') is None and store.total_bytes() == 0
+    assert not store.path('squirt', 96).exists() and not store.thumb_path('squirt').exists()
+
+
+def test_touch_reorders_least_recently_used(store):
+    for name in ('a', 'b', 'c'):
+        store.save(name, {16: png(16)})
+    store.flush()
+
+    store.touch('a')
+    store.flush_touches()
+
+    assert [entry['name'] for entry in store.least_recently_used()] == ['b', 'c', 'a']
+
+
+def test_existing_sprites_are_indexed_once(tmp_path):
+    (tmp_path / 'old_96.png').write_bytes(png(96))
+    (tmp_path / 'old_16.png').write_bytes(png(16))
+
+    entry = SpriteStore(tmp_path).get('old')
+
+    assert entry['bytes'] == {'96': len(png(96)), '16': len(png(16))}
+    assert SpriteStore(tmp_path).page()[0] == [entry]
@@ -0,0 +1,339 @@
+#!/usr/bin/env python3
+"""
+Watch Mode for PokeGen
+Polls attack frames, mods and cries for changes and re-runs only the derived
+steps of the directories that changed
+"""
+
+import argparse
+import glob
+import importlib.util
+import logging
+import math
+import os
+import time
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Callable, Dict, Iterable, List, Optional, Set, Tuple
+
+from audio_bundle import build_bundle
+from cry_lengths import index_lengths
+from metrics import configure_logging, log_event, phase
+from mod_registry import ModRegistry
+from profiling import add_profile_argument, profiled
+from species_table import SpeciesData
+
+
+GAME_DIR = Path(__file__).parent.parent
+FRAME_SCRIPT = GAME_DIR / "Script-Directory" / "Invisible-Frame-Finder-Metadata-Updater.py"
+
+# Files our own steps write atomically, never worth reacting to
+IGNORED_SUFFIXES = ('.part', '.tmp')
+
+FileStat = Tuple[int, int]  # size, mtime_ns
+
+
+@dataclass
+class _Directory:
+    """What one watched directory held at its last scan"""
+    mtime_ns: int
+    files: Dict[str, FileStat] = field(default_factory=dict)
+    subdirs: Set[str] = field(default_factory=set)
+
+
+def watched_directory(relative: str) -> bool:
+    """
+    Whether a directory (relative to the game, '/'-separated) is watched
+
+    attacks/, each attack and its output/ frames; mods/ and everything in it
+    except dot entries; pokemon/cries/.
+    """
+    parts = relative.split('/')
+    if parts[0] == 'attacks':
+        return len(parts) <= 2 or (len(parts) == 3 and parts[2] == 'output')
+    if parts[0] == 'mods':
+        return not any(part.startswith('.') for part in parts)
+    return relative == 'pokemon/cries'
+
+
+def route(path: str) -> Optional[Tuple[str, str]]:
+    """
+    The step a changed file triggers, as (step, key), or None
+
+    Keys name what to redo: an attack, a mod or a directory of cries.
+    """
+    if path.endswith(IGNORED_SUFFIXES):
+        return None
+    parts = path.split('/')
+    if parts[0] == 'attacks' and len(parts) == 4 and parts[2] == 'output' and path.endswith('.png'):
+        return 'frames', parts[1]
+    if parts[0] == 'attacks' and len(parts) == 3 and parts[2] == 'sound.ogg':
+        return 'bundle', 'attacks'
+    if parts[0] == 'mods' and len(parts) >= 3 and not any(part.startswith('.') for part in parts):
+        return 'mod', parts[1]
+    if path.startswith('pokemon/cries/') and path.endswith('.ogg'):
+        return 'cries', 'pokemon/cries'
+    return None
+
+
+class Snapshot:
+    """
+    Stat snapshot of the watched directories
+
+    Each poll stats every watched directory. A directory whose mtime moved
+    (files added, removed or renamed into place) is rescanned at once; the
+    rest are rescanned round-robin so that in-place edits are still seen
+    within sweep_seconds without statting every file on every poll.
+    """
+
+    def __init__(self, game_dir: Path, roots: Iterable[str], include: Callable[[str], bool] = watched_directory):
+        self.game_dir = Path(game_dir)
+        self._prefix = f"{self.game_dir}{os.sep}"  # plain strings: building Paths would dominate a poll
+        self.include = include
+        self.roots = [root for root in roots if include(root)]
+        self._dirs: Dict[str, _Directory] = {}
+        self._cursor = 0
+        with phase('watch_snapshot'):
+            for root in self.roots:
+                self._add_tree(root, set())
+
+    def __len__(self) -> int:
+        return len(self._dirs)
+
+    def file_count(self) -> int:
+        return sum(len(directory.files) for directory in self._dirs.values())
+
+    def _scan(self, relative: str) -> Optional[_Directory]:
+        """Current contents of one directory, or None if it is gone"""
+        try:
+            path = self._prefix + relative
+            scanned = _Directory(os.stat(path).st_mtime_ns)
+            with os.scandir(path) as entries:
+                for entry in entries:
+                    if entry.is_dir(follow_symlinks=False):
+                        if self.include(f"{relative}/{entry.name}"):
+                            scanned.subdirs.add(entry.name)
+                    elif entry.is_file():
+                        stat = entry.stat()
+                        scanned.files[entry.name] = (stat.st_size, stat.st_mtime_ns)
+        except (FileNotFoundError, NotADirectoryError):
+            return None
+        return scanned
+
+    def _add_tree(self, relative: str, changed: Set[str]):
+        scanned = self._scan(relative)
+        if scanned is None:
+            return
+        self._dirs[relative] = scanned
+        changed.update(f"{relative}/{name}" for name in scanned.files)
+        for name in scanned.subdirs:
+            self._add_tree(f"{relative}/{name}", changed)
+
+    def _remove_tree(self, relative: str, changed: Set[str]):
+        directory = self._dirs.pop(relative, None)
+        if directory is None:
+            return
+        changed.update(f"{relative}/{name}" for name in directory.files)
+        for name in directory.subdirs:
+            self._remove_tree(f"{relative}/{name}", changed)
+
+    def _rescan(self, relative: str, changed: Set[str]):
+        old = self._dirs.get(relative)
+        scanned = self._scan(relative)
+        if scanned is None:
+            self._remove_tree(relative, changed)
+            return
+        self._dirs[relative] = scanned
+        for name in old.files.keys() | scanned.files.keys():
+            if old.files.get(name) != scanned.files.get(name):
+                changed.add(f"{relative}/{name}")
+        for name in scanned.subdirs - old.subdirs:
+            self._add_tree(f"{relative}/{name}", changed)
+        for name in old.subdirs - scanned.subdirs:
+            self._remove_tree(f"{relative}/{name}", changed)
+
+    def poll(self, sweep: int = 0) -> Set[str]:
+        """
+        Paths of files added, removed or modified since the last poll
+
+        Args:
+            sweep: Unchanged directories to rescan anyway (for in-place edits)
+        """
+        changed: Set[str] = set()
+        for root in self.roots:
+            if root not in self._dirs:
+                self._add_tree(root, changed)
+        prefix, stat = self._prefix, os.stat
+        for relative, directory in list(self._dirs.items()):
+            if relative not in self._dirs:
+                continue  # removed along with its parent earlier in this poll
+            try:
+                mtime_ns = stat(prefix + relative).st_mtime_ns
+            except FileNotFoundError:
+                self._remove_tree(relative, changed)
+                continue
+            if mtime_ns != directory.mtime_ns:
+                self._rescan(relative, changed)
+
+        names = list(self._dirs)
+        for _ in range(min(sweep, len(names))):
+            self._cursor %= len(names)
+            relative = names[self._cursor]
+            self._cursor += 1
+            if relative in self._dirs:
+                self._rescan(relative, changed)
+        return changed
+
+
+class Steps:
+    """The derived-asset steps watch mode can re-run, one call per changed key"""
+
+    def __init__(self, game_dir: Path, mods_dir: Path, cry_cache: Optional[Path], bundle: Optional[Path]):
+        self.game_dir = Path(game_dir)
+        self.mods_dir = Path(mods_dir)
+        self.cry_cache = cry_cache
+        self.bundle = bundle
+        self._frame_script = None
+        self._registry = None
+
+    def frames(self, attack: str):
+        """Mark empty frames of one attack as invisible_frame in its metadata.out"""
+        if self._frame_script is None:
+            spec = importlib.util.spec_from_file_location('invisible_frame_finder', FRAME_SCRIPT)
+            self._frame_script = importlib.util.module_from_spec(spec)
+            spec.loader.exec_module(self._frame_script)
+        attack_dir = self.game_dir / "attacks" / attack
+        metadata = attack_dir / "metadata.out"
+        if not (attack_dir / "output").is_dir():
+            return
+        if not metadata.exists():
+            metadata.touch()
+        self._frame_script.mainCall(sorted(glob.glob(str(attack_dir / "output" / "*.png"))), str(metadata))
+
+    def mod(self, name: str):
+        """Re-read one mod into the registry and report dex collisions"""
+        if self._registry is None:
+            self._registry = ModRegistry(self.mods_dir, SpeciesData(
+                self.game_dir / "pokemon", Path(__file__).parent / "species_table.bin"))
+        entry = self._registry.refresh(name)
+        if entry is not None:
+            collisions = self._registry.collisions().get(entry.dex)
+            if collisions:
+                log_event('watch.dex_collision', level=logging.WARNING, mod=name, dex=entry.dex,
+                          holders=', '.join(collisions))
+
+    def cries(self, directory: str):
+        """Regenerate changed .length files, then the audio bundle"""
+        report = index_lengths([self.game_dir / directory], self.cry_cache)
+        for failure in report['failed']:
+            log_event('watch.cry_failed', level=logging.WARNING, file=failure['file'], error=failure['error'])
+        self.bundle_audio('cries')
+
+    def bundle_audio(self, _key: str):
+        """Rebuild the audio bundle, if one has been built"""
+        if self.bundle is not None and self.bundle.exists():
+            build_bundle(self.game_dir, self.bundle)
+
+    def run(self, step: str, key: str):
+        {'frames': self.frames, 'mod': self.mod, 'cries': self.cries, 'bundle': self.bundle_audio}[step](key)
+
+
+class Watcher:
+    """
+    Poll loop with debouncing
+
+    A step runs once its key has seen no new change for `debounce` seconds
+    (or `max_delay` seconds after the first change of a steady stream), so a
+    burst such as a whole attack re-exported triggers one run.
+    """
+
+    def __init__(self, snapshot: Snapshot, run: Callable[[str, str], None], steps: Iterable[str],
+                 interval: float = 1.0, debounce: float = 2.0, max_delay: float = 30.0,
+                 sweep_seconds: float = 120.0):
+        self.snapshot = snapshot
+        self.run_step = run
+        self.steps = set(steps)
+        self.interval = interval
+        self.debounce = debounce
+        self.max_delay = max_delay
+        self.sweep_seconds = sweep_seconds
+        self._pending: Dict[Tuple[str, str], List[float]] = {}  # (step, key) -> [first, last change]
+        self._sweep_credit = 0.0
+
+    def tick(self, now: Optional[float] = None) -> List[Tuple[str, str]]:
+        """Poll once and run every step that is due; returns the (step, key) pairs run"""
+        now = time.monotonic() if now is None else now
+        # Rescan enough unchanged directories that each is visited once per sweep_seconds
+        self._sweep_credit += len(self.snapshot) * self.interval / self.sweep_seconds
+        sweep = math.floor(self._sweep_credit)
+        self._sweep_credit -= sweep
+
+        for path in self.snapshot.poll(sweep):
+            target = route(path)
+            if target is None or target[0] not in self.steps:
+                continue
+            pending = self._pending.setdefault(target, [now, now])
+            pending[1] = now
+
+        due = [target for target, (first, last) in self._pending.items()
+               if now - last >= self.debounce or now - first >= self.max_delay]
+        for step, key in sorted(due):
+            del self._pending[(step, key)]
+            try:
+                with phase('watch_step', step=step, key=key):
+                    self.run_step(step, key)
+            except Exception as e:  # keep watching after a failed step
+                log_event('watch.step_failed', level=logging.ERROR, exc_info=True, step=step, key=key, error=e)
+        return due
+
+    def run(self, duration: Optional[float] = None):
+        """Poll until interrupted (or for `duration` seconds)"""
+        stop = None if duration is None else time.monotonic() + duration
+        while stop is None or time.monotonic() < stop:
+            started = time.monotonic()
+            self.tick(started)
+            time.sleep(max(0.0, self.interval - (time.monotonic() - started)))
+
+
+ALL_STEPS = ('frames', 'mod', 'cries', 'bundle')
+
+
+def main():
+    """Command-line interface"""
+    parser = argparse.ArgumentParser(description='Rebuild derived assets when attacks, mods or cries change')
+    parser.add_argument('--game', type=Path, default=GAME_DIR, help='Game directory (default: the parent of PokeGen)')
+    parser.add_argument('--steps', default=','.join(ALL_STEPS),
+                        help=f"Comma-separated steps to run (default: {','.join(ALL_STEPS)})")
+    parser.add_argument('--interval', type=float, default=1.0, help='Seconds between polls (default: 1)')
+    parser.add_argument('--debounce', type=float, default=2.0,
+                        help='Quiet seconds after the last change before a step runs (default: 2)')
+    parser.add_argument('--sweep', type=float, default=120.0,
+                        help='Seconds to rescan every directory for in-place edits (default: 120)')
+    parser.add_argument('--bundle', type=Path, default=Path(__file__).parent / "audio.bundle",
+                        help='Audio bundle to rebuild when cries change, if it exists (default: audio.bundle)')
+    parser.add_argument('--duration', type=float, help='Stop after this many seconds')
+    add_profile_argument(parser)
+
+    args = parser.parse_args()
+    configure_logging()
+
+    steps = {step.strip() for step in args.steps.split(',') if step.strip()}
+    unknown = steps - set(ALL_STEPS)
+    if unknown:
+        parser.error(f"unknown steps: {', '.join(sorted(unknown))}")
+
+    with profiled(args.profile, 'watch'):
+        snapshot = Snapshot(args.game, ['attacks', 'mods', 'pokemon/cries'])
+        runner = Steps(args.game, args.game / "mods", Path(__file__).parent / "cry_lengths.json", args.bundle)
+        print(f"Watching {snapshot.file_count()} files in {len(snapshot)} directories "
+              f"(steps: {', '.join(sorted(steps))}); Ctrl+C to stop")
+        watcher = Watcher(snapshot, runner.run, steps, interval=args.interval,
+                          debounce=args.debounce, sweep_seconds=args.sweep)
+        try:
+            watcher.run(args.duration)
+        except KeyboardInterrupt:
+            pass
+
+
+if __name__ == '__main__':
+    main()
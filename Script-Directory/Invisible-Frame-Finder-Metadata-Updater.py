@@ -1,10 +1,15 @@
 from PIL import Image
+import argparse
 import glob
 import os
+import sys
 
-path = "C:/Sprites/attacks/"
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "PokeGen")) # Shared --profile support lives in PokeGen.
+
+from metrics import phase
+from profiling import add_profile_argument, profiled
 
-_, all_attack_directories, _ = zip(*os.walk(path))
+path = "C:/Sprites/attacks/"
 
 
 def mainCall(images, textFile): # The main function call.
@@ -12,15 +17,19 @@ def mainCall(images, textFile): # The main function call.
     frameNumber = 0
     listOfEmptyFrames = []
 
-    for i in images:  # For every image in the directory, add one to the frame number index, check if it's an empty frame, if it is append the frameNumber to the listOfEmptyFrames
+    with phase("frame_scan"): # Timed for --profile.
+
+        for i in images:  # For every image in the directory, add one to the frame number index, check if it's an empty frame, if it is append the frameNumber to the listOfEmptyFrames
 
-        frameNumber += 1
+            frameNumber += 1
 
-        if isEmptyFrame(i) == True: #If it is an empty frame, we append it to the listOfEmptyFrames
+            if isEmptyFrame(i) == True: #If it is an empty frame, we append it to the listOfEmptyFrames
 
-            listOfEmptyFrames.append(frameNumber)
+                listOfEmptyFrames.append(frameNumber)
 
-    inputText(textFile, listOfEmptyFrames)
+    with phase("metadata_write"):
+
+        inputText(textFile, listOfEmptyFrames)
 
 def inputText(textFile, emptyFrames):
 
@@ -82,7 +91,7 @@ def inputText(textFile, emptyFrames):
 
             else:
 
-                if(addedLine == False): # If a line wasn't already added before, we add a line. (The only time a line is added before is when a metadata file is empty.)
+                if(addedLine == False and "invisible_frame" not in linesList[lineNumber - 1]): # If a line wasn't already added before (the only time a line is added before is when a metadata file is empty) and the frame isn't already marked, we add the label, so running again changes nothing.
 
                     linesList[lineNumber - 1] = linesList[lineNumber - 1].strip()
                     linesList[lineNumber - 1] = linesList[lineNumber - 1] + " invisible_frame\n"  # Adds the invisible frame text.
@@ -99,7 +108,7 @@ def inputText(textFile, emptyFrames):
 
 def isEmptyFrame(image1):
 
-    im = Image.open(image1, "r")
+    im = Image.open(image1, "r").convert("RGBA") # Palette and grayscale frames (e.g. from png_optimizer.py) become RGBA too.
 
     pix_val = list(im.getdata()) # Gets the rgba values of an image.
 
@@ -115,12 +124,20 @@ def isEmptyFrame(image1):
 
 if __name__ == '__main__':
 
-    for i in all_attack_directories:
+    parser = argparse.ArgumentParser(description="Mark empty attack frames as invisible_frame in each metadata.out")
+    add_profile_argument(parser)
+    args = parser.parse_args()
+
+    _, all_attack_directories, _ = zip(*os.walk(path)) # Walked here so PokeGen's watch mode can import mainCall without C:/Sprites.
+
+    with profiled(args.profile, "invisible-frame-finder"): # Does nothing unless --profile is given.
+
+        for i in all_attack_directories:
 
-        for j in i:
+            for j in i:
 
-            if (j != "output"): # For every item in the attack directory, call the mainCall function with the images and textFile variables.
+                if (j != "output"): # For every item in the attack directory, call the mainCall function with the images and textFile variables.
 
-                images = glob.glob("C:/Sprites/attacks/" + j + "/output/*.png")
-                textFile = "C:/Sprites/attacks/" + j + "/metadata.out"
-                mainCall(images, textFile)
+                    images = glob.glob("C:/Sprites/attacks/" + j + "/output/*.png")
+                    textFile = "C:/Sprites/attacks/" + j + "/metadata.out"
+                    mainCall(images, textFile)
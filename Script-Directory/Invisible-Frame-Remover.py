@@ -1,6 +1,13 @@
 from PIL import Image
+import argparse
 import glob
 import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "PokeGen")) # Shared --profile support lives in PokeGen.
+
+from metrics import phase
+from profiling import add_profile_argument, profiled
 
 path = "C:/Sprites/attacks/"
 
@@ -8,7 +15,7 @@ _, all_attack_directories, _ = zip(*os.walk(path))
 
 def isEmptyFrame(image1):
 
-    im = Image.open(image1, "r")
+    im = Image.open(image1, "r").convert("RGBA") # Palette and grayscale frames (e.g. from png_optimizer.py) become RGBA too.
 
     pix_val = list(im.getdata()) # Gets the rgba values of an image.
 
@@ -27,17 +34,29 @@ def emptyFrameMover(images):
 
     for i in images:  # For every image in the directory, if it is an empty frame, we delete the frame.
 
-        if isEmptyFrame(i) == True:
+        with phase("frame_scan"): # Timed for --profile.
+
+            empty = isEmptyFrame(i)
+
+        if empty == True:
 
-            os.remove(i)
+            with phase("frame_delete"):
+
+                os.remove(i)
 
 if __name__ == '__main__':
 
-    for i in all_attack_directories:
+    parser = argparse.ArgumentParser(description="Delete empty frames from every attack's output directory")
+    add_profile_argument(parser)
+    args = parser.parse_args()
+
+    with profiled(args.profile, "invisible-frame-remover"): # Does nothing unless --profile is given.
+
+        for i in all_attack_directories:
 
-        for j in i:
+            for j in i:
 
-            if (j != "output"): # For every file in the attack directories.
+                if (j != "output"): # For every file in the attack directories.
 
-                images = glob.glob("C:/Sprites/attacks/" + j + "/output/*.png")
-                emptyFrameMover(images)
+                    images = glob.glob("C:/Sprites/attacks/" + j + "/output/*.png")
+                    emptyFrameMover(images)